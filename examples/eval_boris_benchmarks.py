@@ -0,0 +1,103 @@
+'''
+Benchmarks the Boris algorithm against the 4th-order Runge Kutta algorithm
+for the trajectories used in the test suite (test_trajectories.py).
+
+For each integrator and step size, the total evaluation time, the number of
+trajectories whose result (allowed / forbidden) agrees with the
+Runge Kutta algorithm at dt=1e-5, and the maximal relative drift of the
+momentum magnitude are printed.
+'''
+
+import os, sys
+import numpy as np
+import time
+
+from gtracr.trajectory import Trajectory
+from gtracr.tests.test_trajectories import initial_variable_list
+
+
+def evaluate_cases(integrator, dt, bfield_type, max_time=1., iter_num=10):
+    '''
+    Evaluates all test cases with the given integrator and step size.
+
+    Parameters
+    ----------
+
+    - integrator : str
+        the integration algorithm ("rk4" or "boris")
+    - dt : float
+        the step size of the integration
+    - bfield_type : str
+        type of magnetic field model to use
+    - max_time : float
+        the maximal time of each trajectory (default 1s)
+    - iter_num : int
+        the number of times each trajectory is evaluated for the
+        timing (default 10)
+
+    Returns
+    -------
+
+    - eval_time : float
+        the average time to evaluate all test cases
+    - escaped : np.array(bool)
+        whether each trajectory is allowed or not
+    - pdrift : np.array(float)
+        the relative drift in the momentum magnitude for each trajectory
+    '''
+    eval_time = 0.
+    escaped = np.zeros(len(initial_variable_list), dtype=bool)
+    pdrift = np.zeros(len(initial_variable_list))
+
+    for i, initial_variables in enumerate(initial_variable_list):
+        (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) = initial_variables
+
+        for _ in range(iter_num):
+            # create a new trajectory for each evaluation, since
+            # the charge and mass are converted to SI units in get_trajectory
+            traj = Trajectory(plabel=plabel,
+                              zenith_angle=zenith,
+                              azimuth_angle=azimuth,
+                              particle_altitude=palt,
+                              latitude=lat,
+                              longitude=lng,
+                              detector_altitude=dalt,
+                              rigidity=rig,
+                              energy=en,
+                              bfield_type=bfield_type)
+
+            # perf counter for more precise time evaluations
+            start_time = time.perf_counter()
+            traj.get_trajectory(dt=dt,
+                                max_time=max_time,
+                                integrator=integrator)
+            eval_time += time.perf_counter() - start_time
+
+        pmag0 = np.linalg.norm(traj.particle_sixvector[3:])
+        pmag = np.linalg.norm(traj.final_sixvector[3:])
+
+        escaped[i] = traj.particle_escaped
+        pdrift[i] = np.abs(pmag / pmag0 - 1.)
+
+    return eval_time / iter_num, escaped, pdrift
+
+
+if __name__ == "__main__":
+    bfield_type = "dipole"
+
+    # the reference results
+    ref_time, ref_escaped, _ = evaluate_cases("rk4", 1e-5, bfield_type)
+
+    print("{0:>8s} {1:>8s} {2:>12s} {3:>10s} {4:>10s} {5:>14s}".format(
+        "method", "dt", "time [s]", "speedup", "agreement", "max |dp| / p"))
+
+    for integrator, dt in [("rk4", 1e-5), ("boris", 1e-5), ("rk4", 1e-4),
+                           ("boris", 1e-4), ("boris", 1e-3)]:
+        eval_time, escaped, pdrift = evaluate_cases(integrator, dt,
+                                                    bfield_type)
+
+        print("{0:>8s} {1:>8.0e} {2:>12.3e} {3:>10.1f} {4:>7d}/{5:<2d} {6:>14.1e}".
+              format(integrator, dt, eval_time, ref_time / eval_time,
+                     np.sum(escaped == ref_escaped), len(escaped),
+                     np.max(pdrift)))
@@ -47,7 +47,13 @@ def eval_gmrc(args):
                         bfield_type=args.bfield_type,
                         particle_type=plabel)
 
-            gmrc.evaluate()
+            if args.adaptive:
+                gmrc.evaluate_adaptive(search=args.search,
+                                       n_workers=args.n_workers)
+            else:
+                gmrc.evaluate(search=args.search,
+                              n_workers=args.n_workers,
+                              sampling=args.sampling)
 
             # create a debugger / checker as a scatter plot
             # of the dataset
@@ -80,7 +86,17 @@ def eval_gmrc(args):
                     bfield_type=args.bfield_type,
                     particle_type=plabel)
 
-        gmrc.evaluate()
+        if args.checkpoint is not None and os.path.exists(args.checkpoint):
+            # continue the interrupted evaluation
+            gmrc = GMRC.resume(args.checkpoint, n_workers=args.n_workers)
+        elif args.adaptive:
+            gmrc.evaluate_adaptive(search=args.search,
+                                   n_workers=args.n_workers)
+        else:
+            gmrc.evaluate(search=args.search,
+                          n_workers=args.n_workers,
+                          sampling=args.sampling,
+                          checkpoint=args.checkpoint)
 
         # create a debugger / checker as a scatter plot
         # of the dataset
@@ -128,6 +144,33 @@ if __name__ == "__main__":
                         default="igrf",
                         type=str,
                         help="The geomagnetic field model used.")
+    parser.add_argument('-s',
+                        '--search',
+                        dest="search",
+                        default="linear",
+                        type=str,
+                        help="The search method of the cutoff rigidity ('linear', 'bisect' or 'penumbra').")
+    parser.add_argument('--sampling',
+                        dest="sampling",
+                        default="random",
+                        type=str,
+                        help="The sampling scheme of the directions ('random', 'sobol' or 'halton').")
+    parser.add_argument('--adaptive',
+                        dest="adaptive",
+                        action="store_true",
+                        help="Refine the directions adaptively where the cutoff varies sharply.")
+    parser.add_argument('-w',
+                        '--workers',
+                        dest="n_workers",
+                        default=1,
+                        type=int,
+                        help="The number of worker processes.")
+    parser.add_argument('-c',
+                        '--checkpoint',
+                        dest="checkpoint",
+                        default=None,
+                        type=str,
+                        help="The checkpoint file of the evaluation, from which the evaluation is resumed if it exists.")
     parser.add_argument('-a',
                         '--all',
                         dest="eval_all",
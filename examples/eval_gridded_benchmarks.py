@@ -0,0 +1,63 @@
+'''
+Benchmarks the interpolated lattice of the IGRF model (the 'gridded' model)
+against the direct evaluation of the IGRF model.
+
+For each resolution of the lattice, the time to build the lattice, its size,
+the interpolation error, and the cost of a single evaluation of the field
+are printed. Afterwards, the trajectories used in the test suite
+(test_trajectories.py) are evaluated with each integrator in both models,
+together with the number of trajectories whose result (allowed / forbidden)
+differs between the two models.
+'''
+
+import os, sys
+import numpy as np
+import time
+
+from gtracr.lib._libgtracr import IGRF, GriddedField
+from gtracr.lib.gridded_field import DEFAULT_GRID_SHAPE, igrf_grid_path, igrf_grid_error
+from gtracr.utils import ymd_to_dec
+from gtracr.tests.test_trajectories import IGRF_DATE
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from eval_igrf_benchmarks import time_field, evaluate_cases, DATA_DIR
+
+GRID_SHAPES = [(16, 46, 90), DEFAULT_GRID_SHAPE, (48, 181, 360)]
+
+if __name__ == "__main__":
+    dec_date = ymd_to_dec(IGRF_DATE)
+
+    # the cost of a single field evaluation
+    # (includes the overhead of the call from Python)
+    igrf_time = time_field(IGRF(os.path.join(DATA_DIR, "igrf13.bin"),
+                                dec_date))
+    print("field evaluation: IGRF {0:.3e} s".format(igrf_time))
+
+    print("{0:>16s} {1:>10s} {2:>10s} {3:>12s} {4:>12s} {5:>12s}".format(
+        "shape", "build [s]", "size [MB]", "max [nT]", "rms [nT]",
+        "eval [s]"))
+
+    for shape in GRID_SHAPES:
+        start_time = time.perf_counter()
+        grid_path = igrf_grid_path(dec_date, shape)
+        build_time = time.perf_counter() - start_time
+
+        max_error, rms_error = igrf_grid_error(dec_date, shape)
+        grid_time = time_field(GriddedField(grid_path))
+
+        print("{0:>16s} {1:>10.2f} {2:>10.1f} {3:>12.2f} {4:>12.3f} {5:>12.3e}".
+              format("x".join(str(n) for n in shape), build_time,
+                     os.path.getsize(grid_path) / 1e6, max_error, rms_error,
+                     grid_time))
+
+    print("{0:>8s} {1:>14s} {2:>14s} {3:>10s} {4:>10s}".format(
+        "method", "IGRF [s]", "gridded [s]", "speedup", "differ"))
+
+    for integrator in ["rk4", "rk45", "boris"]:
+        igrf_time, igrf_escaped = evaluate_cases(integrator, "igrf")
+        grid_time, grid_escaped = evaluate_cases(integrator, "gridded")
+
+        print("{0:>8s} {1:>14.3e} {2:>14.3e} {3:>10.1f} {4:>7d}/{5:<2d}".format(
+            integrator, igrf_time, grid_time, igrf_time / grid_time,
+            np.sum(igrf_escaped != grid_escaped), len(igrf_escaped)))
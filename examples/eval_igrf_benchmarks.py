@@ -0,0 +1,134 @@
+'''
+Benchmarks the IGRF model against the dipole model for the trajectories used
+in the test suite (test_trajectories.py).
+
+Both the cost of a single evaluation of the magnetic field and the cost of
+evaluating all trajectories with each integrator are printed, together with
+the number of trajectories whose result (allowed / forbidden) differs between
+the two field models.
+'''
+
+import os, sys
+import numpy as np
+import time
+
+from gtracr.trajectory import Trajectory
+from gtracr.lib._libgtracr import MagneticField, IGRF
+from gtracr.lib.constants import EARTH_RADIUS
+from gtracr.tests.test_trajectories import initial_variable_list, IGRF_DATE
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(CURRENT_DIR), "gtracr", "data")
+
+
+def time_field(bfield, n=100000):
+    '''
+    Evaluates the average time of a single evaluation of the magnetic field
+    at random points between 1 and 10 Earth radii.
+
+    Parameters
+    ----------
+
+    - bfield : MagneticField or IGRF
+        the magnetic field model
+    - n : int
+        the number of evaluations (default 100000)
+
+    Returns
+    -------
+
+    - eval_time : float
+        the average time of a single evaluation
+    '''
+    rng = np.random.default_rng(0)
+    coords = np.column_stack(
+        (EARTH_RADIUS * rng.uniform(1., 10., n), rng.uniform(0., np.pi, n),
+         rng.uniform(0., 2. * np.pi, n))).tolist()
+
+    start_time = time.perf_counter()
+    for r, theta, phi in coords:
+        bfield.values(r, theta, phi)
+    return (time.perf_counter() - start_time) / n
+
+
+def evaluate_cases(integrator, bfield_type, dt=1e-5, max_time=1.,
+                   iter_num=3):
+    '''
+    Evaluates all test cases with the given integrator and field model.
+
+    Parameters
+    ----------
+
+    - integrator : str
+        the integration algorithm ("rk4", "rk45" or "boris")
+    - bfield_type : str
+        type of magnetic field model to use
+    - dt : float
+        the step size of the integration (default 1e-5)
+    - max_time : float
+        the maximal time of each trajectory (default 1s)
+    - iter_num : int
+        the number of times each trajectory is evaluated for the
+        timing (default 3)
+
+    Returns
+    -------
+
+    - eval_time : float
+        the average time to evaluate all test cases
+    - escaped : np.array(bool)
+        whether each trajectory is allowed or not
+    '''
+    eval_time = 0.
+    escaped = np.zeros(len(initial_variable_list), dtype=bool)
+
+    for i, initial_variables in enumerate(initial_variable_list):
+        (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) = initial_variables
+
+        for _ in range(iter_num):
+            # create a new trajectory for each evaluation, since
+            # the charge and mass are converted to SI units in get_trajectory
+            traj = Trajectory(plabel=plabel,
+                              zenith_angle=zenith,
+                              azimuth_angle=azimuth,
+                              particle_altitude=palt,
+                              latitude=lat,
+                              longitude=lng,
+                              detector_altitude=dalt,
+                              rigidity=rig,
+                              energy=en,
+                              bfield_type=bfield_type,
+                              date=IGRF_DATE)
+
+            # perf counter for more precise time evaluations
+            start_time = time.perf_counter()
+            traj.get_trajectory(dt=dt,
+                                max_time=max_time,
+                                integrator=integrator)
+            eval_time += time.perf_counter() - start_time
+
+        escaped[i] = traj.particle_escaped
+
+    return eval_time / iter_num, escaped
+
+
+if __name__ == "__main__":
+    # the cost of a single field evaluation
+    # (includes the overhead of the call from Python)
+    dip_time = time_field(MagneticField())
+    igrf_time = time_field(IGRF(os.path.join(DATA_DIR, "igrf13.bin"), 2020.))
+
+    print("field evaluation: dipole {0:.3e} s, IGRF {1:.3e} s".format(
+        dip_time, igrf_time))
+
+    print("{0:>8s} {1:>14s} {2:>14s} {3:>10s} {4:>10s}".format(
+        "method", "dipole [s]", "IGRF [s]", "ratio", "differ"))
+
+    for integrator in ["rk4", "rk45", "boris"]:
+        dip_time, dip_escaped = evaluate_cases(integrator, "dipole")
+        igrf_time, igrf_escaped = evaluate_cases(integrator, "igrf")
+
+        print("{0:>8s} {1:>14.3e} {2:>14.3e} {3:>10.1f} {4:>7d}/{5:<2d}".format(
+            integrator, dip_time, igrf_time, igrf_time / dip_time,
+            np.sum(dip_escaped != igrf_escaped), len(dip_escaped)))
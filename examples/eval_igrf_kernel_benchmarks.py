@@ -0,0 +1,72 @@
+'''
+Benchmarks the evaluation of the IGRF model (IGRF.values), which uses the
+precomputed coefficients of the recurrence relations of the Legendre
+functions, against the original shval3 routine of geomag 7.0
+(IGRF.shval3_values).
+
+The cost of a single evaluation of each version is printed for several
+dates (with different truncations of the series), together with the cost of
+the dipole field as an estimate of the overhead of the call from Python, and
+the maximal relative difference between both versions.
+'''
+
+import os, sys
+import numpy as np
+import time
+
+from gtracr.lib._libgtracr import MagneticField, IGRF
+from gtracr.lib.constants import EARTH_RADIUS
+
+sys.path.append(os.path.dirname(os.path.realpath(__file__)))
+
+from eval_igrf_benchmarks import DATA_DIR
+
+DATES = [1950.25, 2000., 2020.5]
+
+
+def time_values(values, coords, iter_num=5):
+    '''
+    The minimal average time of a single call of `values` over `iter_num`
+    evaluations of all coordinates.
+    '''
+    eval_times = []
+    for _ in range(iter_num):
+        start_time = time.perf_counter()
+        for r, theta, phi in coords:
+            values(r, theta, phi)
+        eval_times.append((time.perf_counter() - start_time) / len(coords))
+    return min(eval_times)
+
+
+if __name__ == "__main__":
+    n = 100000
+    rng = np.random.default_rng(0)
+    coords = np.column_stack(
+        (EARTH_RADIUS * rng.uniform(1., 10., n), rng.uniform(0., np.pi, n),
+         rng.uniform(0., 2. * np.pi, n))).tolist()
+
+    # the overhead of the call from Python
+    overhead = time_values(MagneticField().values, coords)
+    print("call overhead (dipole field): {0:.3e} s".format(overhead))
+
+    print("{0:>8s} {1:>5s} {2:>14s} {3:>14s} {4:>10s} {5:>12s}".format(
+        "date", "nmax", "shval3 [s]", "values [s]", "speedup", "max rel"))
+
+    for date in DATES:
+        igrf = IGRF(os.path.join(DATA_DIR, "igrf13.bin"), date)
+
+        shval3_time = time_values(igrf.shval3_values, coords) - overhead
+        values_time = time_values(igrf.values, coords) - overhead
+
+        max_rel = 0.
+        for coord in coords[:10000]:
+            values = np.array(igrf.values(*coord))
+            shval3_values = np.array(igrf.shval3_values(*coord))
+            max_rel = max(
+                max_rel,
+                np.max(np.abs(values - shval3_values)) /
+                np.max(np.abs(shval3_values)))
+
+        print("{0:>8.2f} {1:>5d} {2:>14.3e} {3:>14.3e} {4:>10.1f} {5:>12.1e}".
+              format(date, igrf.nmax, shval3_time, values_time,
+                     shval3_time / values_time, max_rel))
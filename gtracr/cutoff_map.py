@@ -0,0 +1,163 @@
+'''
+Evaluates the geomagnetic cutoff rigidities over a grid of locations, e.g. to
+produce world maps of the vertical cutoff rigidity.
+'''
+
+import numpy as np
+from tqdm import tqdm
+from datetime import date
+
+from gtracr.geomagnetic_cutoffs import GMRC, _map_chunks
+from gtracr.lib.location import Location
+
+
+class CutoffMap():
+    '''
+    Evaluates the geomagnetic cutoff rigidities on a grid of latitudes, longitudes and
+    altitudes, either for the vertical direction only or for a set of directions.
+
+    The grid cells are evaluated in chunks, which can be distributed over a pool of
+    worker processes that each load the field model once. The cutoff rigidities of each
+    cell are found in the same way as in `GMRC`.
+
+    Parameters
+    -----------
+
+    - latitudes : array_like(float)
+        The geographical latitudes of the grid in decimal degrees.
+    - longitudes : array_like(float)
+        The geographical longitudes of the grid in decimal degrees.
+    - altitudes : array_like(float)
+        The altitudes above sea level of the grid in km (default = [0.]).
+    - directions : array_like(float), shape (n_directions, 2)
+        The zenith and azimuth angles of the directions in degrees (default = None, in which
+        case only the vertical direction with a zenith angle of 0 is evaluated).
+    - particle_altitude : float
+        The altitude in which the cosmic ray interacts with the atmosphere in km (default = 100).
+    - bfield_type : str
+        The type of magnetic field model to use (default = "igrf").
+    - particle_type : str
+        The type of particle of the cosmic ray (default  ="p+").
+    - date : str
+        The date in which the cutoff rigidities are evaluated. Defaults to the current date.
+    - min_rigidity, max_rigidity, delta_rigidity : float
+        The range and spacing of the rigidities in GV (default = 5, 55 and 1 GV), see `GMRC`.
+    '''
+    def __init__(self,
+                 latitudes,
+                 longitudes,
+                 altitudes=[0.],
+                 directions=None,
+                 particle_altitude=100,
+                 bfield_type="igrf",
+                 particle_type="p+",
+                 date=str(date.today()),
+                 min_rigidity=5.,
+                 max_rigidity=55.,
+                 delta_rigidity=1.):
+        self.latitudes = np.atleast_1d(np.asarray(latitudes, dtype=float))
+        self.longitudes = np.atleast_1d(np.asarray(longitudes, dtype=float))
+        self.altitudes = np.atleast_1d(np.asarray(altitudes, dtype=float))
+        if directions is None:
+            directions = [[0., 0.]]
+        self.directions = np.asarray(directions, dtype=float).reshape(-1, 2)
+
+        self.palt = particle_altitude
+        self.bfield_type = bfield_type
+        self.plabel = particle_type
+        self.date = date
+        self.rmin = min_rigidity
+        self.rmax = max_rigidity
+        self.rdelta = delta_rigidity
+
+        # the shape of the grid, (latitude, longitude, altitude, direction)
+        self.shape = (len(self.latitudes), len(self.longitudes),
+                      len(self.altitudes), len(self.directions))
+        self.data_dict = {}
+
+    def evaluate(self,
+                 dt=1e-5,
+                 max_time=1,
+                 search="linear",
+                 rigidity_tol=None,
+                 n_workers=1,
+                 chunk_size=10):
+        '''
+        Evaluate the cutoff rigidities of each grid cell and direction.
+
+        The results are stored in `data_dict` as arrays of shape `shape`, i.e.
+        (latitude, longitude, altitude, direction): the cutoff rigidity ("rcutoff"),
+        together with the lower ("rlower") and upper ("rupper") cutoff rigidities for
+        `search = "penumbra"`. The cutoff rigidities are NaN if the particle does not
+        escape within the range of rigidities.
+
+        Parameters
+        ----------
+
+        - dt, max_time, search, rigidity_tol :
+            See `GMRC.evaluate`.
+        - n_workers : int
+            The number of worker processes (default = 1). Each worker loads the field
+            model once, and evaluates chunks of `chunk_size` grid cells.
+        - chunk_size : int
+            The number of grid cells per chunk (default = 10).
+        '''
+        # check the search method with the evaluator of the first grid cell
+        rigidity_tol = self._cell_gmrc(0)._search_tolerance(
+            search, rigidity_tol)
+
+        n_cells = int(np.prod(self.shape[:3]))
+        chunk_args = [(start, min(start + chunk_size, n_cells), dt, max_time,
+                       search, rigidity_tol)
+                      for start in range(0, n_cells, chunk_size)]
+
+        keys = ["rcutoff", "rlower", "rupper"
+                ] if search == "penumbra" else ["rcutoff"]
+        self.data_dict = {key: np.full(self.shape, np.nan) for key in keys}
+
+        with tqdm(total=n_cells) as progress_bar:
+            for start, stop, cutoffs in _map_chunks(self, chunk_args,
+                                                    n_workers):
+                for key, values in cutoffs.items():
+                    self.data_dict[key].reshape(n_cells, -1)[start:stop] = \
+                        values
+                progress_bar.update(stop - start)
+
+    def _cell_gmrc(self, cell):
+        '''
+        The evaluator of the cutoff rigidities at the location of a grid cell,
+        given by its flat index in the (latitude, longitude, altitude) grid.
+        '''
+        ilat, ilng, ialt = np.unravel_index(cell, self.shape[:3])
+        location = Location("", self.latitudes[ilat], self.longitudes[ilng],
+                            self.altitudes[ialt])
+        return GMRC(location=location,
+                    particle_altitude=self.palt,
+                    iter_num=0,
+                    bfield_type=self.bfield_type,
+                    particle_type=self.plabel,
+                    date=self.date,
+                    min_rigidity=self.rmin,
+                    max_rigidity=self.rmax,
+                    delta_rigidity=self.rdelta)
+
+    def _evaluate_chunk(self, start, stop, dt, max_time, search,
+                        rigidity_tol):
+        '''
+        Evaluates the cutoff rigidities of the grid cells with flat indices
+        [start, stop) for all directions.
+
+        Returns the range of the grid cells and a dictionary with the cutoff
+        rigidities of each grid cell and direction, as arrays of shape
+        (stop - start, n_directions).
+        '''
+        cutoffs = {}
+        for i, cell in enumerate(range(start, stop)):
+            _, _, _, cell_cutoffs = self._cell_gmrc(cell)._evaluate_chunk(
+                0, self.directions[:, 1], self.directions[:, 0], dt,
+                max_time, search, rigidity_tol)
+            for key, values in cell_cutoffs.items():
+                cutoffs.setdefault(
+                    key, np.full((stop - start, len(self.directions)),
+                                 np.nan))[i] = values
+        return start, stop, cutoffs
@@ -0,0 +1,304 @@
+'''
+Precomputed tables of the geomagnetic cutoff rigidities, which are built once
+from the results of `GMRC` and queried at run time.
+
+The cutoff rigidities are stored on a regular grid of (site, date, zenith,
+azimuth), such that each query only requires the interpolation between the
+neighbouring grid points instead of a triangulation of the samples. The
+tables are memory-mapped, such that only the parts of the table that are
+queried are read from the file.
+
+The binary table format consists of the following blocks (little-endian):
+  - header : magic "GTRCTBL\\0" (8 bytes), the version (1) and the size of the
+    metadata in bytes, each as uint32
+  - metadata : JSON object with the site names ("sites"), the dates in decimal
+    years ("dates"), and the zenith ("zenith") and azimuth ("azimuth") grids as
+    [minimum, maximum, number of points], padded with spaces to 8 bytes
+  - cutoffs : float64[sites][dates][zenith][azimuth]
+'''
+
+import json
+import numpy as np
+from scipy.interpolate import griddata
+
+from gtracr.utils import ymd_to_dec
+
+MAGIC = b"GTRCTBL\0"
+VERSION = 1
+
+
+def _decimal_date(date):
+    '''
+    Converts a date in yyyy-mm-dd format into decimal years.
+    '''
+    return float(np.squeeze(ymd_to_dec(date)))
+
+
+class CutoffTable():
+    '''
+    A memory-mapped table of the geomagnetic cutoff rigidities on a regular grid
+    of (site, date, zenith, azimuth).
+
+    Parameters
+    -----------
+
+    - path : str
+        The path of the table file, as written by `CutoffTable.build` or `CutoffTable.write`.
+    '''
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(16)
+            if header[:8] != MAGIC:
+                raise Exception("Only cutoff table files are allowed!")
+            version, metadata_size = np.frombuffer(header[8:],
+                                                   dtype="<u4")
+            if version != VERSION:
+                raise ValueError(
+                    "The version of the cutoff table file is {0:d}, but only version {1:d} is supported!"
+                    .format(int(version), VERSION))
+            metadata = json.loads(f.read(int(metadata_size)).decode())
+
+        self.path = path
+        self.sites = metadata["sites"]
+        self.dates = np.array(metadata["dates"], dtype=float)
+        self.zenith_grid = np.linspace(*metadata["zenith"])
+        self.azimuth_grid = np.linspace(*metadata["azimuth"])
+        self.cutoffs = np.memmap(path,
+                                 dtype="<f8",
+                                 mode="r",
+                                 offset=16 + int(metadata_size),
+                                 shape=(len(self.sites), len(self.dates),
+                                        len(self.zenith_grid),
+                                        len(self.azimuth_grid)))
+
+    def query(self, zenith, azimuth, site=None, date=None):
+        '''
+        Obtain the cutoff rigidities of the given directions by linear interpolation
+        of the table in the zenith angle, the azimuth angle and the date.
+
+        The arguments are broadcast against each other, such that e.g. arrays of
+        directions can be queried for a single date. Dates outside of the dates of
+        the table are clamped to the first / last date of the table.
+
+        Parameters
+        ----------
+
+        - zenith, azimuth : array_like(float)
+            The zenith (from 0 to 180) and azimuth (modulo 360) angles of the
+            directions in degrees.
+        - site : str
+            The name of the site (default = None, i.e. the first site of the table).
+        - date : str or array_like(float)
+            The date in yyyy-mm-dd format or in decimal years (default = None, i.e.
+            the first date of the table).
+
+        Returns
+        --------
+
+        - rcutoff : np.array(float)
+            The interpolated cutoff rigidities in GV.
+        '''
+        cutoffs = self.cutoffs[0 if site is None else self.sites.index(site)]
+
+        if date is None:
+            date = self.dates[0]
+        elif isinstance(date, str):
+            date = _decimal_date(date)
+
+        zenith, azimuth, date = np.broadcast_arrays(
+            np.asarray(zenith, dtype=float), np.asarray(azimuth, dtype=float),
+            np.asarray(date, dtype=float))
+
+        # the grid cell and the weight of the upper grid point in each
+        # dimension. The dates are not necessarily evenly spaced, while the
+        # cells of the angles are obtained directly from the spacing
+        if len(self.dates) > 1:
+            idate, wdate = self._cell(
+                np.interp(date, self.dates, np.arange(len(self.dates))),
+                len(self.dates))
+        else:
+            idate, wdate = self._cell(np.zeros(date.shape), 1)
+        izen, wzen = self._cell(
+            (zenith - self.zenith_grid[0]) / self._spacing(self.zenith_grid),
+            len(self.zenith_grid))
+        iaz, waz = self._cell(
+            np.mod(azimuth - self.azimuth_grid[0], 360.) /
+            self._spacing(self.azimuth_grid), len(self.azimuth_grid))
+
+        # with a single grid point, the upper grid point has zero weight
+        # and is replaced by the lower one
+        ndate = min(len(self.dates) - 1, 1)
+        nzen = min(len(self.zenith_grid) - 1, 1)
+        naz = min(len(self.azimuth_grid) - 1, 1)
+
+        rcutoff = np.zeros(zenith.shape)
+        for di, dw in [(0, 1. - wdate), (ndate, wdate)]:
+            for zi, zw in [(0, 1. - wzen), (nzen, wzen)]:
+                for ai, aw in [(0, 1. - waz), (naz, waz)]:
+                    rcutoff += dw * zw * aw * cutoffs[idate + di, izen + zi,
+                                                      iaz + ai]
+        return rcutoff
+
+    @staticmethod
+    def _spacing(grid):
+        '''
+        The spacing of a regular grid, or 1 for a grid with a single point
+        (whose cell is the grid point itself, see `_cell`).
+        '''
+        return grid[1] - grid[0] if len(grid) > 1 else 1.
+
+    @staticmethod
+    def _cell(position, n):
+        '''
+        The index of the lower grid point of the cell that contains each
+        position (in units of the grid spacing), and the weight of the upper
+        grid point, for a grid with n points. Positions outside of the grid
+        are clamped to the grid.
+        '''
+        if n == 1:
+            return np.zeros(position.shape, dtype=int), np.zeros(position.shape)
+
+        position = np.clip(position, 0., n - 1)
+        index = np.minimum(position.astype(int), n - 2)
+        return index, position - index
+
+    @staticmethod
+    def write(path, cutoffs, sites, dates, zenith_range, azimuth_range):
+        '''
+        Write a table of cutoff rigidities on a regular grid to a file.
+
+        Parameters
+        ----------
+
+        - path : str
+            The path of the table file.
+        - cutoffs : np.array(float), shape (sites, dates, zenith, azimuth)
+            The cutoff rigidities on the grid in GV.
+        - sites : list(str)
+            The names of the sites.
+        - dates : list(float)
+            The dates in decimal years, in ascending order.
+        - zenith_range, azimuth_range : tuple(float, float)
+            The minimal and maximal zenith and azimuth angle of the grid in degrees.
+        '''
+        cutoffs = np.asarray(cutoffs, dtype="<f8")
+        n_sites, n_dates, n_zenith, n_azimuth = cutoffs.shape
+        metadata = json.dumps({
+            "sites": list(sites),
+            "dates": [float(date) for date in dates],
+            "zenith": [float(zenith_range[0]),
+                       float(zenith_range[1]), n_zenith],
+            "azimuth": [float(azimuth_range[0]),
+                        float(azimuth_range[1]), n_azimuth]
+        }).encode()
+        # align the cutoffs to 8 bytes
+        metadata += b" " * (-(16 + len(metadata)) % 8)
+
+        with open(path, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.array([VERSION, len(metadata)], dtype="<u4").tobytes())
+            f.write(metadata)
+            f.write(np.ascontiguousarray(cutoffs).tobytes())
+
+    @classmethod
+    def build(cls,
+              path,
+              gmrcs,
+              ngrid_zenith=91,
+              ngrid_azimuth=181,
+              method="linear"):
+        '''
+        Build a table from the results of `GMRC` evaluators, one for each site,
+        and write it to a file.
+
+        The samples of each site and date are interpolated to a regular grid
+        from 0 to 180 degrees in the zenith angle and from 0 to 360 degrees in
+        the azimuth angle with `scipy.interpolate.griddata` (periodic in the
+        azimuth). Grid points that cannot be interpolated (e.g. outside of the
+        convex hull of the samples) are filled with the nearest sample.
+
+        Parameters
+        ----------
+
+        - path : str
+            The path of the table file.
+        - gmrcs : list(GMRC)
+            The evaluators of each site, evaluated either with `evaluate` (or
+            `evaluate_adaptive`) for a single date, or with `evaluate_dates`
+            for several dates (the results of the last evaluation are used). All
+            evaluators need to have the same dates.
+        - ngrid_zenith, ngrid_azimuth : int
+            The number of grid points in the zenith and azimuth angle
+            (default = 91 and 181, i.e. every 2 degrees).
+        - method : str
+            The interpolation method of `griddata` (default = "linear").
+
+        Returns
+        --------
+
+        - table : CutoffTable
+            The table read from the file.
+        '''
+        zenith_grid = np.linspace(0., 180., ngrid_zenith)
+        azimuth_grid = np.linspace(0., 360., ngrid_azimuth)
+        zenith_points, azimuth_points = np.meshgrid(zenith_grid,
+                                                    azimuth_grid,
+                                                    indexing="ij")
+
+        sites, dates, cutoffs = [], None, []
+        for gmrc in gmrcs:
+            sites.append(getattr(gmrc.location, "name", gmrc.location))
+            site_dates, samples = cls._samples(gmrc)
+            if dates is None:
+                dates = site_dates
+            elif not np.allclose(site_dates, dates):
+                raise Exception("Only evaluators with the same dates are allowed!")
+
+            site_cutoffs = []
+            for azimuths, zeniths, rcutoffs in samples:
+                # repeat the samples shifted by one period of the azimuth
+                points = (np.concatenate(
+                    (azimuths - 360., azimuths, azimuths + 360.)),
+                          np.tile(zeniths, 3))
+                values = np.tile(rcutoffs, 3)
+                grid_cutoffs = griddata(points,
+                                        values,
+                                        (azimuth_points, zenith_points),
+                                        method=method)
+                missing = np.isnan(grid_cutoffs)
+                grid_cutoffs[missing] = griddata(
+                    points,
+                    values,
+                    (azimuth_points[missing], zenith_points[missing]),
+                    method="nearest")
+                site_cutoffs.append(grid_cutoffs)
+            cutoffs.append(site_cutoffs)
+
+        cls.write(path, np.array(cutoffs), sites, dates, (0., 180.),
+                  (0., 360.))
+        return cls(path)
+
+    @staticmethod
+    def _samples(gmrc):
+        '''
+        The dates in decimal years, and the azimuth, zenith and cutoff rigidity
+        of the samples of each date of an evaluator. Only the samples in which
+        the particle escapes within the range of rigidities are used.
+        '''
+        date_data_dict = getattr(gmrc, "date_data_dict", None)
+        if date_data_dict is not None:
+            dates = [_decimal_date(date) for date in date_data_dict["date"]]
+            samples = []
+            # the dates of the table are in ascending order
+            order = np.argsort(dates)
+            for rcutoffs in date_data_dict["rcutoff"][order]:
+                escaped = ~np.isnan(rcutoffs)
+                samples.append((date_data_dict["azimuth"][escaped],
+                                date_data_dict["zenith"][escaped],
+                                rcutoffs[escaped]))
+            return list(np.array(dates)[order]), samples
+
+        escaped = gmrc.data_dict["rcutoff"] > 0.
+        return [_decimal_date(gmrc.date)], [(gmrc.data_dict["azimuth"][escaped],
+                                          gmrc.data_dict["zenith"][escaped],
+                                          gmrc.data_dict["rcutoff"][escaped])]
@@ -1,15 +1,218 @@
 import sys
 import os
+import copy
+import warnings
+import json
+import time
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from scipy.interpolate import griddata
+from scipy.stats import qmc
 from tqdm import tqdm
 from datetime import date
 
 from gtracr.trajectory import Trajectory
+from gtracr.utils import ymd_to_dec
+from gtracr.lib.location import Location
+from gtracr.lib._libgtracr import IGRF, GriddedField
+from gtracr.lib.gridded_field import igrf_file_path, igrf_grid_path
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 PARENT_DIR = os.path.dirname(CURRENT_DIR)
 
+# the evaluator and the field models of each worker process,
+# set by _init_worker
+_worker_gmrc = None
+_worker_fields = None
+
+
+def _load_field(bfield_type, date):
+    '''
+    Load the field model used by the trajectories of the given type and date.
+    The IGRF coefficients of the date are then cached in the process-wide
+    coefficient store, from which all trajectories of the process obtain
+    them, and the lattice of the gridded model is built if it does not exist
+    yet and kept mapped into memory while the model is alive.
+    '''
+    if bfield_type[0] == "i":
+        return IGRF(igrf_file_path(), ymd_to_dec(date))
+    elif bfield_type[0] == "g":
+        return GriddedField(igrf_grid_path(ymd_to_dec(date)))
+    return None
+
+
+def _worker_evaluator(evaluator):
+    '''
+    A copy of the evaluator (e.g. `GMRC`) with its configuration only, without
+    the results (`data_dict`, `date_data_dict`), which is sent to the worker
+    processes. The copy is shallow, such that the results of the evaluator are
+    not copied.
+    '''
+    worker_evaluator = copy.copy(evaluator)
+    for key in ["data_dict", "date_data_dict"]:
+        worker_evaluator.__dict__.pop(key, None)
+    return worker_evaluator
+
+
+def _init_worker(gmrc, dates):
+    '''
+    Initializes a worker process with a copy of the configuration of the
+    evaluator (e.g. `GMRC`, see `_worker_evaluator`), and loads the field models of the dates once for all chunks evaluated by
+    the worker.
+    '''
+    global _worker_gmrc, _worker_fields
+    _worker_gmrc = gmrc
+    _worker_fields = [_load_field(gmrc.bfield_type, date) for date in dates]
+
+
+def _evaluate_chunk_in_worker(args):
+    '''
+    Evaluates a chunk with the given method of the evaluator of the worker
+    process.
+    '''
+    method, chunk_args = args
+    return getattr(_worker_gmrc, method)(*chunk_args)
+
+
+def _map_chunks(evaluator,
+                chunk_args,
+                n_workers,
+                method="_evaluate_chunk",
+                dates=None):
+    '''
+    Evaluates the chunks with the arguments `chunk_args` (see the
+    `_evaluate_chunk` method of the evaluator, e.g. `GMRC`), either in the
+    current process or on a pool of `n_workers` worker processes. Yields the
+    result of each chunk in the order of the chunks.
+
+    The chunks are evaluated with the given method of the evaluator, and the
+    field models of `dates` (default: the date of the evaluator) are loaded
+    once per process.
+    '''
+    if dates is None:
+        dates = [evaluator.date]
+
+    # load the field models once, such that e.g. the lattice of the
+    # gridded model is built before the workers are started, and
+    # keep them alive while the chunks are evaluated
+    fields = [_load_field(evaluator.bfield_type, date) for date in dates]
+
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers,
+                                 initializer=_init_worker,
+                                 initargs=(_worker_evaluator(evaluator),
+                                           dates)) as executor:
+            # keep at most two chunks per worker in flight, such that
+            # the pending chunks and results stay bounded in memory
+            pending = deque()
+            for args in chunk_args:
+                pending.append(
+                    executor.submit(_evaluate_chunk_in_worker,
+                                    (method, args)))
+                if len(pending) >= 2 * n_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    else:
+        for args in chunk_args:
+            yield getattr(evaluator, method)(*args)
+
+
+def _cell_corners(cell, n_azimuth, n_zenith):
+    '''
+    The lattice indices (azimuth, zenith) of the corners of a cell of the
+    adaptive refinement. The cell is given by the lattice indices of its first
+    corner and its size, on a lattice with `n_azimuth` x `n_zenith` cells that
+    is periodic in the azimuth. The corners at the zenith angles of 0 and 180
+    degrees are the same direction for all azimuths.
+    '''
+    i, j, size = cell
+    corners = []
+    for di, dj in [(0, 0), (size, 0), (0, size), (size, size)]:
+        corner_j = j + dj
+        corner_i = (i + di) % n_azimuth if 0 < corner_j < n_zenith else 0
+        corners.append((corner_i, corner_j))
+    return corners
+
+
+def _split_cell(cell):
+    '''
+    Splits a cell of the adaptive refinement into four cells of half its size,
+    which have equal solid angles since the lattice is uniform in the azimuth
+    and in cos(zenith).
+    '''
+    i, j, size = cell
+    half = size // 2
+    return [(i + di, j + dj, half) for di in (0, half) for dj in (0, half)]
+
+
+class _DirectionSampler():
+    '''
+    Samples the directions of an evaluation chunk by chunk (see
+    `GMRC.sample_directions`).
+
+    The random directions are drawn from a PCG64 stream that is advanced to
+    the start of each chunk, such that the cost and memory of a chunk do not
+    depend on its start index. The low-discrepancy sequences are drawn from a
+    single scrambled sampler, which is advanced as the chunks are requested
+    (in ascending order), such that the sequence is generated once per
+    evaluation.
+    '''
+    def __init__(self, seed, sampling="random"):
+        self.seed = seed
+        self.sampling = sampling
+        self._sampler = None
+        self._position = 0
+
+    def sample(self, start, stop):
+        '''
+        The points in the unit square of the directions with indices
+        [start, stop).
+        '''
+        if self.sampling == "random":
+            # each point consumes two 64-bit outputs of the stream, such that
+            # the points are the rows of a single draw of all directions
+            bit_generator = np.random.PCG64(self.seed)
+            bit_generator.advance(2 * start)
+            return np.random.Generator(bit_generator).random(
+                (stop - start, 2))
+
+        # the sequence cannot be rewound, so start a new sampler
+        if self._sampler is None or start < self._position:
+            if self.sampling == "sobol":
+                self._sampler = qmc.Sobol(d=2, scramble=True, seed=self.seed)
+            else:
+                self._sampler = qmc.Halton(d=2, scramble=True, seed=self.seed)
+            self._position = 0
+        # continue the sequence at the start of the chunk
+        if start > self._position:
+            self._sampler.fast_forward(start - self._position)
+        with warnings.catch_warnings():
+            # the balance properties refer to the whole sequence,
+            # not to each chunk
+            warnings.simplefilter("ignore", UserWarning)
+            points = self._sampler.random(stop - start)
+        self._position = stop
+        return points
+
+    def directions(self, start, stop):
+        '''
+        The azimuth and zenith angles in degrees of the directions with
+        indices [start, stop).
+        '''
+        points = self.sample(start, stop)
+        azimuths = 360. * points[:, 0]
+        if self.sampling == "random":
+            # get random zenith and azimuth angles
+            # zenith angles range from 0 to 180
+            # azimuth angles range from 0 to 360
+            zeniths = 180. * points[:, 1]
+        else:
+            # uniform over the solid angle, i.e. uniform in cos(zenith)
+            zeniths = np.degrees(np.arccos(1. - 2. * points[:, 1]))
+        return azimuths, zeniths
+
 
 class GMRC():
     '''
@@ -22,8 +225,8 @@ class GMRC():
     Parameters
     -----------
 
-    - location : str
-        The location in which the geomagnetic cutoff rigidities are evaluated (default = "Kamioka"). The names must be one of the locations contained in `location_dict`, which is configured in `gtracr.utils`.
+    - location : str or Location
+        The location in which the geomagnetic cutoff rigidities are evaluated (default = "Kamioka"). The names must be one of the locations contained in `location_dict`, which is configured in `gtracr.utils`. A `Location` (from `gtracr.lib.location`) can be provided instead for locations that are not contained in `location_dict`.
     - particle_altitude : float
         The altitude in which the cosmic ray interacts with the atmosphere in km (default = 100).
     - iter_num : int
@@ -79,7 +282,18 @@ class GMRC():
             "rcutoff": np.zeros(self.iter_num)
         }
 
-    def evaluate(self, dt=1e-5, max_time=1):
+    def evaluate(self,
+                 dt=1e-5,
+                 max_time=1,
+                 search="linear",
+                 rigidity_tol=None,
+                 n_workers=1,
+                 chunk_size=100,
+                 seed=None,
+                 sampling="random",
+                 checkpoint=None,
+                 checkpoint_interval=60.,
+                 sink=None):
         '''
         Evaluate the rigidity cutoff value at some provided location
         on Earth for a given cosmic ray particle.
@@ -91,43 +305,696 @@ class GMRC():
             The stepsize of each trajectory evaluation (default = 1e-5)
         - max_time : float
             The maximal time of each trajectory evaluation (default = 1.).
+        - search : str
+            The method used to find the cutoff rigidity of each direction (default = "linear").
+            Either "linear", which evaluates each rigidity in `rigidity_list` in ascending order
+            until the particle escapes, such that the cutoff is resolved to `delta_rigidity`,
+            "bisect", which brackets the cutoff with steps that double in size from `delta_rigidity`
+            and bisects the bracket until it is smaller than `rigidity_tol`, or "penumbra", which
+            evaluates the penumbra of each direction (see `_penumbra_cutoffs`). The bisection requires
+            around log2((max_rigidity - min_rigidity) / rigidity_tol) trajectories per direction.
+            For "penumbra", the lower and upper cutoff rigidities are additionally stored as
+            "rlower" and "rupper" in `data_dict`, and the effective cutoff rigidity as "rcutoff".
+        - rigidity_tol : float
+            The resolution of the cutoff rigidity in GV for `search = "bisect"` and `search = "penumbra"`
+            (default = None, in which case 0.01 is used for "bisect" and `delta_rigidity` / 10
+            for "penumbra").
+        - n_workers : int
+            The number of worker processes (default = 1). Each worker loads the field model once,
+            and evaluates chunks of `chunk_size` directions. For n_workers = 1, the chunks are
+            evaluated in the current process.
+        - chunk_size : int
+            The number of directions per chunk (default = 100).
+        - seed : int
+            The seed of the random directions (default = None, in which case the seed is drawn
+            from `np.random`). The directions only depend on the seed and their index, such that
+            the results are the same for any number of workers and chunk size.
+        - sampling : str
+            The sampling scheme of the directions (default = "random"). Either "random", which
+            samples the azimuth and zenith angles uniformly, or "sobol" / "halton", which sample
+            the directions uniformly over the solid angle with a scrambled low-discrepancy
+            sequence. The low-discrepancy sequences cover the sky evenly without clumps and
+            holes, so fewer directions (`iter_num`) are required for the same quality of the
+            interpolated cutoffs. The balance properties of the Sobol sequence require
+            `iter_num` to be a power of 2.
+        - checkpoint : str
+            The path of the checkpoint file (default = None, i.e. no checkpoints). If provided,
+            the completed directions, the settings of the evaluation (including the seed of the
+            directions) and the results are written to the file (in .npz format) every
+            `checkpoint_interval` seconds and at the end of the evaluation. An interrupted
+            evaluation is continued with `GMRC.resume(checkpoint)`.
+        - checkpoint_interval : float
+            The minimal time between two checkpoints in seconds (default = 60.).
+        - sink : ResultSink
+            The output sink to which the results of each chunk are appended as soon as
+            the chunk is completed (default = None). See `gtracr.sinks`. If provided, the
+            results are only written to the sink and not stored in `data_dict`, such that
+            the memory does not grow with `iter_num`. The sink is not closed by `evaluate`.
+            Cannot be combined with `checkpoint`.
+
+        '''
+        if sink is not None and checkpoint is not None:
+            raise Exception("Only one of checkpoint and sink is allowed!")
+        rigidity_tol = self._search_tolerance(search, rigidity_tol)
+        if sampling not in ("random", "sobol", "halton"):
+            raise Exception(
+                "Only sampling schemes 'random', 'sobol' and 'halton' are allowed!")
+
+        # the results of a previous evaluation of several dates
+        # are replaced by the results of this evaluation
+        self.date_data_dict = None
+
+        # the seed from which the directions are sampled,
+        # obtained from the global random state if not provided
+        if seed is None:
+            seed = np.random.randint(2**32)
+
+        settings = {
+            "dt": dt,
+            "max_time": max_time,
+            "search": search,
+            "rigidity_tol": rigidity_tol,
+            "chunk_size": chunk_size,
+            "seed": int(seed),
+            "sampling": sampling
+        }
+        # the completed directions are only tracked for the checkpoints, such
+        # that the memory of a streaming evaluation does not grow with iter_num
+        completed = np.zeros(self.iter_num,
+                             dtype=bool) if sink is None else None
+        self._evaluate_directions(settings, completed, n_workers, checkpoint,
+                                  checkpoint_interval, sink)
+
+    @classmethod
+    def resume(cls, checkpoint, n_workers=1, checkpoint_interval=60.):
+        '''
+        Resume an evaluation from its checkpoint file (see `evaluate`). The
+        directions that were not completed at the time of the checkpoint are
+        evaluated with the same settings, such that the results are the same as
+        those of an uninterrupted evaluation. The checkpoint file continues to
+        be updated.
+
+        Parameters
+        ----------
+
+        - checkpoint : str
+            The path of the checkpoint file.
+        - n_workers : int
+            The number of worker processes (default = 1).
+        - checkpoint_interval : float
+            The minimal time between two checkpoints in seconds (default = 60.).
+
+        Returns
+        --------
+
+        - gmrc : GMRC
+            The evaluator with the results of all directions.
+        '''
+        with np.load(checkpoint) as checkpoint_data:
+            config = json.loads(str(checkpoint_data["config"]))
+            if isinstance(config["location"], dict):
+                config["location"] = Location(**config["location"])
+            gmrc = cls(**config)
+            settings = json.loads(str(checkpoint_data["settings"]))
+            completed = checkpoint_data["completed"]
+            gmrc.data_dict = {
+                key[len("data_"):]: checkpoint_data[key]
+                for key in checkpoint_data.files if key.startswith("data_")
+            }
 
+        gmrc._evaluate_directions(settings, completed, n_workers, checkpoint,
+                                  checkpoint_interval)
+        return gmrc
+
+    def _evaluate_directions(self,
+                             settings,
+                             completed,
+                             n_workers,
+                             checkpoint,
+                             checkpoint_interval,
+                             sink=None):
+        '''
+        Evaluates the chunks of directions that are not completed yet with the
+        settings of `evaluate`, and writes the checkpoints.
         '''
+        # the penumbra of each direction
+        if settings["search"] == "penumbra" and sink is None:
+            for key in ["rlower", "rupper"]:
+                self.data_dict.setdefault(key, np.zeros(self.iter_num))
 
         # perform Monte Carlo integration to get cutoff rigidity
-        for i in tqdm(range(self.iter_num)):
-            # get a random zenith and azimuth angle
-            # zenith angles range from 0 to 180
-            # azimuth angles range from 0 to 360
-            [azimuth, zenith] = np.random.rand(2)
-            azimuth *= 360.
-            zenith *= 180.
-
-            # iterate through each rigidity, and break the loop
-            # when particle is able to escape earth
-            for rigidity in self.rigidity_list:
-
-                traj = Trajectory(plabel=self.plabel,
-                                  location_name=self.location,
-                                  zenith_angle=zenith,
-                                  azimuth_angle=azimuth,
-                                  particle_altitude=100.,
-                                  rigidity=rigidity,
-                                  bfield_type=self.bfield_type,
-                                  date=self.date)
-
-                traj.get_trajectory(dt=dt, max_time=max_time)
-                # break loop and append direction and current rigidity if particle has escaped
-
-                if traj.particle_escaped == True:
-                    # self.azimuth_arr[i] = azimuth
-                    # self.zenith_arr[i] = zenith
-                    # self.rcutoff_arr[i] = rigidity
-                    self.data_dict["azimuth"][i] = azimuth
-                    self.data_dict["zenith"][i] = zenith
-                    self.data_dict["rcutoff"][i] = rigidity
-                    # self.rcutoff_arr.append((azimuth, zenith, rig))
-                    break
+        last_checkpoint = time.monotonic()
+        with tqdm(total=self.iter_num,
+                  initial=0 if completed is None else np.sum(completed)
+                  ) as progress_bar:
+            for chunk_result in _map_chunks(
+                    self, self._chunk_args(settings, completed), n_workers):
+                if sink is not None:
+                    sink.append(*chunk_result)
+                else:
+                    self._store_chunk(*chunk_result)
+                start, azimuths = chunk_result[:2]
+                if completed is not None:
+                    completed[start:start + len(azimuths)] = True
+                progress_bar.update(len(azimuths))
+
+                if checkpoint is not None and (time.monotonic() -
+                                               last_checkpoint >=
+                                               checkpoint_interval):
+                    self._write_checkpoint(checkpoint, settings, completed)
+                    last_checkpoint = time.monotonic()
+
+        if checkpoint is not None:
+            self._write_checkpoint(checkpoint, settings, completed)
+
+    def _chunk_args(self, settings, completed):
+        '''
+        Yields the arguments of `_evaluate_chunk` for each chunk of directions
+        that is not completed yet (all chunks if `completed` is None). The
+        directions are sampled when the chunk is requested, such that only the
+        pending chunks are kept in memory.
+        '''
+        sampler = _DirectionSampler(settings["seed"], settings["sampling"])
+        for start in range(0, self.iter_num, settings["chunk_size"]):
+            stop = min(start + settings["chunk_size"], self.iter_num)
+            if completed is not None and np.all(completed[start:stop]):
+                continue
+            azimuths, zeniths = sampler.directions(start, stop)
+            yield (start, azimuths, zeniths, settings["dt"],
+                   settings["max_time"], settings["search"],
+                   settings["rigidity_tol"])
+
+    def _write_checkpoint(self, checkpoint, settings, completed):
+        '''
+        Writes the configuration of the evaluator, the settings of the
+        evaluation, the completed directions and the results to the checkpoint
+        file. The file is replaced atomically, such that an interruption while
+        writing leaves the previous checkpoint intact.
+        '''
+        config = {
+            "location":
+            vars(self.location)
+            if isinstance(self.location, Location) else self.location,
+            "particle_altitude": self.palt,
+            "iter_num": self.iter_num,
+            "bfield_type": self.bfield_type,
+            "particle_type": self.plabel,
+            "date": self.date,
+            "min_rigidity": self.rmin,
+            "max_rigidity": self.rmax,
+            "delta_rigidity": self.rdelta
+        }
+        tmp_path = checkpoint + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f,
+                     config=json.dumps(config),
+                     settings=json.dumps(settings),
+                     completed=completed,
+                     **{
+                         "data_" + key: values
+                         for key, values in self.data_dict.items()
+                     })
+        os.replace(tmp_path, checkpoint)
+
+    def evaluate_dates(self,
+                       dates,
+                       dt=1e-5,
+                       max_time=1,
+                       search="linear",
+                       rigidity_tol=None,
+                       n_workers=1,
+                       chunk_size=100,
+                       seed=None,
+                       sampling="random"):
+        '''
+        Evaluate the rigidity cutoffs of the same directions for several dates, e.g. to
+        study the secular variation of the cutoffs.
+
+        The `iter_num` directions are sampled once, and each chunk of directions is
+        evaluated for all dates. The coefficients of the IGRF model are read once per
+        process, and the coefficients interpolated to each date are shared by all
+        trajectories of the date (up to 64 dates are kept at a time).
+
+        The results are stored in `date_data_dict`, with the dates ("date") and the
+        directions ("azimuth", "zenith") of the evaluation, and the cutoff rigidities
+        ("rcutoff", and "rlower" / "rupper" for `search = "penumbra"`) as arrays of
+        shape (number of dates, iter_num). The cutoff rigidities are NaN if the particle
+        does not escape within the range of rigidities, such that the cutoffs of two
+        dates can be differenced directly. A later evaluation with `evaluate` or
+        `evaluate_adaptive` resets `date_data_dict` to None.
+
+        Parameters
+        ----------
+
+        - dates : list(str)
+            The dates of the evaluation in yyyy-mm-dd format.
+        - dt, max_time, search, rigidity_tol, n_workers, chunk_size, seed, sampling :
+            See `evaluate`.
+        '''
+        rigidity_tol = self._search_tolerance(search, rigidity_tol)
+        if sampling not in ("random", "sobol", "halton"):
+            raise Exception(
+                "Only sampling schemes 'random', 'sobol' and 'halton' are allowed!")
+
+        if seed is None:
+            seed = np.random.randint(2**32)
+
+        # sample the directions of each chunk when the chunk is requested
+        def chunk_args():
+            sampler = _DirectionSampler(seed, sampling)
+            for start in range(0, self.iter_num, chunk_size):
+                stop = min(start + chunk_size, self.iter_num)
+                azimuths, zeniths = sampler.directions(start, stop)
+                yield (start, azimuths, zeniths, dates, dt, max_time, search,
+                       rigidity_tol)
+
+        self.date_data_dict = {
+            "date": np.array(dates),
+            "azimuth": np.zeros(self.iter_num),
+            "zenith": np.zeros(self.iter_num)
+        }
+        with tqdm(total=self.iter_num * len(dates)) as progress_bar:
+            for start, azimuths, zeniths, cutoffs in _map_chunks(
+                    self,
+                    chunk_args(),
+                    n_workers,
+                    method="_evaluate_dates_chunk",
+                    dates=dates):
+                stop = start + len(azimuths)
+                self.date_data_dict["azimuth"][start:stop] = azimuths
+                self.date_data_dict["zenith"][start:stop] = zeniths
+                for key, values in cutoffs.items():
+                    self.date_data_dict.setdefault(
+                        key, np.full((len(dates), self.iter_num),
+                                     np.nan))[:, start:stop] = values
+                progress_bar.update(len(azimuths) * len(dates))
+
+    def evaluate_adaptive(self,
+                          dt=1e-5,
+                          max_time=1,
+                          search="linear",
+                          rigidity_tol=None,
+                          n_workers=1,
+                          chunk_size=100,
+                          initial_grid=(16, 8),
+                          threshold=None,
+                          max_depth=6):
+        '''
+        Evaluate the rigidity cutoffs with directions that are refined adaptively
+        where the cutoff varies sharply, using at most `iter_num` directions.
+
+        The sky is divided into a coarse grid of cells with equal solid angle
+        (uniform in the azimuth and in cos(zenith)), and the cutoffs are evaluated
+        at the corners of the cells. The cells in which the cutoffs of the corners
+        differ by more than `threshold` are then split into four cells of equal
+        solid angle, in the order of decreasing difference, and the cutoffs at
+        the new corners are evaluated. This is repeated until no cell differs by
+        more than `threshold` (the error target) or `max_depth` is reached, or
+        until the next cell would exceed the budget of `iter_num` directions.
+        Directions whose particle does not escape within the range of rigidities
+        count as `max_rigidity` when comparing the corners.
+
+        The directions and cutoffs are stored in `data_dict` as in `evaluate`,
+        and `iter_num` is set to the number of evaluated directions, such that
+        the results are interpolated with `interpolate_results`.
+
+        Parameters
+        ----------
+
+        - dt, max_time, search, rigidity_tol, n_workers, chunk_size :
+            See `evaluate`.
+        - initial_grid : tuple(int, int)
+            The number of cells of the initial grid in the azimuth and zenith angles
+            (default = (16, 8)). The initial grid has (n_azimuth x (n_zenith - 1) + 2)
+            directions, which must not exceed `iter_num`.
+        - threshold : float
+            The maximal difference in GV between the cutoff rigidities at the corners
+            of a cell, above which the cell is split (default = None, in which case
+            `delta_rigidity` is used).
+        - max_depth : int
+            The maximal number of times that a cell of the initial grid is split
+            (default = 6).
+
+        '''
+        rigidity_tol = self._search_tolerance(search, rigidity_tol)
+        if threshold is None:
+            threshold = self.rdelta
+        # the results of a previous evaluation of several dates
+        # are replaced by the results of this evaluation
+        self.date_data_dict = None
+
+        # the corners of all cells lie on the lattice of the cells of maximal depth
+        n_azimuth = initial_grid[0] * 2**max_depth
+        n_zenith = initial_grid[1] * 2**max_depth
+
+        cells = [(i * 2**max_depth, j * 2**max_depth, 2**max_depth)
+                 for i in range(initial_grid[0])
+                 for j in range(initial_grid[1])]
+        # the directions to evaluate, as an ordered set of lattice indices
+        corners = dict.fromkeys(
+            corner for cell in cells
+            for corner in _cell_corners(cell, n_azimuth, n_zenith))
+        if len(corners) > self.iter_num:
+            raise Exception(
+                "The initial grid has more directions than iter_num!")
+
+        # the cutoff rigidity of each evaluated corner
+        cutoffs = {}
+        # the directions and the cutoff rigidities of each chunk
+        azimuths, zeniths, results = [], [], []
+
+        with tqdm(total=self.iter_num) as progress_bar:
+            while corners:
+                # evaluate the new corners in chunks
+                indices = np.array(list(corners), dtype=float)
+                corner_azimuths = 360. * indices[:, 0] / n_azimuth
+                corner_zeniths = np.degrees(
+                    np.arccos(1. - 2. * indices[:, 1] / n_zenith))
+                chunk_args = []
+                for start in range(0, len(indices), chunk_size):
+                    stop = min(start + chunk_size, len(indices))
+                    chunk_args.append(
+                        (len(azimuths) + start, corner_azimuths[start:stop],
+                         corner_zeniths[start:stop], dt, max_time, search,
+                         rigidity_tol))
+
+                for (_, chunk_azimuths, chunk_zeniths,
+                     chunk_cutoffs) in _map_chunks(self, chunk_args,
+                                                   n_workers):
+                    azimuths.extend(chunk_azimuths)
+                    zeniths.extend(chunk_zeniths)
+                    results.append(chunk_cutoffs)
+                    progress_bar.update(len(chunk_azimuths))
+                cutoffs.update(
+                    zip(
+                        corners,
+                        np.concatenate([
+                            chunk_cutoffs["rcutoff"]
+                            for chunk_cutoffs in results[-len(chunk_args):]
+                        ])))
+
+                # the cells to split, in the order of decreasing difference
+                # of the cutoffs at their corners
+                spreads = []
+                for cell in cells:
+                    corner_cutoffs = np.nan_to_num(
+                        [cutoffs[corner] for corner in _cell_corners(
+                            cell, n_azimuth, n_zenith)],
+                        nan=self.rmax)
+                    spread = np.max(corner_cutoffs) - np.min(corner_cutoffs)
+                    if cell[2] > 1 and spread > threshold:
+                        spreads.append((spread, cell))
+                spreads.sort(reverse=True)
+
+                # split the cells as long as their new corners fit into the budget
+                corners = {}
+                split_cells = set()
+                for _, cell in spreads:
+                    new_corners = [
+                        corner for child in _split_cell(cell)
+                        for corner in _cell_corners(child, n_azimuth, n_zenith)
+                        if corner not in cutoffs and corner not in corners
+                    ]
+                    # dict.fromkeys to not count shared corners twice
+                    new_corners = list(dict.fromkeys(new_corners))
+                    if len(cutoffs) + len(corners) + len(
+                            new_corners) > self.iter_num:
+                        break
+                    corners.update(dict.fromkeys(new_corners))
+                    split_cells.add(cell)
+
+                cells = [cell for cell in cells if cell not in split_cells] + [
+                    child for cell in cells if cell in split_cells
+                    for child in _split_cell(cell)
+                ]
+
+        # store the evaluated directions
+        self.iter_num = len(azimuths)
+        self.data_dict = {
+            key: np.zeros(self.iter_num)
+            for key in ["azimuth", "zenith"] + list(results[0])
+        }
+        self._store_chunk(
+            0, np.array(azimuths), np.array(zeniths), {
+                key: np.concatenate(
+                    [chunk_cutoffs[key] for chunk_cutoffs in results])
+                for key in results[0]
+            })
+
+    def sample_directions(self, start, stop, seed, sampling="random"):
+        '''
+        Sample the directions with indices [start, stop) of the evaluation.
+
+        The directions only depend on the seed and their indices, such that
+        they do not depend on how the directions are split into chunks.
+
+        Parameters
+        ----------
+
+        - start, stop : int
+            The range of indices of the directions
+        - seed : int
+            The seed of the directions
+        - sampling : str
+            The sampling scheme, either "random", "sobol" or "halton" (default = "random").
+            See `evaluate`.
+
+        Returns
+        --------
+
+        - azimuths, zeniths : np.array(float), size stop - start
+            The azimuth (from 0 to 360) and zenith (from 0 to 180) angles of the
+            directions in degrees.
+        '''
+        return _DirectionSampler(seed, sampling).directions(start, stop)
+
+    def _search_tolerance(self, search, rigidity_tol):
+        '''
+        Checks the search method of the cutoff rigidities, and returns the
+        resolution of the cutoff rigidity used by the search method.
+        '''
+        if search not in ("linear", "bisect", "penumbra"):
+            raise Exception(
+                "Only search methods 'linear', 'bisect' and 'penumbra' are allowed!")
+        if rigidity_tol is None:
+            rigidity_tol = self.rdelta / 10. if search == "penumbra" else 0.01
+        return rigidity_tol
+
+    def _evaluate_chunk(self, start, azimuths, zeniths, dt, max_time, search,
+                        rigidity_tol):
+        '''
+        Evaluates the cutoff rigidities of the directions with indices
+        [start, start + len(azimuths)).
+
+        Returns the start index, the azimuth and zenith of each direction, and
+        a dictionary with the cutoff rigidity ("rcutoff") of each direction
+        (NaN if the particle does not escape within the range of rigidities),
+        together with the lower ("rlower") and upper ("rupper") cutoff
+        rigidities for `search = "penumbra"`.
+        '''
+        keys = ["rcutoff", "rlower", "rupper"
+                ] if search == "penumbra" else ["rcutoff"]
+        cutoffs = {key: np.full(len(azimuths), np.nan) for key in keys}
+
+        for i, (azimuth, zenith) in enumerate(zip(azimuths, zeniths)):
+            traj = self._trajectory(zenith, azimuth)
+            if search == "penumbra":
+                penumbra = self._penumbra_cutoffs(traj, dt, max_time,
+                                                  rigidity_tol)
+                if penumbra is not None:
+                    (cutoffs["rlower"][i], cutoffs["rupper"][i],
+                     cutoffs["rcutoff"][i]) = penumbra
+                continue
+
+            if search == "bisect":
+                rcutoff = self._bisect_cutoff(traj, dt, max_time,
+                                              rigidity_tol)
+            else:
+                rcutoff = self._linear_cutoff(traj, dt, max_time)
+
+            if rcutoff is not None:
+                cutoffs["rcutoff"][i] = rcutoff
+
+        return start, azimuths, zeniths, cutoffs
+
+    def _evaluate_dates_chunk(self, start, azimuths, zeniths, dates, dt,
+                              max_time, search, rigidity_tol):
+        '''
+        Evaluates the cutoff rigidities of the directions with indices
+        [start, start + len(azimuths)) for each date.
+
+        Returns the start index, the azimuth and zenith of each direction, and
+        a dictionary with the cutoff rigidities (see `_evaluate_chunk`) as arrays
+        of shape (len(dates), len(azimuths)).
+        '''
+        evaluator_date = self.date
+        date_cutoffs = []
+        try:
+            for date in dates:
+                self.date = date
+                date_cutoffs.append(
+                    self._evaluate_chunk(start, azimuths, zeniths, dt,
+                                         max_time, search, rigidity_tol)[3])
+        finally:
+            self.date = evaluator_date
+
+        cutoffs = {
+            key: np.stack([cutoffs[key] for cutoffs in date_cutoffs])
+            for key in date_cutoffs[0]
+        }
+        return start, azimuths, zeniths, cutoffs
+
+    def _store_chunk(self, start, azimuths, zeniths, cutoffs):
+        '''
+        Stores the results of a chunk of directions in `data_dict`.
+        '''
+        # append direction and cutoff rigidity only if particle has escaped
+        # within the range of rigidities
+        escaped = ~np.isnan(cutoffs["rcutoff"])
+        indices = start + np.flatnonzero(escaped)
+        self.data_dict["azimuth"][indices] = azimuths[escaped]
+        self.data_dict["zenith"][indices] = zeniths[escaped]
+        for key, values in cutoffs.items():
+            self.data_dict[key][indices] = values[escaped]
+
+    def _trajectory(self, zenith, azimuth):
+        '''
+        Creates the trajectory of the cosmic ray with the given direction, whose
+        initial six-vector is shared by all rigidities evaluated for the direction.
+        '''
+        if isinstance(self.location, Location):
+            coordinates = {
+                "latitude": self.location.latitude,
+                "longitude": self.location.longitude,
+                "detector_altitude": self.location.altitude
+            }
+        else:
+            coordinates = {"location_name": self.location}
+
+        return Trajectory(plabel=self.plabel,
+                          **coordinates,
+                          zenith_angle=zenith,
+                          azimuth_angle=azimuth,
+                          particle_altitude=self.palt,
+                          rigidity=self.rmin,
+                          bfield_type=self.bfield_type,
+                          date=self.date)
+
+    def _escaped(self, traj, rigidity, dt, max_time):
+        '''
+        Evaluates whether the cosmic ray in the direction of the trajectory
+        is able to escape Earth with the given rigidity, i.e. whether the
+        trajectory is allowed.
+        '''
+        rcutoff, _ = traj.find_cutoff([rigidity], dt=dt, max_time=max_time)
+        return rcutoff is not None
+
+    def _linear_cutoff(self, traj, dt, max_time):
+        '''
+        Obtains the cutoff rigidity of a direction as the lowest rigidity in
+        `rigidity_list` in which the particle escapes, or None if the particle
+        does not escape for any rigidity.
+        '''
+        # iterate through each rigidity in C++, and stop
+        # when particle is able to escape earth
+        rcutoff, _ = traj.find_cutoff(self.rigidity_list,
+                                      dt=dt,
+                                      max_time=max_time)
+        return rcutoff
+
+    def _bisect_cutoff(self, traj, dt, max_time, rigidity_tol):
+        '''
+        Obtains the cutoff rigidity of a direction by bisection, or None if the
+        particle does not escape at the highest rigidity in `rigidity_list`.
+
+        The range of rigidities is the same as for the linear scan, i.e. from the
+        first to the last rigidity in `rigidity_list` (which excludes the maximum
+        rigidity). The cutoff is first bracketed by increasing the rigidity from the
+        minimum rigidity in steps that double in size (starting from
+        `delta_rigidity`), such that low cutoffs are bracketed with few
+        trajectories. The bracket is then bisected until it is smaller than
+        `rigidity_tol`. The returned rigidity is the lowest rigidity in which
+        the particle was found to escape.
+        '''
+        rmin, rmax = self.rigidity_list[0], self.rigidity_list[-1]
+
+        # the cutoff lies below the range of rigidities
+        if self._escaped(traj, rmin, dt, max_time):
+            return rmin
+
+        # bracket the cutoff between a forbidden and an allowed rigidity
+        rlow, step = rmin, self.rdelta
+        while True:
+            rhigh = min(rlow + step, rmax)
+            if self._escaped(traj, rhigh, dt, max_time):
+                break
+            # the cutoff lies above the range of rigidities
+            if rhigh >= rmax:
+                return None
+            rlow, step = rhigh, 2. * step
+
+        # bisect the bracket (forbidden, allowed)
+        while rhigh - rlow > rigidity_tol:
+            rmid = 0.5 * (rlow + rhigh)
+            if self._escaped(traj, rmid, dt, max_time):
+                rhigh = rmid
+            else:
+                rlow = rmid
+        return rhigh
+
+    def _penumbra_cutoffs(self, traj, dt, max_time, rigidity_tol):
+        '''
+        Obtains the lower, upper and effective cutoff rigidities of a direction,
+        or None if the particle does not escape at the highest rigidity in
+        `rigidity_list`.
+
+        The allowed and forbidden rigidities are first found with a coarse scan
+        of all rigidities in `rigidity_list`. The penumbra lies between the
+        forbidden rigidity below the lowest allowed rigidity and the allowed
+        rigidity above the highest forbidden rigidity, and only this band is
+        scanned again in steps of (at most) `rigidity_tol`. From the fine scan,
+        the lower cutoff R_L is the lowest allowed rigidity, the upper cutoff R_U
+        is the rigidity above which all rigidities are allowed, and the effective
+        cutoff is R_U minus the width of the allowed rigidities between R_L and
+        R_U (Størmer-style effective cutoff).
+        '''
+        # coarse scan of all rigidities
+        _, allowed = traj.find_cutoff(self.rigidity_list,
+                                      dt=dt,
+                                      max_time=max_time,
+                                      stop_at_first=False)
+        # the upper cutoff lies above the range of rigidities
+        if not allowed[-1]:
+            return None
+
+        # the band of the penumbra in the coarse scan
+        forbidden_indices = np.flatnonzero(~allowed)
+        if len(forbidden_indices) == 0:
+            # the cutoff lies below the range of rigidities
+            return self.rmin, self.rmin, self.rmin
+        ilow = max(np.flatnonzero(allowed)[0] - 1, 0)
+        ihigh = forbidden_indices[-1] + 1
+
+        # fine scan within the band, whose bounds are known from the coarse scan
+        rlow, rhigh = self.rigidity_list[ilow], self.rigidity_list[ihigh]
+        nsteps = int(np.ceil((rhigh - rlow) / rigidity_tol - 1e-9))
+        rigidities = np.linspace(rlow, rhigh, nsteps + 1)
+        _, fine_allowed = traj.find_cutoff(rigidities[1:-1],
+                                           dt=dt,
+                                           max_time=max_time,
+                                           stop_at_first=False)
+        allowed = np.concatenate(
+            ([allowed[ilow]], fine_allowed, [allowed[ihigh]]))
+
+        # the lowest allowed rigidity and the rigidity above the
+        # highest forbidden rigidity
+        forbidden_indices = np.flatnonzero(~allowed)
+        ilower = np.flatnonzero(allowed)[0]
+        iupper = forbidden_indices[-1] + 1 if len(forbidden_indices) else 0
+        rlower, rupper = rigidities[ilower], rigidities[iupper]
+        reff = rupper - (rhigh - rlow) / nsteps * np.sum(
+            allowed[ilower:iupper])
+        return rlower, rupper, reff
 
     def interpolate_results(self,
                             method="linear",
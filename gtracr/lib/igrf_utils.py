@@ -15,6 +15,8 @@ Functions for computing main field, the non-linear coefficients of the field,
 """
 
 import os
+import mmap
+import struct
 import numpy as np
 from numpy import degrees, radians
 from math import pi
@@ -31,6 +33,32 @@ class igrf:  # A simple class to put the igrf file values into
         self.parameters = parameters
 
 
+# the coefficient files loaded by load_shcfile / load_binfile, keyed on the
+# loader and the absolute path, together with the modification time of the
+# file when it was loaded
+_loaded_files = {}
+
+
+def _cached_load(loader, filepath):
+    """
+    Load a coefficient file with the loader, or return the coefficients of
+    the previous call if the file has not been modified since then. The
+    arrays of the cached coefficients are read-only, since they are shared by
+    all callers.
+    """
+    key = (loader.__name__, os.path.abspath(filepath))
+    mtime = os.path.getmtime(filepath)
+
+    cached = _loaded_files.get(key)
+    if cached is None or cached[0] != mtime:
+        coeffs = loader(filepath)
+        coeffs.time.flags.writeable = False
+        coeffs.coeffs.flags.writeable = False
+        cached = (mtime, coeffs)
+        _loaded_files[key] = cached
+    return cached[1]
+
+
 def check_int(s):
     """Convert to integer."""
     try:
@@ -77,35 +105,117 @@ def load_shcfile(filepath, leap_year=None):
         snapshots until next break point. Extract break points of the
         piecewise polynomial with ``breaks = time[::step]``.
 
+    The file is only parsed again if it has been modified since the last
+    call, and the returned arrays are read-only.
+
     """
     leap_year = True if leap_year is None else leap_year
 
+    return _cached_load(_parse_shcfile, filepath)
+
+
+def _parse_shcfile(filepath):
+    """
+    Parse the shc-file in a single pass (see `load_shcfile`).
+    """
     with open(filepath, 'r') as f:
+        lines = [
+            line for line in f
+            if line.strip() and not line.startswith('#')
+        ]
 
-        data = np.array([])
-        for line in f.readlines():
+    # unpack parameter line, which is the first line after the comments
+    name = os.path.split(filepath)[1]  # file name string
+    values = [name] + [int(float(value)) for value in lines[0].split()]
+    keys = [
+        'SHC', 'nmin', 'nmax', 'N', 'order', 'step', 'start_year', 'end_year'
+    ]
+    parameters = dict(zip(keys, values))
 
-            if line[0] == '#':
-                continue
+    # parse the times and coefficients of all remaining lines at once
+    data = np.fromstring(" ".join(lines[1:]), sep=' ')
 
-            read_line = np.fromstring(line, sep=' ')
-            if read_line.size == 7:
-                name = os.path.split(filepath)[1]  # file name string
-                values = [name] + read_line.astype(np.int).tolist()
+    time = data[:parameters['N']]
+    coeffs = data[parameters['N']:].reshape((-1, parameters['N'] + 2))
+    coeffs = np.squeeze(coeffs[:, 2:])  # discard columns with n and m
 
-            else:
-                data = np.append(data, read_line)
+    return igrf(time, coeffs, parameters)
 
-        # unpack parameter line
-        keys = [
-            'SHC', 'nmin', 'nmax', 'N', 'order', 'step', 'start_year',
-            'end_year'
-        ]
-        parameters = dict(zip(keys, values))
 
-        time = data[:parameters['N']]
-        coeffs = data[parameters['N']:].reshape((-1, parameters['N'] + 2))
-        coeffs = np.squeeze(coeffs[:, 2:])  # discard columns with n and m
+def load_binfile(filepath):
+    """
+    Load the binary coefficient file (as produced by scripts/cof_to_json.py)
+    with a memory map and return coefficient arrays in the same form as
+    `load_shcfile`.
+
+    The coefficients of the last epoch are extrapolated by 5 years with its
+    secular variation coefficients, which gives the last snapshot of the
+    shc-file.
+
+    Parameters
+    ----------
+    filepath : str
+        File path to the binary coefficient file.
+
+    Returns
+    -------
+    time : ndarray, shape (N,)
+        Array containing `N` times for each model snapshot in years.
+    coeffs : ndarray, shape (nmax(nmax+2), N)
+        Coefficients of model snapshots. Each column is a snapshot up to
+        spherical degree and order `nmax`.
+    parameters : dict, {'SHC', 'nmin', 'nmax', 'N', 'order', 'step'}
+        Dictionary containing parameters of the model snapshots, with the
+        same keys as in `load_shcfile`.
+
+    As with `load_shcfile`, the file is only read again if it has been
+    modified since the last call, and the returned arrays are read-only.
+
+    """
+    return _cached_load(_read_binfile, filepath)
+
+
+def _read_binfile(filepath):
+    """
+    Read the binary coefficient file (see `load_binfile`).
+    """
+    with open(filepath, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    # header : magic, version, nepochs, maxcoeff, reserved
+    magic, version, nepochs, maxcoeff, _ = struct.unpack_from("<8sIIII", buf, 0)
+    if magic != b"GTRIGRF\0" or version != 1:
+        raise ValueError(
+            "{:s} is not a binary IGRF coefficient file.".format(filepath))
+
+    # the blocks are read directly from the memory map
+    offset = struct.calcsize("<8sIIII")
+    epochs = np.frombuffer(buf, dtype="<f8", count=nepochs, offset=offset)
+    offset += 8 * nepochs
+    nmain = np.frombuffer(buf, dtype="<i4", count=nepochs, offset=offset)
+    offset += 8 * nepochs  # nmain and nsv
+    gh = np.frombuffer(buf, dtype="<f8", count=nepochs * maxcoeff,
+                       offset=offset).reshape((nepochs, maxcoeff))
+    offset += 8 * nepochs * maxcoeff
+    gh_sv = np.frombuffer(buf, dtype="<f8", count=nepochs * maxcoeff,
+                          offset=offset).reshape((nepochs, maxcoeff))
+
+    # append the extrapolated snapshot 5 years after the last epoch
+    time = np.append(epochs, epochs[-1] + 5.)
+    coeffs = np.empty((maxcoeff, nepochs + 1))
+    coeffs[:, :-1] = gh.T
+    coeffs[:, -1] = gh[-1] + 5. * gh_sv[-1]
+
+    parameters = {
+        'SHC': os.path.split(filepath)[1],
+        'nmin': 1,
+        'nmax': int(np.max(nmain)),
+        'N': nepochs + 1,
+        'order': 2,
+        'step': 1,
+        'start_year': int(time[0]),
+        'end_year': int(time[-1])
+    }
 
     return igrf(time, coeffs, parameters)
 
@@ -40,6 +40,43 @@ class MagneticField {
     val[2] = 0.;
     return val;
   }
+  /*
+    Obtain the values of the magnetic field for a specified (x, y, z) value
+    in Earth-centered, Earth-fixed (ECEF) Cartesian coordinates in the dipole
+    field approximation.
+
+    The dipole field is evaluated directly from the Cartesian components,
+    so that no trigonometric functions are required and the field is regular
+    at the poles.
+
+    Parameters
+    -----------
+
+    - x (const double &) : the x-component
+    - y (const double &) : the y-component
+    - z (const double &) : the z-component (along the rotation axis)
+
+    Returns
+    --------
+
+    - val (std::array<double, 3>) :
+        array containing the magnetic field values [Bx, By, Bz]
+  */
+  inline std::array<double, 3> ecef_values(const double &x, const double &y,
+                                           const double &z) {
+    double r2 = (x * x) + (y * y) + (z * z);
+    double r = sqrt(r2);
+    // B0 * (RE / r)^3
+    double bmag = (constants::RE / r) * (constants::RE / r) *
+                  (constants::RE / r) * B0;
+    // B = B0 * (RE / r)^3 * (3 * cos(theta) * rhat - zhat)
+    double cos3 = 3. * z / r2;
+    std::array<double, 3> val;
+    val[0] = bmag * cos3 * x;
+    val[1] = bmag * cos3 * y;
+    val[2] = bmag * ((cos3 * z) - 1.);
+    return val;
+  }
 
 };
 
@@ -10,24 +10,36 @@ by performing a 4th-order Runge Kutta numerical integration algorithm.
 #include <functional>
 #include <iostream>
 #include <map>
+#include <stdexcept>
 #include <string>
 #include <utility>
 #include <vector>
 
 #include "MagneticField.hpp"
 #include "constants.hpp"
+#include "coordinates.hpp"
+#include "field_model.hpp"
 #include "igrf.hpp"
+#include "trajectory_data.hpp"
+#include "parallel.hpp"
 
+template <class Field>
 class TrajectoryTracer {
   /*
 Trajectory Tracer class that traces the trajectory of the particle
 by performing a 4th-order Runge Kutta numerical integration algorithm.
 
+The magnetic field model is given by the template parameter Field, such
+that the field is evaluated without any indirection in each stage of the
+integration. The tracer is compiled for the dipole model
+(TrajectoryTracer<MagneticField>) and the IGRF model
+(TrajectoryTracer<IGRF>).
+
 Class Members
 --------------
-  - bfield_ (MagneticField instance):
-      The MagneticField object that contains the information pertaining the
-      Earth's magnetic field model (default is dipole model).
+  - bfield_ (Field instance):
+      The magnetic field model (MagneticField for the dipole model, IGRF for
+      the IGRF model).
   - charge_ (double) :
       The charge of the particle in units of Coulombs (default 1.602e-19 C, i.e.
   1e).
@@ -46,9 +58,20 @@ Class Members
   - particle_escaped_ (bool) :
       True if particle has effectively "escaped" from Earth (i.e. when the
       radial component of the trajectory > escape_radius_) (default false).
+  - adaptive_ (bool) :
+      True if the trajectory is integrated with the adaptive Dormand-Prince
+      (RK45) integrator instead of the fixed-step RK4 integrator
+      (default false).
+  - rtol_, atol_ (double) :
+      The relative and absolute error tolerances per step of the adaptive
+      integrator (default 1e-6, 1e-9).
+  - cartesian_ (bool) :
+      True if the equations of motion are integrated in Earth-centered,
+      Earth-fixed (ECEF) Cartesian coordinates instead of spherical
+      coordinates (default false).
 */
  private:
-  MagneticField bfield_;  // the magnetic field
+  Field bfield_;          // the magnetic field
   double charge_;         // charge of the particle in coulumbs
   double mass_;           // mass of the particle in kg
   double start_altitude_;   // starting altitude of particle
@@ -62,6 +85,11 @@ Class Members
   std::array<double, 6>
       final_sixvector_;  // the final six-vector of the trajectory
 
+  bool adaptive_;  // use the adaptive RK45 integrator or not
+  double rtol_;    // relative error tolerance of the adaptive integrator
+  double atol_;    // absolute error tolerance of the adaptive integrator
+  bool cartesian_;  // integrate in Cartesian coordinates or not
+
   // SixVector objects to store each RK parameter
 //   SixVector k1_vec;
 //   SixVector k2_vec;
@@ -90,6 +118,72 @@ Lorentz force equation
 */
   std::array<double, 6> ode_lrz(const double t, const std::array<double, 6> &vec);
 
+  /* The ordinary differential equations that describes the motion
+of charge particles in Earth's magnetic field via the Lorentz force
+in Earth-centered, Earth-fixed (ECEF) Cartesian coordinates.
+
+Unlike the spherical form, no trigonometric functions are evaluated
+(for the dipole model) and the equations are regular at the poles.
+
+Parameters
+-----------
+- t (double) :
+    the time
+- vec (std::array<double, 6>) :
+     the six-vector (x, y, z, px, py, pz) at time t
+
+Returns
+--------
+- ode_lrz (std::array<double, 6>) :
+     the ordinary differential equation for the six vector based on the
+Lorentz force equation
+*/
+  std::array<double, 6> ode_lrz_cartesian(const double t,
+                                          const std::array<double, 6> &vec);
+
+  /* The ordinary differential equations of the kernel (spherical or
+  Cartesian) used by this tracer. */
+  inline std::array<double, 6> ode(const double t,
+                                   const std::array<double, 6> &vec) {
+    return cartesian_ ? ode_lrz_cartesian(t, vec) : ode_lrz(t, vec);
+  }
+
+  /* The radial distance of the six-vector of the kernel used by this
+  tracer. */
+  inline double radius(const std::array<double, 6> &vec) {
+    return cartesian_
+               ? sqrt(vec[0] * vec[0] + vec[1] * vec[1] + vec[2] * vec[2])
+               : vec[0];
+  }
+
+  /* Evaluates the trajectory of the particle using an adaptive 5th-order
+  Dormand-Prince Runge Kutta algorithm with an embedded 4th-order error
+  estimate (RK45).
+
+  The step size is adjusted after each step such that the estimated local
+  error stays within the tolerances rtol_ and atol_. The integration is
+  stopped once the time stepsize_ * max_iter_ has passed, or after max_iter_
+  attempted steps.
+
+  Parameters
+  -----------
+  - t0 (double) :
+      the initial time in seconds
+  - vec0 (std::array<double, 6>) :
+       the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0) at time t0
+  - trajectory (std::vector<double> *) :
+       if not a null pointer, the time and six-vector of each step
+       (t, r, theta, phi, pr, ptheta, pphi) are appended to this vector
+       (default nullptr). The six-vector is always stored in spherical
+       coordinates, regardless of the kernel.
+
+  Returns
+  --------
+  None
+  */
+  void evaluate_rk45(const double &t0, const std::array<double, 6> &vec0,
+                     std::vector<double> *trajectory = nullptr);
+
  public:
   /* Default Constructor for TrajectoryTracer class
 
@@ -132,23 +226,48 @@ Lorentz force equation
         The maximum number of iterations performed in the integration process
         (default 10000)
   - bfield_type (char) :
-        The type of Magnetic Field to evaluate the trajectory with. Only types
-        'd' (for dipole model) or 'i' (IGRF model) are allowed (default 'd').
+        The type of Magnetic Field to evaluate the trajectory with, which must
+        match the field model of the tracer, i.e. 'd' for
+        TrajectoryTracer<MagneticField> and 'i' for TrajectoryTracer<IGRF>
+        (default is the type of the field model).
   - igrf_params (std::pair<std::string, double>) :
         Parameters required for instantiating the IGRF model. The first entry
         contains the path of the directory in which the .COF data file is
         stored (default to the author's path to the directory). The second entry
         contains the date in which the evaluation of the trajectory is requested
         in decimal date (default 2020.).
+  - integrator (std::string) :
+        The integration algorithm. Either "rk4" for the fixed-step 4th-order
+        Runge Kutta algorithm, or "rk45" for the adaptive Dormand-Prince
+        algorithm, in which case stepsize is used as the initial step size
+        (default "rk4").
+  - rtol (double) :
+        The relative error tolerance per step of the adaptive integrator
+        (default 1e-6).
+  - atol (double) :
+        The absolute error tolerance per step of the adaptive integrator,
+        in units of Earth's radius for r, radians for theta and phi, and
+        the initial momentum magnitude for the momentum components
+        (default 1e-9).
+  - kernel (std::string) :
+        The coordinate system in which the equations of motion are
+        integrated. Either "spherical", or "cartesian" for Earth-centered,
+        Earth-fixed Cartesian coordinates, which avoids the trigonometric
+        functions and the singularities at the poles of the spherical form.
+        The initial and final six-vectors are in spherical coordinates in
+        both cases (default "spherical").
  */
   TrajectoryTracer( double charge,  
                   double mass = 1.67e-27,
                    double start_altitude = 100. * (1e3),
                     double escape_radius = 10. * constants::RE,
                     double stepsize = 1e-5,  int max_iter = 10000,
-                   const char bfield_type = 'i',
+                   const char bfield_type = FieldModel<Field>::type(),
                    const std::pair<std::string, double> &igrf_params = {
-                       "/home/keito/devel/gtracr/data", 2020.});
+                       "/home/keito/devel/gtracr/data", 2020.},
+                   const std::string &integrator = "rk4",
+                   double rtol = 1e-6, double atol = 1e-9,
+                   const std::string &kernel = "spherical");
 
   /* the charge of the particle associated with the Runge-Kutta
    integrator */
@@ -169,6 +288,12 @@ Lorentz force equation
   const double &final_time() { return final_time_; }
   // the final sixvector of the trajectory
   const std::array<double, 6> &final_sixvector() { return final_sixvector_; }
+  // the name of the integration algorithm
+  std::string integrator() { return adaptive_ ? "rk45" : "rk4"; }
+  // the coordinate system of the equations of motion
+  std::string kernel() { return cartesian_ ? "cartesian" : "spherical"; }
+  // the type of the magnetic field model ('d' for dipole, 'i' for IGRF)
+  char bfield_type() { return FieldModel<Field>::type(); }
 
   /*
   The differential equation for the momentum in
@@ -219,7 +344,7 @@ Lorentz force equation
   void evaluate(const double &t0, std::array<double, 6> &vec0);
 
   /* Evaluates the trajectory of the particle using a 4th-order Runge Kutta
-  algorithm and return a map that contains the information of the particle
+  algorithm and return an array that contains the information of the particle
   trajectory. This will most often be used for debugging purposes to see the
   actual trajectory.
 
@@ -232,18 +357,102 @@ Lorentz force equation
 
   Returns
   --------
-  - trajectory_data (std::map<std::string, std::vector<double> >) :
-      the trajectory information, that is, the time array of the trajectory
-      and the six-vector of the trajectory in std::vectors.
+  - trajectory_data (std::vector<double>) :
+      the trajectory information, that is, the time and the six-vector of the
+      trajectory in spherical coordinates, as a row-major (n_steps, 7) array
+      (see trajectory_data.hpp).
       Notes:
-      - keys are ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
-      - the final point of the trajectory is also contained in the map
-      - std::vectors (dynamic arrays) are used since the length of each
-        trajectory is not known at compile time.
+      - the columns are ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
+      - the storage is reserved in advance for up to max_iter steps, since
+        the length of each trajectory is not known beforehand.
 
   */
-  std::map<std::string, std::vector<double>> evaluate_and_get_trajectory(
+  std::vector<double> evaluate_and_get_trajectory(
       double &t0, std::array<double, 6> &vec0);
+
+  /* Evaluates the trajectories of a batch of particles using a 4th-order
+  Runge Kutta algorithm. Each particle is evaluated with the same settings
+  (field model, step size, altitudes) as this tracer, but with its own
+  initial six-vector, charge and mass.
+
+  The batch is distributed over a pool of worker threads, each of which
+  evaluates its share of the batch on its own copy of this tracer. The
+  members of this tracer (i.e. particle_escaped, final_time, etc.) are
+  therefore left unchanged.
+
+  Parameters
+  -----------
+  - t0 (double) :
+      the initial time in seconds, common to all particles
+  - n (int) :
+      the number of particles in the batch
+  - vec0s (const double *) :
+      the initial six-vectors of each particle, stored contiguously
+      in row-major order (size n * 6)
+  - charges (const double *) :
+      the charge of each particle in Coulombs (size n)
+  - masses (const double *) :
+      the mass of each particle in kilograms (size n)
+  - escaped (bool *) :
+      output array, set to true if the particle has escaped (size n)
+  - final_times (double *) :
+      output array, the final time of each trajectory (size n)
+  - final_sixvectors (double *) :
+      output array, the final six-vector of each trajectory, stored
+      contiguously in row-major order (size n * 6)
+  - num_threads (int) :
+      the number of threads used to evaluate the batch. If num_threads <= 0,
+      the number of threads is set from the environment variable
+      GTRACR_NUM_THREADS, or the number of available cores if it is not set
+      (default 0).
+
+  Returns
+  --------
+  None
+  */
+  void evaluate_batch(const double &t0, const int n, const double *vec0s,
+                      const double *charges, const double *masses,
+                      bool *escaped, double *final_times,
+                      double *final_sixvectors, const int num_threads = 0);
+
+  /* Finds the cutoff rigidity of the particle in the direction of the
+  initial six-vector, i.e. the lowest rigidity in which the particle
+  escapes, by evaluating the trajectory for each rigidity in ascending
+  order with this tracer and its field model. For each rigidity, only the
+  magnitude of the initial momentum is rescaled, so the initial position
+  and direction (and the setup of the tracer) are shared by all rigidities.
+
+  The members of this tracer (i.e. particle_escaped, final_time, etc.)
+  contain the results of the last evaluated rigidity.
+
+  Parameters
+  -----------
+  - t0 (double) :
+      the initial time in seconds
+  - vec0 (std::array<double, 6>) :
+      the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0),
+      whose momentum sets the direction of the particle
+  - n (int) :
+      the number of rigidities
+  - rigidities (const double *) :
+      the rigidities in GV in ascending order (size n)
+  - allowed (bool *) :
+      output array, set to true if the particle escapes with each rigidity,
+      i.e. the allowed / forbidden pattern of the rigidities (size n)
+  - stop_at_first (bool) :
+      whether to stop at the first rigidity in which the particle escapes,
+      in which case the rigidities above it are not evaluated and their
+      entries in allowed are left unchanged (default true)
+
+  Returns
+  --------
+  - index (int) :
+      the index of the first rigidity in which the particle escapes,
+      or -1 if the particle does not escape for any rigidity
+  */
+  int find_cutoff(const double &t0, const std::array<double, 6> &vec0,
+                  const int n, const double *rigidities, bool *allowed,
+                  const bool stop_at_first = true);
 };
 
 #endif  //__TRAJECTORYTRACER_HPP_
\ No newline at end of file
@@ -0,0 +1,274 @@
+/*
+Trajectory Tracer class that traces the trajectory of the particle
+by performing the Boris algorithm for the magnetostatic Lorentz force.
+*/
+#ifndef __BTRAJECTORYTRACER_HPP_
+#define __BTRAJECTORYTRACER_HPP_
+#include <array>
+#include <cmath>
+#include <iostream>
+#include <map>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "MagneticField.hpp"
+#include "constants.hpp"
+#include "coordinates.hpp"
+#include "field_model.hpp"
+#include "igrf.hpp"
+#include "trajectory_data.hpp"
+
+template <class Field>
+class bTrajectoryTracer {
+  /*
+Trajectory Tracer class that traces the trajectory of the particle
+by performing the relativistic Boris algorithm.
+
+This is different from the class TrajectoryTracer in that the equations
+of motion are not integrated with a Runge Kutta algorithm. Since only
+a magnetic field is present, the Lorentz force only rotates the momentum.
+The Boris algorithm performs this rotation exactly for the field at the
+midpoint of each step, such that:
+  - the momentum magnitude (and thus the energy) is conserved to machine
+    precision, even over many steps,
+  - the algorithm is volume-preserving and time-reversible, such that
+    trapped trajectories do not drift in energy or spiral outwards,
+  - only one field evaluation is required per step (instead of four for
+    the 4th-order Runge Kutta algorithm).
+The integration is performed in Earth-centered, Earth-fixed (ECEF)
+Cartesian coordinates. The initial and final six-vectors are given in
+spherical coordinates.
+
+As for TrajectoryTracer, the magnetic field model is given by the template
+parameter Field (MagneticField or IGRF).
+
+Class Members
+--------------
+  - bfield_ (Field instance):
+      The magnetic field model (MagneticField for the dipole model, IGRF for
+      the IGRF model).
+  - charge_ (double) :
+      The charge of the particle in units of Coulombs (default 1.602e-19 C, i.e.
+  1e).
+  - mass_ (double) :
+      The (rest) mass of the particle in units of kilograms
+  (default 1.672e-27 kg, i.e. proton mass).
+  - escape_radius_ (double) :
+      The radial distance relative to Earth's center in which the particle is
+      set to have "escaped" Earth, i.e. a valid cosmic ray coming from some
+      astrophysical source. Units are in kilometers (default 10*Earth's radius)
+  - stepsize_ (double) :
+      The stepsize for the integration process (default 1e-5)
+  - max_iter_ (int) :
+      The maximum number of iterations performed for the integration process
+      (default 10000)
+  - particle_escaped_ (bool) :
+      True if particle has effectively "escaped" from Earth (i.e. when the
+      radial component of the trajectory > escape_radius_) (default false).
+*/
+ private:
+  Field bfield_;           // the magnetic field
+  double charge_;          // charge of the particle in coulumbs
+  double mass_;            // mass of the particle in kg
+  double start_altitude_;  // starting altitude of particle
+  double escape_radius_;   // radius in which we set for particle to escape
+  double stepsize_;        // step size
+  int max_iter_;           // maximum step size
+  // binary value to store if particle has escaped or not
+  bool particle_escaped_;
+
+  double final_time_;  // the final time of the trajectory
+  std::array<double, 6>
+      final_sixvector_;  // the final six-vector of the trajectory
+
+  /* Performs one step of the Boris algorithm (drift - rotate - drift).
+
+  The position is first advanced by half a step, the momentum is then
+  rotated by the magnetic field at that position, and the position is
+  advanced by another half step with the new momentum.
+
+  Parameters
+  -----------
+  - vec (std::array<double, 6> &) :
+       the six-vector (x, y, z, px, py, pz), which is advanced in place
+  - h (const double &) :
+       the step size
+  - inv_rel_mass (const double &) :
+       the inverse of the relativistic mass of the particle, which is
+       constant since the momentum magnitude is conserved
+
+  Returns
+  --------
+  None
+  */
+  inline void push(std::array<double, 6> &vec, const double &h,
+                   const double &inv_rel_mass);
+
+ public:
+  /* Default Constructor for bTrajectoryTracer class
+
+  Creates an instance of the bTrajectoryTracer, that is, the object that
+  keeps track of a single particle trajectory in Earth's magnetic field.
+
+  The default constructor initializes the object with the default values
+  provided for the members.
+
+  Parameters
+  ------------
+  None
+*/
+  bTrajectoryTracer();
+  /* Constructor for bTrajectoryTracer class
+
+  Creates an instance of the bTrajectoryTracer, that is, the object that
+  keeps track of a single particle trajectory in Earth's magnetic field.
+
+  This constructor requires 2 parameters, and the rest may be optional.
+
+  Required Parameters
+  -------------------
+  - charge (int) :
+        The charge of the particle in units of electrons.
+  - mass (double) :
+        The mass of the particle in units of GeV.
+
+  Optional Parameters
+  -------------------
+  - start_altitude (double) :
+        The starting altitude of the particle, i.e. the altitude in which
+        the cosmic ray has collided with the atmosphere (default 100km)
+  - escape_radius (double) :
+        The radius in which the particle has "escaped" relative to
+        Earth's center in units of km (default 10*RE)
+  - stepsize (double) :
+        The step size of the integration (default 1e-5)
+  - max_iter (int) :
+        The maximum number of iterations performed in the integration process
+        (default 10000)
+  - bfield_type (char) :
+        The type of Magnetic Field to evaluate the trajectory with, which must
+        match the field model of the tracer, i.e. 'd' for
+        bTrajectoryTracer<MagneticField> and 'i' for bTrajectoryTracer<IGRF>
+        (default is the type of the field model).
+  - igrf_params (std::pair<std::string, double>) :
+        Parameters required for instantiating the IGRF model. The first entry
+        contains the path of the directory in which the .COF data file is
+        stored (default to the author's path to the directory). The second entry
+        contains the date in which the evaluation of the trajectory is requested
+        in decimal date (default 2020.).
+ */
+  bTrajectoryTracer(double charge, double mass = 1.67e-27,
+                    double start_altitude = 100. * (1e3),
+                    double escape_radius = 10. * constants::RE,
+                    double stepsize = 1e-5, int max_iter = 10000,
+                    const char bfield_type = FieldModel<Field>::type(),
+                    const std::pair<std::string, double> &igrf_params = {
+                        "/home/keito/devel/gtracr/data", 2020.});
+
+  /* the charge of the particle associated with the integrator */
+  const double &charge() { return charge_; }
+  // the mass of the particle associated with the integrator
+  const double &mass() { return mass_; }
+  // starting altitude of the particle
+  const double &start_altitude() { return start_altitude_; }
+  // the escape radius of the tracer
+  const double &escape_radius() { return escape_radius_; }
+  // the step size of the integrator
+  const double &stepsize() { return stepsize_; }
+  // the maximum number of steps of the integrator
+  int max_iter() { return max_iter_; }
+  // the boolean if particle has escaped or not
+  bool particle_escaped() { return particle_escaped_; }
+  // the final time of the trajectory
+  const double &final_time() { return final_time_; }
+  // the final sixvector of the trajectory
+  const std::array<double, 6> &final_sixvector() { return final_sixvector_; }
+  // the type of the magnetic field model ('d' for dipole, 'i' for IGRF)
+  char bfield_type() { return FieldModel<Field>::type(); }
+
+  /* Evaluates the trajectory of the particle using the Boris algorithm.
+
+  Parameters
+  -----------
+  - t0 (double) :
+      the initial time in seconds
+  - vec0 (std::array<double, 6>) :
+       the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0) at time t0
+
+  Returns
+  --------
+  None
+
+  */
+  void evaluate(const double &t0, std::array<double, 6> &vec0);
+
+  /* Evaluates the trajectory of the particle using the Boris algorithm
+  and return an array that contains the information of the particle
+  trajectory. This will most often be used for debugging purposes to see the
+  actual trajectory.
+
+  Parameters
+  -----------
+  - t0 (double) :
+      the initial time in seconds
+  - vec0 (std::array<double, 6>) :
+       the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0) at time t0
+
+  Returns
+  --------
+  - trajectory_data (std::vector<double>) :
+      the trajectory information, that is, the time and the six-vector of the
+      trajectory in spherical coordinates, as a row-major (n_steps, 7) array
+      (see trajectory_data.hpp).
+      Notes:
+      - the columns are ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
+      - the storage is reserved in advance for up to max_iter steps, since
+        the length of each trajectory is not known beforehand.
+
+  */
+  std::vector<double> evaluate_and_get_trajectory(
+      double &t0, std::array<double, 6> &vec0);
+
+  /* Finds the cutoff rigidity of the particle in the direction of the
+  initial six-vector, i.e. the lowest rigidity in which the particle
+  escapes, by evaluating the trajectory for each rigidity in ascending
+  order with this tracer and its field model. For each rigidity, only the
+  magnitude of the initial momentum is rescaled, so the initial position
+  and direction (and the setup of the tracer) are shared by all rigidities.
+
+  The members of this tracer (i.e. particle_escaped, final_time, etc.)
+  contain the results of the last evaluated rigidity.
+
+  Parameters
+  -----------
+  - t0 (double) :
+      the initial time in seconds
+  - vec0 (std::array<double, 6>) :
+      the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0),
+      whose momentum sets the direction of the particle
+  - n (int) :
+      the number of rigidities
+  - rigidities (const double *) :
+      the rigidities in GV in ascending order (size n)
+  - allowed (bool *) :
+      output array, set to true if the particle escapes with each rigidity,
+      i.e. the allowed / forbidden pattern of the rigidities (size n)
+  - stop_at_first (bool) :
+      whether to stop at the first rigidity in which the particle escapes,
+      in which case the rigidities above it are not evaluated and their
+      entries in allowed are left unchanged (default true)
+
+  Returns
+  --------
+  - index (int) :
+      the index of the first rigidity in which the particle escapes,
+      or -1 if the particle does not escape for any rigidity
+  */
+  int find_cutoff(const double &t0, const std::array<double, 6> &vec0,
+                  const int n, const double *rigidities, bool *allowed,
+                  const bool stop_at_first = true);
+};
+
+#endif  //__BTRAJECTORYTRACER_HPP_
@@ -0,0 +1,84 @@
+// conversions of six-vectors between spherical and Cartesian coordinates
+
+#ifndef __COORDINATES_HPP_
+#define __COORDINATES_HPP_
+#include <array>
+#include <cmath>
+
+/*
+Namespace that contains the conversions of the six-vector of a particle
+between spherical coordinates (r, theta, phi, pr, ptheta, pphi) and
+Earth-centered, Earth-fixed (ECEF) Cartesian coordinates
+(x, y, z, px, py, pz).
+
+The momentum components in spherical coordinates are the components
+along the local unit vectors (rhat, thetahat, phihat).
+*/
+namespace coordinates {
+
+/* Convert a six-vector from spherical coordinates to ECEF Cartesian
+coordinates.
+
+Parameters
+-----------
+- vec (std::array<double, 6>) :
+     the six-vector (r, theta, phi, pr, ptheta, pphi)
+
+Returns
+--------
+- cart_vec (std::array<double, 6>) :
+     the six-vector (x, y, z, px, py, pz)
+*/
+inline std::array<double, 6> spherical_to_cartesian(
+    const std::array<double, 6> &vec) {
+  const double &r = vec[0], &pr = vec[3], &ptheta = vec[4], &pphi = vec[5];
+  double sin_theta = sin(vec[1]), cos_theta = cos(vec[1]);
+  double sin_phi = sin(vec[2]), cos_phi = cos(vec[2]);
+
+  // p = pr * rhat + ptheta * thetahat + pphi * phihat
+  double p_rho = pr * sin_theta + ptheta * cos_theta;
+  std::array<double, 6> cart_vec{{r * sin_theta * cos_phi,
+                                  r * sin_theta * sin_phi, r * cos_theta,
+                                  p_rho * cos_phi - pphi * sin_phi,
+                                  p_rho * sin_phi + pphi * cos_phi,
+                                  pr * cos_theta - ptheta * sin_theta}};
+  return cart_vec;
+}
+
+/* Convert a six-vector from ECEF Cartesian coordinates to spherical
+coordinates.
+
+Parameters
+-----------
+- vec (std::array<double, 6>) :
+     the six-vector (x, y, z, px, py, pz)
+
+Returns
+--------
+- sph_vec (std::array<double, 6>) :
+     the six-vector (r, theta, phi, pr, ptheta, pphi), with phi in (-pi, pi]
+*/
+inline std::array<double, 6> cartesian_to_spherical(
+    const std::array<double, 6> &vec) {
+  const double &x = vec[0], &y = vec[1], &z = vec[2];
+  const double &px = vec[3], &py = vec[4], &pz = vec[5];
+  double rho = sqrt((x * x) + (y * y));
+  double r = sqrt((rho * rho) + (z * z));
+
+  // sin / cos of the angles, phi = 0 is chosen on the polar axis
+  double sin_theta = rho / r, cos_theta = z / r;
+  double cos_phi = (rho > 0.) ? x / rho : 1.;
+  double sin_phi = (rho > 0.) ? y / rho : 0.;
+
+  // project the momentum onto (rhat, thetahat, phihat)
+  double p_rho = px * cos_phi + py * sin_phi;
+  std::array<double, 6> sph_vec{{r, acos(cos_theta), atan2(y, x),
+                                 p_rho * sin_theta + pz * cos_theta,
+                                 p_rho * cos_theta - pz * sin_theta,
+                                 py * cos_phi - px * sin_phi}};
+  return sph_vec;
+}
+
+}  // namespace coordinates
+
+#endif  //__COORDINATES_HPP_
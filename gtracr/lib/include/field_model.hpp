@@ -0,0 +1,67 @@
+/*
+Construction of the magnetic field models used by the trajectory tracers.
+*/
+#ifndef __FIELD_MODEL_HPP_
+#define __FIELD_MODEL_HPP_
+
+#include <string>
+#include <utility>
+
+#include "MagneticField.hpp"
+#include "gridded_field.hpp"
+#include "igrf.hpp"
+
+/*
+The field models that the trajectory tracers can be compiled with.
+
+The tracers take the field model as a template parameter, such that the
+field is evaluated by a direct (inlinable) call to Field::values or
+Field::ecef_values in each step of the integration. FieldModel<Field>
+contains what the tracers require to set up a field model:
+  - type() : the character of the model used for bfield_type
+    ('d' for the dipole model, 'i' for the IGRF model, 'g' for a lattice
+    of the field)
+  - create(igrf_params) : construct the model from the parameters given
+    to the tracer
+
+Adding a field model to the tracers amounts to specializing FieldModel for
+the model, and instantiating the tracers with it.
+*/
+template <class Field>
+struct FieldModel;
+
+// the dipole model
+template <>
+struct FieldModel<MagneticField> {
+  static constexpr char type() { return 'd'; }
+  static MagneticField create(
+      const std::pair<std::string, double> & /*igrf_params*/) {
+    return MagneticField();
+  }
+};
+
+// the IGRF model
+template <>
+struct FieldModel<IGRF> {
+  static constexpr char type() { return 'i'; }
+  static IGRF create(const std::pair<std::string, double> &igrf_params) {
+    // add file name to DATA_DIR (first component in igrf_params)
+    std::string DATA_PATH = igrf_data_path(igrf_params.first);
+    double sdate = igrf_params.second;
+    return IGRF(DATA_PATH, sdate);
+  }
+};
+
+// a lattice of a field model, interpolated trilinearly
+template <>
+struct FieldModel<GriddedField> {
+  static constexpr char type() { return 'g'; }
+  static GriddedField create(
+      const std::pair<std::string, double> &igrf_params) {
+    // the path to the lattice file (first component in igrf_params),
+    // the date of the field is contained in the lattice
+    return GriddedField(igrf_params.first);
+  }
+};
+
+#endif  //__FIELD_MODEL_HPP_
@@ -0,0 +1,354 @@
+/*
+Magnetic field model that interpolates another field model sampled on a
+lattice in spherical coordinates.
+*/
+#ifndef __GRIDDED_FIELD_HPP_
+#define __GRIDDED_FIELD_HPP_
+
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <cstdint>
+#include <memory>
+#include <random>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "constants.hpp"
+#include "mapped_file.hpp"
+#include "parallel.hpp"
+
+/*
+A magnetic field model that is sampled once on a lattice in (r, theta, phi)
+and trilinearly interpolated when evaluated.
+
+Evaluating the IGRF model requires the full spherical harmonic sum (around
+100 Legendre recurrences) at each stage of the integration, while the
+interpolation only requires the 8 lattice points around the position. The
+lattice is built from any field model with GriddedField::build, stored in
+a file, and memory-mapped by the constructor, such that all tracers (and
+processes) share the same lattice.
+
+The lattice is uniform in log(r) between r_min and r_max, in theta on
+[0, pi] (including the poles), and in phi on [0, 2 pi) (periodic).
+On each lattice point, the Cartesian (ECEF) components of the field are
+stored, scaled by (r / RE)^3. The Cartesian components are smooth through
+the poles (unlike the spherical components), and the scaling removes the
+leading radial dependence of the field. Outside [r_min, r_max], the values
+at the closest radius are used, such that the field falls off as r^-3.
+
+The file consists of the following blocks (little-endian):
+  - header (40 bytes) : magic "GTRGRID\0" (8 bytes), then the version (1),
+    nr, ntheta, nphi as uint32, then r_min, r_max as float64
+  - data : float64[nr][ntheta][nphi][3]
+
+Class Members
+--------------
+- mapping_ (std::shared_ptr<const MappedFile>) :
+    The memory-mapped lattice file
+- nr_, ntheta_, nphi_ (int) :
+    The number of lattice points in each coordinate
+- r_min_, r_max_ (double) :
+    The radial range of the lattice in m
+- data_ (const double *) :
+    The scaled Cartesian field components of each lattice point, pointing
+    into the mapped file
+*/
+class GriddedField {
+ private:
+  std::shared_ptr<const MappedFile> mapping_;
+  int nr_, ntheta_, nphi_;
+  double r_min_, r_max_;
+  const double *data_;
+
+  // lattice spacing in log(r), theta, phi and their inverses
+  double du_, dtheta_, dphi_;
+  double inv_du_, inv_dtheta_, inv_dphi_;
+
+  // the size of the file header in bytes
+  static constexpr std::size_t header_size = 40;
+
+  /*
+  Interpolate the scaled Cartesian components of the field at the given
+  spherical coordinates.
+
+  Parameters
+  -----------
+  - r, theta, phi (const double &) :
+      the spherical coordinates of the position
+
+  Returns
+  --------
+  - val (std::array<double, 3>) :
+      the Cartesian components of the field, scaled by (r / RE)^3
+  */
+  inline std::array<double, 3> interpolate(const double &r,
+                                           const double &theta,
+                                           const double &phi) const {
+    // fractional lattice coordinates, clamped to the lattice in r and theta
+    const double u = std::min(
+        std::max(log(r / r_min_) * inv_du_, 0.), double(nr_ - 1));
+    const double v = std::min(std::max(theta * inv_dtheta_, 0.),
+                              double(ntheta_ - 1));
+    double w = phi * inv_dphi_;
+    w -= nphi_ * floor(w / nphi_);  // periodic in phi
+
+    const int ir = std::min(int(u), nr_ - 2);
+    const int it = std::min(int(v), ntheta_ - 2);
+    const int ip = std::min(int(w), nphi_ - 1);
+    const int ip1 = (ip + 1 == nphi_) ? 0 : ip + 1;
+
+    const double fu = u - ir;
+    const double fv = v - it;
+    const double fw = w - ip;
+
+    // the 8 corners of the cell
+    const double *c000 = point(ir, it, ip);
+    const double *c001 = point(ir, it, ip1);
+    const double *c010 = point(ir, it + 1, ip);
+    const double *c011 = point(ir, it + 1, ip1);
+    const double *c100 = point(ir + 1, it, ip);
+    const double *c101 = point(ir + 1, it, ip1);
+    const double *c110 = point(ir + 1, it + 1, ip);
+    const double *c111 = point(ir + 1, it + 1, ip1);
+
+    std::array<double, 3> val;
+    for (int k = 0; k < 3; ++k) {
+      const double c00 = c000[k] + fw * (c001[k] - c000[k]);
+      const double c01 = c010[k] + fw * (c011[k] - c010[k]);
+      const double c10 = c100[k] + fw * (c101[k] - c100[k]);
+      const double c11 = c110[k] + fw * (c111[k] - c110[k]);
+      const double c0 = c00 + fv * (c01 - c00);
+      const double c1 = c10 + fv * (c11 - c10);
+      val[k] = c0 + fu * (c1 - c0);
+    }
+    return val;
+  }
+
+  // the scaled Cartesian field components at the lattice point
+  inline const double *point(const int ir, const int it, const int ip) const {
+    return data_ + 3 * ((std::size_t(ir) * ntheta_ + it) * nphi_ + ip);
+  }
+
+  // the radial coordinate of the lattice point with index ir
+  static double lattice_r(const int ir, const int nr, const double r_min,
+                          const double r_max) {
+    return r_min * exp(ir * log(r_max / r_min) / (nr - 1));
+  }
+
+  // write the lattice to a file
+  static void write(const std::string &fname, const int nr, const int ntheta,
+                    const int nphi, const double r_min, const double r_max,
+                    const std::vector<double> &data);
+
+ public:
+  /*
+  Map the lattice stored in a file (as written by GriddedField::build).
+
+  Parameters
+  -----------
+  - fname (const std::string &) :
+      the path to the lattice file
+  */
+  explicit GriddedField(const std::string &fname);
+
+  /*
+  Sample a field model on the lattice and write the lattice to a file.
+  The field is sampled on num_threads threads, each with its own copy of
+  the field model.
+
+  Parameters
+  -----------
+  - field (const Field &) :
+      the field model, which provides values(r, theta, phi)
+  - fname (const std::string &) :
+      the path to the lattice file
+  - nr, ntheta, nphi (int) :
+      the number of lattice points in r, theta and phi (nr, ntheta >= 2,
+      nphi >= 1)
+  - r_min, r_max (double) :
+      the radial range of the lattice in m (default RE to 10 RE)
+  - num_threads (int) :
+      the number of threads used to sample the field (default 0, i.e. the
+      number of available cores)
+
+  Returns
+  --------
+  None
+  */
+  template <class Field>
+  static void build(const Field &field, const std::string &fname,
+                    const int nr, const int ntheta, const int nphi,
+                    const double r_min = constants::RE,
+                    const double r_max = 10. * constants::RE,
+                    const int num_threads = 0);
+
+  /*
+  The interpolation error of the lattice compared to a field model, evaluated
+  at random positions with r uniformly distributed in [r_min, r_max] and
+  the direction uniformly distributed on the sphere.
+
+  Parameters
+  -----------
+  - field (const Field &) :
+      the field model that the lattice was built from
+  - n_samples (int) :
+      the number of random positions (default 10000)
+  - seed (unsigned int) :
+      the seed of the random positions (default 0)
+
+  Returns
+  --------
+  - errors (std::pair<double, double>) :
+      the maximal and the root-mean-square magnitude of the difference
+      between the interpolated and the direct field in T
+  */
+  template <class Field>
+  std::pair<double, double> error(const Field &field,
+                                  const int n_samples = 10000,
+                                  const unsigned int seed = 0) const;
+
+  /*
+  Obtain the values of the magnetic field for a specified (r, theta, phi)
+  value.
+
+  Parameters
+  -----------
+  - r (const double &) : the radial component
+  - theta (const double &) : the polar component
+  - phi (const double &) : the azimuthal component
+
+  Returns
+  --------
+  - val (std::array<double, 3>) :
+      array containing the magnetic field values [Br, Btheta, Bphi]
+  */
+  inline std::array<double, 3> values(const double &r, const double &theta,
+                                      const double &phi) {
+    const std::array<double, 3> bc = interpolate(r, theta, phi);
+    const double scale = (constants::RE / r) * (constants::RE / r) *
+                         (constants::RE / r);
+    const double sin_theta = sin(theta), cos_theta = cos(theta);
+    const double sin_phi = sin(phi), cos_phi = cos(phi);
+    // the horizontal component in the direction of phi = const
+    const double bh = bc[0] * cos_phi + bc[1] * sin_phi;
+
+    std::array<double, 3> val;
+    val[0] = scale * (bh * sin_theta + bc[2] * cos_theta);
+    val[1] = scale * (bh * cos_theta - bc[2] * sin_theta);
+    val[2] = scale * (bc[1] * cos_phi - bc[0] * sin_phi);
+    return val;
+  }
+
+  /*
+  Obtain the values of the magnetic field for a specified (x, y, z) value
+  in Earth-centered, Earth-fixed (ECEF) Cartesian coordinates.
+
+  Parameters
+  -----------
+  - x, y, z (const double &) : the Cartesian components of the position
+
+  Returns
+  --------
+  - val (std::array<double, 3>) :
+      array containing the magnetic field values [Bx, By, Bz]
+  */
+  inline std::array<double, 3> ecef_values(const double &x, const double &y,
+                                           const double &z) {
+    const double r = sqrt((x * x) + (y * y) + (z * z));
+    const std::array<double, 3> bc = interpolate(r, acos(z / r), atan2(y, x));
+    const double scale = (constants::RE / r) * (constants::RE / r) *
+                         (constants::RE / r);
+    return std::array<double, 3>{
+        {scale * bc[0], scale * bc[1], scale * bc[2]}};
+  }
+
+  // the number of lattice points in r, theta and phi
+  std::array<int, 3> shape() const {
+    return std::array<int, 3>{{nr_, ntheta_, nphi_}};
+  }
+  // the minimal radius of the lattice
+  double r_min() const { return r_min_; }
+  // the maximal radius of the lattice
+  double r_max() const { return r_max_; }
+};
+
+template <class Field>
+void GriddedField::build(const Field &field, const std::string &fname,
+                         const int nr, const int ntheta, const int nphi,
+                         const double r_min, const double r_max,
+                         const int num_threads) {
+  if (nr < 2 || ntheta < 2 || nphi < 1 || !(r_max > r_min) || r_min <= 0.) {
+    throw std::invalid_argument("Invalid shape or range of the lattice!");
+  }
+
+  const int nthreads = (num_threads > 0)
+                           ? std::min(num_threads, nr)
+                           : std::min(parallel::default_num_threads(), nr);
+
+  // one copy of the field model per worker, since evaluating the field
+  // may modify the model (e.g. IGRF)
+  std::vector<Field> fields(nthreads, field);
+  std::vector<double> data(3 * std::size_t(nr) * ntheta * nphi);
+
+  const double dtheta = constants::pi / (ntheta - 1);
+  const double dphi = 2. * constants::pi / nphi;
+
+  parallel::parallel_for(
+      nr, nthreads, [&](const int begin, const int end, const int worker) {
+        Field &wfield = fields[worker];
+        for (int ir = begin; ir < end; ++ir) {
+          const double r = lattice_r(ir, nr, r_min, r_max);
+          const double scale =
+              (r / constants::RE) * (r / constants::RE) * (r / constants::RE);
+          for (int it = 0; it < ntheta; ++it) {
+            const double theta = it * dtheta;
+            const double sin_theta = sin(theta), cos_theta = cos(theta);
+            for (int ip = 0; ip < nphi; ++ip) {
+              const double phi = ip * dphi;
+              const std::array<double, 3> bf = wfield.values(r, theta, phi);
+              // B = Br * rhat + Btheta * thetahat + Bphi * phihat
+              const double bh = bf[0] * sin_theta + bf[1] * cos_theta;
+              double *val =
+                  &data[3 * ((std::size_t(ir) * ntheta + it) * nphi + ip)];
+              val[0] = scale * (bh * cos(phi) - bf[2] * sin(phi));
+              val[1] = scale * (bh * sin(phi) + bf[2] * cos(phi));
+              val[2] = scale * (bf[0] * cos_theta - bf[1] * sin_theta);
+            }
+          }
+        }
+      });
+
+  write(fname, nr, ntheta, nphi, r_min, r_max, data);
+}
+
+template <class Field>
+std::pair<double, double> GriddedField::error(const Field &field,
+                                              const int n_samples,
+                                              const unsigned int seed) const {
+  Field sfield = field;
+  GriddedField grid = *this;
+
+  std::mt19937 rng{seed};
+  std::uniform_real_distribution<double> uniform{0., 1.};
+
+  double max_err = 0., sum_err2 = 0.;
+  for (int i = 0; i < n_samples; ++i) {
+    const double r = r_min_ + (r_max_ - r_min_) * uniform(rng);
+    const double theta = acos(1. - 2. * uniform(rng));
+    const double phi = 2. * constants::pi * uniform(rng);
+
+    const std::array<double, 3> bf = sfield.values(r, theta, phi);
+    const std::array<double, 3> bg = grid.values(r, theta, phi);
+    const double err2 = (bf[0] - bg[0]) * (bf[0] - bg[0]) +
+                        (bf[1] - bg[1]) * (bf[1] - bg[1]) +
+                        (bf[2] - bg[2]) * (bf[2] - bg[2]);
+    max_err = std::max(max_err, sqrt(err2));
+    sum_err2 += err2;
+  }
+  return std::make_pair(max_err, sqrt(sum_err2 / std::max(n_samples, 1)));
+}
+
+#endif  //__GRIDDED_FIELD_HPP_
@@ -20,11 +20,33 @@ namespace igrf_const {
 constexpr int MAXDEG = 13;
 // maximum number of Gaussian coefficients
 constexpr int MAXCOEFF = (MAXDEG * (MAXDEG + 2) + 1);
+// the earliest epoch
+constexpr double MINEPOCH = 1900.00;
 // the longest epoch
 constexpr double MAXEPOCH = 2020.00;
+// maximum number of associated Legendre functions (n, m) with 1 <= n <= MAXDEG
+constexpr int MAXNPQ = (MAXDEG * (MAXDEG + 3)) / 2;
 
 };  // namespace igrf_const
 
+/*
+  The path to the IGRF coefficient file within the data directory. The
+  binary coefficient file (igrf13.bin) is used if it is available, and the
+  JSON coefficient file (igrf13.json) otherwise.
+
+  Parameters
+  -----------
+  - data_dir (const std::string &) :
+      the path to the data directory
+*/
+inline std::string igrf_data_path(const std::string &data_dir) {
+  const std::string bin_path = data_dir + "/igrf13.bin";
+  if (std::ifstream(bin_path).good()) {
+    return bin_path;
+  }
+  return data_dir + "/igrf13.json";
+}
+
 /*
 The IGRF model of Earth's magnetic field.
 
@@ -270,9 +292,15 @@ class IGRF : public MagneticField {
   Obtain the values of the IGRF magnetic field components from the 3-vector in
   spherical coordinates.
 
+  The main field is evaluated in geocentric coordinates with the same series
+  as in shval3, but with the coefficients of the recurrence relations of the
+  Schmidt quasi-normalized Legendre functions precomputed once per process,
+  the radial powers built incrementally by degree, and without the
+  secular variation (gh) switch in the inner loop.
+
   Parameters
   -----------
-  - r (const double&) : the radial component of the 3-vector in km
+  - r (const double&) : the radial component of the 3-vector in m
   - theta (const double&) : the polar component of the 3-vector
   - phi (const double&) : the azimuthal component of the 3-vector
 
@@ -280,11 +308,46 @@ class IGRF : public MagneticField {
   -------
   - values (std::array<double, 3>) :
       Array containing the radial, polar, and azimuthal components of the
-      magnetic field.
+      magnetic field in Tesla.
   */
   std::array<double, 3> values(const double &r, const double &theta,
                                const double &phi);
   /*
+  Obtain the values of the IGRF magnetic field components from the 3-vector in
+  spherical coordinates by evaluating the main field with shval3, as
+  in the original geomag 7.0 code. Used as a reference for values().
+
+  Parameters
+  -----------
+  - r (const double&) : the radial component of the 3-vector in m
+  - theta (const double&) : the polar component of the 3-vector
+  - phi (const double&) : the azimuthal component of the 3-vector
+
+  Returns
+  -------
+  - values (std::array<double, 3>) :
+      Array containing the radial, polar, and azimuthal components of the
+      magnetic field in Tesla.
+  */
+  std::array<double, 3> shval3_values(const double &r, const double &theta,
+                                      const double &phi);
+  /*
+  Obtain the values of the IGRF magnetic field components in Earth-centered,
+  Earth-fixed (ECEF) Cartesian coordinates from the 3-vector in Cartesian
+  coordinates.
+
+  Parameters
+  -----------
+  - x, y, z (const double&) : the Cartesian components of the 3-vector in m
+
+  Returns
+  -------
+  - values (std::array<double, 3>) :
+      Array containing the x, y, and z components of the magnetic field.
+  */
+  std::array<double, 3> ecef_values(const double &x, const double &y,
+                                    const double &z);
+  /*
   The starting date of the model in decimal days
   */
   inline const double &sdate() { return sdate_; }
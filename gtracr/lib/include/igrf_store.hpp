@@ -0,0 +1,253 @@
+/*
+Process-wide store for the spherical harmonic coefficients of the IGRF model.
+*/
+#ifndef __IGRF_STORE_HPP_
+#define __IGRF_STORE_HPP_
+
+#include <array>
+#include <cstddef>
+#include <cstdint>
+#include <list>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <utility>
+#include <vector>
+#include <nlohmann/json.hpp>
+
+#include "igrf.hpp"
+#include "mapped_file.hpp"
+
+/*
+The spherical harmonic coefficients of all epochs of the IGRF model, as
+read from a coefficient file.
+
+Two file formats are supported, determined by the extension of the file:
+  - .json : the JSON format produced by scripts/cof_to_json.py, which is
+    parsed and copied into memory.
+  - .bin : the compact binary format produced by scripts/cof_to_json.py,
+    which is memory-mapped and read without any parsing or copying.
+
+The binary format consists of the following blocks (little-endian):
+  - header (24 bytes) : magic "GTRIGRF\0" (8 bytes), then the version (1),
+    the number of epochs nepochs and the number of coefficients per epoch
+    maxcoeff, and a reserved field, each as uint32
+  - epochs : float64[nepochs]
+  - nmain, nsv : int32[nepochs] each
+  - gh, gh_sv : float64[nepochs][maxcoeff] each, zero-padded for epochs
+    with fewer coefficients
+such that each block is aligned to 8 bytes.
+
+Class Members
+--------------
+- mapping_ (std::shared_ptr<const MappedFile>) :
+    The memory-mapped binary file (null for JSON files)
+- nepochs_, maxcoeff_ (int) :
+    The number of epochs and the number of coefficients per epoch
+- epochs_, nmain_, nsv_, gh_, ghsv_ (pointers) :
+    The blocks of the table, pointing either into the mapped file or into
+    the vectors that own the contents of JSON files
+*/
+class IGRFTable {
+ private:
+  std::shared_ptr<const MappedFile> mapping_;
+  int nepochs_;
+  int maxcoeff_;
+  const double *epochs_;
+  const std::int32_t *nmain_;
+  const std::int32_t *nsv_;
+  const double *gh_;
+  const double *ghsv_;
+
+  // storage for the contents of JSON files
+  std::vector<double> epochs_vec_, gh_vec_, ghsv_vec_;
+  std::vector<std::int32_t> nmain_vec_, nsv_vec_;
+
+  // read the table from a JSON / binary file
+  void read_json(const std::string &fname);
+  void read_binary(const std::string &fname);
+
+ public:
+  IGRFTable()
+      : nepochs_{0},
+        maxcoeff_{0},
+        epochs_{nullptr},
+        nmain_{nullptr},
+        nsv_{nullptr},
+        gh_{nullptr},
+        ghsv_{nullptr} {}
+  // the pointers refer to the members themselves, so no copies are allowed
+  IGRFTable(const IGRFTable &) = delete;
+  IGRFTable &operator=(const IGRFTable &) = delete;
+
+  /*
+  Read the coefficient table from a file, either in JSON (.json) or in
+  binary (.bin) format.
+
+  Parameters
+  -----------
+  - fname (const std::string &) :
+      the path to the coefficient file
+  */
+  static std::shared_ptr<const IGRFTable> load(const std::string &fname);
+
+  // the number of epochs
+  int nepochs() const { return nepochs_; }
+  // the number of coefficients stored per epoch
+  int maxcoeff() const { return maxcoeff_; }
+  // the index of the epoch, or -1 if the epoch is not in the table
+  int index(const double epoch) const;
+  // the epoch with index i
+  double epoch(const int i) const { return epochs_[i]; }
+  // the maximum degree of the main field coefficients of epoch i
+  int nmain(const int i) const { return nmain_[i]; }
+  // the maximum degree of the secular variation coefficients of epoch i
+  int nsv(const int i) const { return nsv_[i]; }
+  // the main field coefficients of epoch i
+  const double *gh(const int i) const { return gh_ + i * maxcoeff_; }
+  // the secular variation coefficients of epoch i
+  const double *gh_sv(const int i) const { return ghsv_ + i * maxcoeff_; }
+};
+
+/*
+The interpolated (or extrapolated) spherical harmonic coefficients of the
+IGRF model for a single date.
+
+Members
+--------
+- nmax (int) :
+    The maximum degree and order of the coefficients
+- gh (std::array<double, igrf_const::MAXCOEFF>) :
+    The main field coefficients
+- ghsv (std::array<double, igrf_const::MAXCOEFF>) :
+    The secular variation coefficients
+*/
+struct IGRFCoefficients {
+  int nmax;
+  std::array<double, igrf_const::MAXCOEFF> gh;
+  std::array<double, igrf_const::MAXCOEFF> ghsv;
+};
+
+/*
+Thread-safe store for the coefficients of the IGRF model that is shared
+by all IGRF instances in the process.
+
+Constructing an IGRF instance (i.e. each TrajectoryTracer with the IGRF
+model) requires the coefficient file to be parsed and the coefficients to be
+interpolated to the requested date. The store keeps:
+  - the coefficient table of each file, such that each file is read only
+    once per process,
+  - the interpolated coefficients for each (file, date) pair, such that all
+    tracers for the same date share them. At most capacity() dates are kept,
+    after which the least recently used date is evicted.
+
+The store is accessed through IGRFCoefficientStore::instance(), and all
+member functions may be called concurrently from multiple threads.
+
+Class Members
+--------------
+- capacity_ (std::size_t) :
+    The maximum number of dates for which coefficients are kept (default 64)
+- files_ (std::map) :
+    The coefficient tables of each file, keyed by their path
+- entries_ (std::map) :
+    The coefficients for each (path, date) pair, together with their
+    position in the usage list
+- usage_ (std::list) :
+    The (path, date) pairs ordered from the most to least recently used
+*/
+class IGRFCoefficientStore {
+ public:
+  using coeffs_t = IGRFCoefficients;
+  using key_t = std::pair<std::string, double>;
+
+ private:
+  std::mutex mutex_;
+  std::size_t capacity_;
+  std::map<std::string, std::shared_ptr<const IGRFTable>> files_;
+  std::list<key_t> usage_;
+  std::map<key_t, std::pair<std::shared_ptr<const coeffs_t>,
+                            std::list<key_t>::iterator>>
+      entries_;
+
+  IGRFCoefficientStore() : capacity_{64} {}
+  IGRFCoefficientStore(const IGRFCoefficientStore &) = delete;
+  IGRFCoefficientStore &operator=(const IGRFCoefficientStore &) = delete;
+
+  // evict the least recently used entries until size <= capacity
+  // (the lock must be held by the caller)
+  void evict();
+
+ public:
+  /*
+  The store shared by the whole process.
+  */
+  static IGRFCoefficientStore &instance();
+
+  /*
+  Get the coefficient table of a coefficient file, reading the file only
+  if it has not been read before.
+
+  Parameters
+  -----------
+  - fname (const std::string &) :
+      the path to the coefficient file (JSON or binary format)
+
+  Returns
+  --------
+  - table (std::shared_ptr<const IGRFTable>) :
+      the coefficient table of the file
+  */
+  std::shared_ptr<const IGRFTable> file(const std::string &fname);
+
+  /*
+  Look up the coefficients of a given file and date.
+
+  Parameters
+  -----------
+  - fname (const std::string &) :
+      the path to the coefficient file
+  - sdate (double) :
+      the date of the coefficients in decimal years
+
+  Returns
+  --------
+  - coeffs (std::shared_ptr<const coeffs_t>) :
+      the coefficients, or a null pointer if they are not in the store
+  */
+  std::shared_ptr<const coeffs_t> find(const std::string &fname,
+                                       double sdate);
+
+  /*
+  Insert the coefficients of a given file and date into the store, evicting
+  the least recently used dates if the store is full.
+
+  Parameters
+  -----------
+  - fname (const std::string &) :
+      the path to the coefficient file
+  - sdate (double) :
+      the date of the coefficients in decimal years
+  - coeffs (const coeffs_t &) :
+      the coefficients
+  */
+  void insert(const std::string &fname, double sdate, const coeffs_t &coeffs);
+
+  /*
+  Remove all coefficient tables and coefficients from the store. IGRF instances
+  that were already created are not affected.
+  */
+  void clear();
+
+  // the number of dates for which coefficients are stored
+  std::size_t size();
+  // the number of coefficient files that are stored
+  std::size_t nfiles();
+  // the maximum number of dates for which coefficients are stored
+  std::size_t capacity();
+  // set the maximum number of dates, evicting entries if required
+  void set_capacity(const std::size_t capacity);
+};
+
+#endif  //__IGRF_STORE_HPP_
@@ -0,0 +1,122 @@
+/*
+Read-only memory-mapped file.
+*/
+#ifndef __MAPPED_FILE_HPP_
+#define __MAPPED_FILE_HPP_
+
+#include <cstddef>
+#include <stdexcept>
+#include <string>
+
+#ifdef _WIN32
+#ifndef NOMINMAX
+#define NOMINMAX
+#endif
+#ifndef WIN32_LEAN_AND_MEAN
+#define WIN32_LEAN_AND_MEAN
+#endif
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+/*
+A file that is mapped read-only into memory (mmap on POSIX systems,
+CreateFileMapping on Windows). The contents are only read from disk once
+they are accessed, and are shared between all processes that map the
+same file. The file is unmapped when the object is destroyed.
+
+Class Members
+--------------
+- data_ (const char *) :
+    Pointer to the first byte of the mapped file
+- size_ (std::size_t) :
+    The size of the file in bytes
+*/
+class MappedFile {
+ private:
+  const char *data_;
+  std::size_t size_;
+#ifdef _WIN32
+  HANDLE file_;
+  HANDLE mapping_;
+#endif
+
+ public:
+  /*
+  Map a file into memory.
+
+  Parameters
+  -----------
+  - fname (const std::string &) :
+      the path to the file
+  */
+  explicit MappedFile(const std::string &fname) : data_{nullptr}, size_{0} {
+#ifdef _WIN32
+    file_ = CreateFileA(fname.c_str(), GENERIC_READ, FILE_SHARE_READ, NULL,
+                        OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, NULL);
+    if (file_ == INVALID_HANDLE_VALUE) {
+      throw std::runtime_error("Cannot open file!");
+    }
+    LARGE_INTEGER size;
+    if (!GetFileSizeEx(file_, &size) || size.QuadPart == 0) {
+      CloseHandle(file_);
+      throw std::runtime_error("Cannot map file!");
+    }
+    size_ = static_cast<std::size_t>(size.QuadPart);
+    mapping_ = CreateFileMappingA(file_, NULL, PAGE_READONLY, 0, 0, NULL);
+    if (mapping_ == NULL) {
+      CloseHandle(file_);
+      throw std::runtime_error("Cannot map file!");
+    }
+    data_ = static_cast<const char *>(
+        MapViewOfFile(mapping_, FILE_MAP_READ, 0, 0, 0));
+    if (data_ == nullptr) {
+      CloseHandle(mapping_);
+      CloseHandle(file_);
+      throw std::runtime_error("Cannot map file!");
+    }
+#else
+    int fd = open(fname.c_str(), O_RDONLY);
+    if (fd < 0) {
+      throw std::runtime_error("Cannot open file!");
+    }
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size == 0) {
+      close(fd);
+      throw std::runtime_error("Cannot map file!");
+    }
+    size_ = static_cast<std::size_t>(st.st_size);
+    void *addr = mmap(nullptr, size_, PROT_READ, MAP_SHARED, fd, 0);
+    // the mapping stays valid after the file descriptor is closed
+    close(fd);
+    if (addr == MAP_FAILED) {
+      throw std::runtime_error("Cannot map file!");
+    }
+    data_ = static_cast<const char *>(addr);
+#endif
+  }
+
+  ~MappedFile() {
+#ifdef _WIN32
+    UnmapViewOfFile(data_);
+    CloseHandle(mapping_);
+    CloseHandle(file_);
+#else
+    munmap(const_cast<char *>(data_), size_);
+#endif
+  }
+
+  MappedFile(const MappedFile &) = delete;
+  MappedFile &operator=(const MappedFile &) = delete;
+
+  // pointer to the first byte of the file
+  const char *data() const { return data_; }
+  // the size of the file in bytes
+  std::size_t size() const { return size_; }
+};
+
+#endif  //__MAPPED_FILE_HPP_
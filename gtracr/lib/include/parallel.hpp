@@ -0,0 +1,132 @@
+/*
+Utilities to evaluate independent tasks (e.g. a batch of trajectories)
+on multiple threads.
+*/
+#ifndef __PARALLEL_HPP_
+#define __PARALLEL_HPP_
+
+#include <algorithm>
+#include <atomic>
+#include <cstdlib>
+#include <exception>
+#include <mutex>
+#include <string>
+#include <thread>
+#include <vector>
+
+namespace parallel {
+
+/*
+Returns the default number of threads used for parallel evaluations.
+
+The number of threads is obtained from the environment variable
+GTRACR_NUM_THREADS if it is set to a positive integer, otherwise the number
+of concurrent threads supported by the hardware is used.
+
+Returns
+--------
+- num_threads (int) :
+    the default number of threads (at least 1)
+*/
+inline int default_num_threads() {
+  const char *env_value = std::getenv("GTRACR_NUM_THREADS");
+  if (env_value != nullptr) {
+    int num_threads = std::atoi(env_value);
+    if (num_threads > 0) {
+      return num_threads;
+    }
+  }
+  int num_threads = static_cast<int>(std::thread::hardware_concurrency());
+  return (num_threads > 0) ? num_threads : 1;
+}
+
+/*
+Evaluates func over the index range [0, n) using a pool of worker threads.
+
+The range is split into small chunks, and each worker repeatedly takes the
+next unclaimed chunk from a shared atomic counter until the range is
+exhausted. Idle workers therefore take over the remaining work from busy
+ones, so that a few long trajectories (e.g. trapped particles) do not stall
+the whole batch as would be the case for a static partition.
+
+Any exception thrown by func is re-thrown in the calling thread after all
+workers have finished.
+
+Parameters
+-----------
+- n (int) :
+    the number of tasks
+- num_threads (int) :
+    the number of threads to use. Values <= 0 use default_num_threads().
+- func (Function) :
+    callable with signature func(int begin, int end, int worker), which
+    evaluates the tasks [begin, end) on worker number `worker`
+    (0 <= worker < number of threads). Each worker runs on a single thread,
+    so per-worker state indexed by `worker` does not need to be locked.
+
+Returns
+--------
+None
+*/
+template <typename Function>
+void parallel_for(const int n, int num_threads, Function func) {
+  if (n <= 0) {
+    return;
+  }
+  if (num_threads <= 0) {
+    num_threads = default_num_threads();
+  }
+  num_threads = std::min(num_threads, n);
+
+  // no need to spawn any threads for a single worker
+  if (num_threads == 1) {
+    func(0, n, 0);
+    return;
+  }
+
+  // several chunks per thread to balance the load between workers
+  const int chunk_size = std::max(1, n / (8 * num_threads));
+
+  std::atomic<int> next_index{0};
+  std::exception_ptr error = nullptr;
+  std::mutex error_mutex;
+
+  auto worker_loop = [&](const int worker) {
+    try {
+      while (true) {
+        const int begin = next_index.fetch_add(chunk_size);
+        if (begin >= n) {
+          break;
+        }
+        func(begin, std::min(begin + chunk_size, n), worker);
+      }
+    } catch (...) {
+      std::lock_guard<std::mutex> lock{error_mutex};
+      if (!error) {
+        error = std::current_exception();
+      }
+      // stop the other workers from taking new chunks
+      next_index.store(n);
+    }
+  };
+
+  std::vector<std::thread> threads;
+  threads.reserve(num_threads - 1);
+  for (int worker = 1; worker < num_threads; ++worker) {
+    threads.emplace_back(worker_loop, worker);
+  }
+  // the calling thread also participates as worker 0
+  worker_loop(0);
+
+  for (std::thread &thread : threads) {
+    thread.join();
+  }
+
+  if (error) {
+    std::rethrow_exception(error);
+  }
+}
+
+}  // namespace parallel
+
+#endif  // __PARALLEL_HPP_
@@ -0,0 +1,69 @@
+// storage of the trajectory data recorded by the trajectory tracers
+
+#ifndef __TRAJECTORY_DATA_HPP_
+#define __TRAJECTORY_DATA_HPP_
+#include <algorithm>
+#include <array>
+#include <vector>
+
+/*
+Namespace that contains the layout of the trajectory data recorded by
+the trajectory tracers (evaluate_and_get_trajectory).
+
+The trajectory data is stored in a single contiguous row-major
+(n_steps, 7) array, each row containing the time and the six-vector of the
+particle in spherical coordinates (t, r, theta, phi, pr, ptheta, pphi).
+The array is handed over to NumPy without copying, and each column is
+exposed as a view into the array.
+*/
+namespace trajectory_data {
+
+// the number of values per step (the time and the six-vector)
+constexpr int ncols = 7;
+
+// the maximal number of steps for which the storage is reserved in advance,
+// such that a large maximal number of steps does not allocate the storage
+// of trajectories that end much earlier
+constexpr int max_reserved_steps = 1 << 20;
+
+// the names of the columns
+inline const std::array<const char *, ncols> &keys() {
+  static const std::array<const char *, ncols> column_keys{
+      {"t", "r", "theta", "phi", "pr", "ptheta", "pphi"}};
+  return column_keys;
+}
+
+/* Reserve the storage of a trajectory with at most max_iter steps.
+
+Parameters
+-----------
+- data (std::vector<double> &) :
+     the trajectory data
+- max_iter (int) :
+     the maximal number of steps of the trajectory
+*/
+inline void reserve(std::vector<double> &data, const int max_iter) {
+  data.reserve(static_cast<std::size_t>(ncols) *
+               std::max(std::min(max_iter, max_reserved_steps), 1));
+}
+
+/* Append a step to the trajectory data.
+
+Parameters
+-----------
+- data (std::vector<double> &) :
+     the trajectory data
+- t (double) :
+     the time of the step
+- vec (std::array<double, 6>) :
+     the six-vector (r, theta, phi, pr, ptheta, pphi) of the step
+*/
+inline void append(std::vector<double> &data, const double t,
+                   const std::array<double, 6> &vec) {
+  data.push_back(t);
+  data.insert(data.end(), vec.cbegin(), vec.cend());
+}
+
+}  // namespace trajectory_data
+
+#endif  // __TRAJECTORY_DATA_HPP_
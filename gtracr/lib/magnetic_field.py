@@ -13,6 +13,11 @@ from scipy.interpolate import interp1d
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
 PARENT_DIR = os.path.dirname(CURRENT_DIR)
 
+# the interpolation of the coefficients of each loaded coefficient file
+# (keyed on the file path) together with the coefficients interpolated to
+# each year, which are shared by all IGRF13 instances
+_interpolations = {}
+
 
 class MagneticField:
     '''
@@ -40,22 +45,23 @@ class MagneticField:
 
         Parameters
         ----------
-        - r : float
+        - r : float or np.array(float)
             the radial component in meters
-        - theta : float
+        - theta : float or np.array(float)
             the polar component in radians
-        - phi : float
+        - phi : float or np.array(float)
             the phi component in radians
 
         Returns
         -------
-        - Br, Btheta, Bphi: np.array(float), size 3
-            The spherical components of the magnetic field
+        - Br, Btheta, Bphi: np.array(float), size 3 or shape (3, N)
+            The spherical components of the magnetic field,
+            for each location if arrays of locations are given
         '''
 
         Br = -2. * (EARTH_RADIUS / r)**3. * G10 * np.cos(theta)
         Btheta = -(EARTH_RADIUS / r)**3. * G10 * np.sin(theta)
-        Bphi = 0.
+        Bphi = np.zeros_like(Br)
 
         return np.array([Br, Btheta, Bphi])
 
@@ -80,7 +86,8 @@ class IGRF13(MagneticField):
     - curr_year : float
         the current year in years
     - igrf_coeffs : np.array, float
-        the Gauss coefficients for the year specified in curr_year.
+        the Gauss coefficients for the year specified in curr_year
+        (read-only, since they are shared by all instances with the same year).
     - nmax : int
         the number of truncation
 
@@ -102,45 +109,66 @@ class IGRF13(MagneticField):
         # super().__init__(self)
 
         self.curr_year = curr_year
-        fpath = os.path.join(PARENT_DIR, "data", "IGRF13.shc")
+        fpath = os.path.join(PARENT_DIR, "data", "igrf13.bin")
 
-        leap_year = False
+        if os.path.exists(fpath):
+            # import the coefficients from the memory-mapped binary file
+            igrf = iuf.load_binfile(fpath)
+        else:
+            fpath = os.path.join(PARENT_DIR, "data", "IGRF13.shc")
 
-        # check if current year is a leap year or not
-        if self.curr_year % 4 == 0:
-            leap_year = True
+            leap_year = False
 
-        # import the coefficients from .shc file
-        igrf = iuf.load_shcfile(fpath, leap_year=leap_year)
+            # check if current year is a leap year or not
+            if self.curr_year % 4 == 0:
+                leap_year = True
 
-        # interpolate to account for any year
-        # linear interpolation since time variation in
-        # coefficients is a linear one
-        interp_coeffs = interp1d(
-            igrf.time,
-            igrf.coeffs,
-            kind="linear",
-        )
+            # import the coefficients from .shc file
+            igrf = iuf.load_shcfile(fpath, leap_year=leap_year)
 
         # get the number of truncation based on the
         # igrf .shc file
         self.nmax = igrf.parameters["nmax"] if nmax is None else nmax
 
-        self.igrf_coeffs = interp_coeffs(self.curr_year).T
+        # interpolate to account for any year, reusing the interpolation
+        # and coefficients of previous instances
+        # (the year may be given as a 1-element array)
+        interp_coeffs, year_coeffs = self._interpolation(fpath, igrf)
+        year = float(np.squeeze(self.curr_year))
+        if year not in year_coeffs:
+            coeffs = interp_coeffs(year).T
+            coeffs.flags.writeable = False
+            year_coeffs[year] = coeffs
+
+        self.igrf_coeffs = year_coeffs[year]
+
+    @staticmethod
+    def _interpolation(fpath, igrf):
+        '''
+        The linear interpolation of the coefficients of a loaded coefficient file
+        in time (linear since the time variation of the coefficients is a linear one),
+        and the dictionary of the coefficients interpolated to each year. These are
+        created again if the coefficient file has been reloaded.
+        '''
+        cached = _interpolations.get(fpath)
+        if cached is None or cached[0] is not igrf:
+            cached = (igrf, interp1d(igrf.time, igrf.coeffs,
+                                     kind="linear"), {})
+            _interpolations[fpath] = cached
+        return cached[1], cached[2]
 
     def values(self, r, theta, phi):
         # transform theta, phi to degrees and r into kilometers
-        r *= 1e-3
-        theta *= DEG_PER_RAD
-        phi *= DEG_PER_RAD
+        # (without modifying the arguments, which may be arrays)
+        r = r * 1e-3
+        theta = theta * DEG_PER_RAD
+        phi = phi * DEG_PER_RAD
 
         # check if theta / phi is > 180 or > 360 respectively
         # this is to prevent errors to be raised by the igrf evaluator
-        if theta > 180.:
-            theta = (theta % 180.)  # normalize by nearest remainder from 180
-
-        if phi > 360.:
-            phi = (phi % 360.)  # normalize by nearest remainder from 360
+        # normalize by nearest remainder from 180 / 360
+        theta = np.where(theta > 180., theta % 180., theta)
+        phi = np.where(phi > 360., phi % 360., phi)
 
         # obtaining the values can easily be done by using
         # the function synth_values from igrf_utils.py
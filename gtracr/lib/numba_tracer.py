@@ -0,0 +1,385 @@
+'''
+Version of the Python trajectory tracer in which the Runge Kutta integration
+and the evaluation of the magnetic field are compiled with numba.
+
+The integration of each trajectory, including the evaluation of the Legendre
+polynomials and the IGRF series for a single location, runs as a single
+compiled function, which avoids the overhead of the NumPy calls at each step.
+
+numba is an optional dependency, and this module is only imported when the
+numba version is requested. The compiled functions are cached by numba (in
+__pycache__ next to this module, in the user-wide cache directory of numba
+if the package is not writable, or in NUMBA_CACHE_DIR if set), such that the
+functions are only compiled once, and not again by each process that uses
+them (e.g. the worker processes of GMRC).
+'''
+
+import numpy as np
+
+from gtracr.lib.constants import EARTH_RADIUS, SPEED_OF_LIGHT, G10, DEG_PER_RAD, RAD_PER_DEG
+from gtracr.lib.magnetic_field import IGRF13
+from gtracr.lib.trajectory_tracer import pTrajectoryTracer
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        # without numba, the functions remain (slow) Python functions
+        return lambda func: func
+
+
+# the magnetic field models of the compiled functions
+DIPOLE = 0
+IGRF = 1
+
+
+@njit(cache=True)
+def _legendre_poly(nmax, theta, Pnm):
+    '''
+    The associated Legendre polynomials P(n, m) = Pnm[n, m] (Schmidt
+    quasi-normalized) and their derivatives dP(n, m) = Pnm[m, n + 1] at a single
+    colatitude theta in degrees, as in `igrf_utils.legendre_poly`.
+    '''
+    costh = np.cos(theta * RAD_PER_DEG)
+    sinth = np.sqrt(1. - costh**2.)
+
+    Pnm[:, :] = 0.
+    Pnm[0, 0] = 1.
+    Pnm[1, 1] = sinth
+
+    for m in range(nmax):
+        Pnm_tmp = np.sqrt(m + m + 1.) * Pnm[m, m]
+        Pnm[m + 1, m] = costh * Pnm_tmp
+
+        if m > 0:
+            Pnm[m + 1, m + 1] = sinth * Pnm_tmp / np.sqrt(m + m + 2.)
+
+        for n in range(m + 2, nmax + 1):
+            d = n * n - m * m
+            e = n + n - 1
+            Pnm[n, m] = ((e * costh * Pnm[n - 1, m] -
+                          np.sqrt(float(d - e)) * Pnm[n - 2, m]) /
+                         np.sqrt(float(d)))
+
+    Pnm[0, 2] = -Pnm[1, 1]
+    Pnm[1, 2] = Pnm[1, 0]
+    for n in range(2, nmax + 1):
+        Pnm[0, n + 1] = -np.sqrt((n * n + n) / 2.) * Pnm[n, 1]
+        Pnm[1, n + 1] = ((np.sqrt(2. * (n * n + n)) * Pnm[n, 0] -
+                          np.sqrt(n * n + n - 2.) * Pnm[n, 2]) / 2.)
+
+        for m in range(2, n):
+            Pnm[m, n + 1] = (0.5 *
+                             (np.sqrt((n + m) * (n - m + 1.)) * Pnm[n, m - 1] -
+                              np.sqrt((n + m + 1.) * (n - m)) * Pnm[n, m + 1]))
+
+        Pnm[n, n + 1] = np.sqrt(2. * n) * Pnm[n, n - 1] / 2.
+
+
+@njit(cache=True)
+def _igrf_values(coeffs, nmax, r, theta, phi, Pnm):
+    '''
+    The spherical components of the IGRF field in teslas at a single location
+    (r, theta, phi) in meters and radians, as in `IGRF13.values`.
+    '''
+    # colatitude in degrees, normalized as in IGRF13.values
+    # (phi remains in radians, since it only enters via cos / sin)
+    theta = theta * DEG_PER_RAD
+    if theta > 180.:
+        theta = theta % 180.
+
+    _legendre_poly(nmax, theta, Pnm)
+    sinth = Pnm[1, 1]
+
+    radius = r / EARTH_RADIUS
+    r_n = radius**(-3.)
+
+    Br = 0.
+    Btheta = 0.
+    Bphi = 0.
+
+    num = 0
+    for n in range(1, nmax + 1):
+        Br += (n + 1) * Pnm[n, 0] * r_n * coeffs[num]
+        Btheta += -Pnm[0, n + 1] * r_n * coeffs[num]
+        num += 1
+
+        for m in range(1, n + 1):
+            cmp = np.cos(m * phi)
+            smp = np.sin(m * phi)
+            g = coeffs[num]
+            h = coeffs[num + 1]
+
+            Br += (n + 1) * Pnm[n, m] * r_n * (g * cmp + h * smp)
+            Btheta += -Pnm[m, n + 1] * r_n * (g * cmp + h * smp)
+
+            # handle poles using L'Hopital's rule
+            if theta == 0.:
+                div_Pnm = Pnm[m, n + 1]
+            elif theta == 180.:
+                div_Pnm = -Pnm[m, n + 1]
+            else:
+                div_Pnm = Pnm[n, m] / sinth
+            Bphi += m * div_Pnm * r_n * (g * smp - h * cmp)
+
+            num += 2
+
+        r_n = r_n / radius
+
+    # convert from nanoteslas to teslas
+    return Br * 1e-9, Btheta * 1e-9, Bphi * 1e-9
+
+
+@njit(cache=True)
+def _field_values(field, coeffs, nmax, r, theta, phi, Pnm):
+    '''
+    The spherical components of the magnetic field model in teslas at a
+    single location (r, theta, phi) in meters and radians.
+    '''
+    if field == IGRF:
+        return _igrf_values(coeffs, nmax, r, theta, phi, Pnm)
+
+    # the ideal dipole, as in MagneticField.values
+    Br = -2. * (EARTH_RADIUS / r)**3. * G10 * np.cos(theta)
+    Btheta = -(EARTH_RADIUS / r)**3. * G10 * np.sin(theta)
+    return Br, Btheta, 0.
+
+
+@njit(cache=True)
+def _ode_lrz(vec, charge, mass, field, coeffs, nmax, Pnm, dvec):
+    '''
+    The Lorentz force equations in spherical coordinates for a single
+    six-vector, as in `pTrajectoryTracer.ode_lrz`, written into dvec.
+    '''
+    r, theta, phi = vec[0], vec[1], vec[2]
+    pr, ptheta, pphi = vec[3], vec[4], vec[5]
+
+    pmag = np.sqrt(pr**2. + ptheta**2. + pphi**2.)
+    gamma = np.sqrt(1. + (pmag / (mass * SPEED_OF_LIGHT))**2.)
+    rel_mass = mass * gamma
+
+    bf_r, bf_theta, bf_phi = _field_values(field, coeffs, nmax, r, theta,
+                                           phi, Pnm)
+
+    sintheta = np.sin(theta)
+    costheta = np.cos(theta)
+
+    # the lorentz force terms and the auxiliary terms that
+    # come from using spherical coordinates
+    dprdt = (-1. * charge * (ptheta * bf_phi - bf_theta * pphi) +
+             ((ptheta**2. + pphi**2.) / r))
+    dpthetadt = (charge * (pr * bf_phi - bf_r * pphi) +
+                 ((pphi**2. * costheta) / (r * sintheta)) -
+                 ((pr * ptheta) / r))
+    dpphidt = (-1. * charge * (pr * bf_theta - bf_r * ptheta) -
+               ((pr * pphi) / r) - ((ptheta * pphi * costheta) /
+                                    (r * sintheta)))
+
+    dvec[0] = pr / rel_mass
+    dvec[1] = (ptheta / r) / rel_mass
+    dvec[2] = (pphi / (r * sintheta)) / rel_mass
+    dvec[3] = dprdt / rel_mass
+    dvec[4] = dpthetadt / rel_mass
+    dvec[5] = dpphidt / rel_mass
+
+
+@njit(cache=True)
+def _rk4(t0, vec, charge, mass, h, max_step, min_r, max_r, field, coeffs,
+         nmax, data):
+    '''
+    Evaluate a single trajectory by performing a 4th order Runge Kutta
+    integration, as in `pTrajectoryTracer.evaluate`. The six-vector vec is
+    advanced in place.
+
+    If data has at least max_step rows, the time and six-vector before each
+    step are written into the rows of data, as in
+    `pTrajectoryTracer.evaluate_and_get_trajectory`.
+
+    Returns whether the particle escaped, the final time and the number of steps.
+    '''
+    record = data.shape[0] >= max_step
+    Pnm = np.zeros((nmax + 1, nmax + 2))
+    k1 = np.zeros(6)
+    k2 = np.zeros(6)
+    k3 = np.zeros(6)
+    k4 = np.zeros(6)
+    tmp = np.zeros(6)
+
+    t = t0
+    escaped = False
+    n_steps = 0
+    for i in range(max_step):
+        if record:
+            data[i, 0] = t
+            data[i, 1:] = vec
+        n_steps += 1
+
+        _ode_lrz(vec, charge, mass, field, coeffs, nmax, Pnm, k1)
+        for j in range(6):
+            k1[j] *= h
+            tmp[j] = vec[j] + 0.5 * k1[j]
+        _ode_lrz(tmp, charge, mass, field, coeffs, nmax, Pnm, k2)
+        for j in range(6):
+            k2[j] *= h
+            tmp[j] = vec[j] + 0.5 * k2[j]
+        _ode_lrz(tmp, charge, mass, field, coeffs, nmax, Pnm, k3)
+        for j in range(6):
+            k3[j] *= h
+            tmp[j] = vec[j] + k3[j]
+        _ode_lrz(tmp, charge, mass, field, coeffs, nmax, Pnm, k4)
+        for j in range(6):
+            k4[j] *= h
+            vec[j] += (1. / 6.) * (k1[j] + (2. * k2[j]) + (2. * k3[j]) +
+                                   k4[j])
+        t += h
+
+        # breaking conditions based on value of r
+        if vec[0] > max_r:
+            escaped = True
+            break
+        if vec[0] < min_r:
+            break
+
+    return escaped, t, n_steps
+
+
+@njit(cache=True)
+def _rk4_batch(t0, vecs, charges, masses, h, max_step, min_r, max_r, field,
+               coeffs, nmax, escaped, final_times):
+    '''
+    Evaluate a batch of trajectories one after the other, advancing the
+    (N, 6) six-vectors in place.
+    '''
+    data = np.zeros((0, 7))
+    for i in range(vecs.shape[0]):
+        escaped[i], final_times[i], _ = _rk4(t0, vecs[i], charges[i],
+                                             masses[i], h, max_step, min_r,
+                                             max_r, field, coeffs, nmax, data)
+
+
+class nTrajectoryTracer(pTrajectoryTracer):
+    '''
+    A version of the Python trajectory tracer (pTrajectoryTracer) in which the
+    integration and the magnetic field are evaluated by functions compiled
+    with numba. Requires numba.
+
+    The parameters are the same as for pTrajectoryTracer.
+
+    Note:
+    The "n" in front of nTrajectoryTracer indicates that this is the numba version.
+    '''
+    def __init__(self, *args, **kwargs):
+        if not HAS_NUMBA:
+            raise Exception(
+                "The numba version of the trajectory tracer requires numba!")
+
+        super().__init__(*args, **kwargs)
+
+        # the field model and coefficients passed to the compiled functions
+        if isinstance(self.bfield, IGRF13):
+            self.field = IGRF
+            self.coeffs = np.ascontiguousarray(self.bfield.igrf_coeffs,
+                                               dtype=float)
+            self.nmax = int(self.bfield.nmax)
+        else:
+            self.field = DIPOLE
+            self.coeffs = np.zeros(0)
+            self.nmax = 1
+
+    def _integrate(self, t0, vec, charge, mass, data):
+        '''
+        Integrate a single trajectory with the compiled Runge Kutta integration.
+        '''
+        return _rk4(float(t0), vec, float(charge), float(mass),
+                    float(self.stepsize), int(self.max_step),
+                    self.start_altitude + EARTH_RADIUS,
+                    EARTH_RADIUS + self.escape_radius, self.field,
+                    self.coeffs, self.nmax, data)
+
+    def evaluate(self, t0, vec0):
+        '''
+        Evaluate the trajectory by performing a 4th order Runge Kutta integration.
+
+        Parameters
+        ----------
+
+        - t0 : float
+            the initial time
+        - vec0 : np.array(float), size 6
+            the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0)
+
+        Returns
+        --------
+
+        - None
+        '''
+        vec = np.array(vec0, dtype=float)
+        escaped, t, _ = self._integrate(t0, vec, self.charge, self.mass,
+                                        np.zeros((0, 7)))
+
+        self.particle_escaped = escaped
+        self.final_time = t
+        self.final_sixvector = vec
+
+    def evaluate_and_get_trajectory(self, t0, vec0):
+        '''
+        Evaluate the trajectory by performing a 4th order Runge Kutta integration and
+        get the corresponding trajectory data.
+
+        Parameters
+        ----------
+
+        - t0 : float
+            the initial time
+        - vec0 : np.array(float), size 6
+            the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0)
+
+        Returns
+        --------
+
+        - trajectory_data (dict<str, numpy array>) :
+            The dictionary that contains the trajectory information.
+            - keys are ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
+        '''
+        vec = np.array(vec0, dtype=float)
+        data = np.zeros((self.max_step, 7))
+        escaped, t, n_steps = self._integrate(t0, vec, self.charge,
+                                              self.mass, data)
+
+        self.particle_escaped = escaped
+        self.final_time = t
+        self.final_sixvector = vec
+
+        keys = ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
+        return {key: data[:n_steps, i] for i, key in enumerate(keys)}
+
+    def evaluate_batch(self, vec0s, charges=None, masses=None, t0=0.):
+        '''
+        Evaluate a batch of N trajectories in a single call, with the same
+        parameters and results as `pTrajectoryTracer.evaluate_batch`.
+        '''
+        vecs = np.array(vec0s, dtype=float)
+        if vecs.ndim != 2 or vecs.shape[1] != 6:
+            raise Exception("Only six-vectors with shape (N, 6) are allowed!")
+        n = vecs.shape[0]
+
+        charges = np.ascontiguousarray(
+            np.broadcast_to(
+                self.charge if charges is None else np.asarray(
+                    charges, float), (n, )))
+        masses = np.ascontiguousarray(
+            np.broadcast_to(
+                self.mass if masses is None else np.asarray(masses, float),
+                (n, )))
+
+        escaped = np.zeros(n, dtype=bool)
+        final_times = np.zeros(n)
+        _rk4_batch(float(t0), vecs, charges, masses, float(self.stepsize),
+                   int(self.max_step), self.start_altitude + EARTH_RADIUS,
+                   EARTH_RADIUS + self.escape_radius, self.field, self.coeffs,
+                   self.nmax, escaped, final_times)
+
+        return escaped, final_times, vecs
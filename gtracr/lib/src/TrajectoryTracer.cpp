@@ -97,9 +97,9 @@ inline std::array<double, 6> operator*(const double lh_val,
 
   Members
   --------
-  - bfield_ (MagneticField instance):
-      The MagneticField object that contains the information pertaining the
-      Earth's magnetic field model (default is dipole model).
+  - bfield_ (Field instance):
+      The magnetic field model (MagneticField for the dipole model, IGRF for
+      the IGRF model), fixed at compile time by the template parameter.
   - charge_ (double) :
       The charge of the particle in units of Coulombs (default 1.602e-19 C, i.e.
   1e).
@@ -123,15 +123,21 @@ inline std::array<double, 6> operator*(const double lh_val,
   ------------
   None
 */
-TrajectoryTracer::TrajectoryTracer()
-    : bfield_{MagneticField()},
+template <class Field>
+TrajectoryTracer<Field>::TrajectoryTracer()
+    : bfield_{FieldModel<Field>::create(
+          {"/home/keito/devel/gtracr/data", 2020.})},
       charge_{constants::ELEMENTARY_CHARGE},
       mass_{0.938 * constants::KG_PER_GEVC2},
       start_altitude_{100. * (1e3)},
       escape_radius_{10. * constants::RE},
       stepsize_{1e-5},
       max_iter_{10000},
-      particle_escaped_{false} {}
+      particle_escaped_{false},
+      adaptive_{false},
+      rtol_{1e-6},
+      atol_{1e-9},
+      cartesian_{false} {}
 
 /* Constructor for TrajectoryTracer class
 
@@ -142,9 +148,9 @@ This constructor requires 2 parameters, and the rest may be optional.
 
 Class Members
 --------
-- bfield_ (MagneticField instance):
-    The MagneticField object that contains the information pertaining the
-    Earth's magnetic field model (default is dipole model).
+- bfield_ (Field instance):
+    The magnetic field model (MagneticField for the dipole model, IGRF for
+    the IGRF model), fixed at compile time by the template parameter.
 - charge_ (double) :
     The charge of the particle in units of Coulombs (default 1.602e-19 C, i.e.
 1e).
@@ -182,16 +188,34 @@ Optional Parameters
       The maximum number of iterations performed in the integration process
       (default 10000)
 - bfield_type (char) :
-      The type of Magnetic Field to evaluate the trajectory with. Only types
-      'd' (for dipole model) or 'i' (IGRF model) are allowed (default 'd').
+      The type of Magnetic Field to evaluate the trajectory with, which must
+      match the field model of the tracer, i.e. 'd' for
+      TrajectoryTracer<MagneticField> and 'i' for TrajectoryTracer<IGRF>
+      (default is the type of the field model).
 - igrf_params (std::pair<std::string, double>) :
       Parameters required for instantiating the IGRF model. The first entry
       contains the path of the directory in which the .COF data file is
       stored (default to the author's path to the directory). The second entry
       contains the date in which the evaluation of the trajectory is requested
       in decimal date (default 2020.).
+- integrator (std::string) :
+      The integration algorithm. Either "rk4" for the fixed-step 4th-order
+      Runge Kutta algorithm, or "rk45" for the adaptive Dormand-Prince
+      algorithm (default "rk4").
+- rtol (double) :
+      The relative error tolerance per step of the adaptive integrator
+      (default 1e-6).
+- atol (double) :
+      The absolute error tolerance per step of the adaptive integrator,
+      relative to Earth's radius for r, in radians for theta and phi, and
+      relative to the initial momentum magnitude for the momentum components
+      (default 1e-9).
+- kernel (std::string) :
+      The coordinate system in which the equations of motion are integrated,
+      either "spherical" or "cartesian" (default "spherical").
 */
-TrajectoryTracer::TrajectoryTracer( double charge,  double mass,
+template <class Field>
+TrajectoryTracer<Field>::TrajectoryTracer( double charge,  double mass,
                                      double start_altitude,
                                     double escape_radius /*= 10. * constants::RE*/,
                                     double stepsize /*= 1e-5*/,
@@ -200,24 +224,40 @@ TrajectoryTracer::TrajectoryTracer( double charge,  double mass,
                                    const std::pair<std::string, double>
                                        &igrf_params /*=
       {"/home/keito/devel/gtracr/data",
-      2020.}*/)
-    : charge_{charge},
+      2020.}*/,
+                                   const std::string &integrator /*= "rk4"*/,
+                                   double rtol /*= 1e-6*/,
+                                   double atol /*= 1e-9*/,
+                                   const std::string &kernel /*= "spherical"*/)
+    : bfield_{FieldModel<Field>::create(igrf_params)},
+      charge_{charge},
       mass_{mass},
       start_altitude_{start_altitude},
       escape_radius_{escape_radius},
       stepsize_{stepsize},
       max_iter_{max_iter},
-      particle_escaped_{false} {
-  switch (bfield_type) {
-    case 'd':
-      bfield_ = MagneticField();
-      break;
-    case 'i':
-      // add file name to DATA_DIR (first component in igrf_params)
-      std::string DATA_PATH = igrf_params.first + "/igrf13.json";
-      double sdate = igrf_params.second;
-      bfield_ = IGRF(DATA_PATH, sdate);
-      break;
+      particle_escaped_{false},
+      adaptive_{false},
+      rtol_{rtol},
+      atol_{atol},
+      cartesian_{false} {
+  if (kernel == "cartesian") {
+    cartesian_ = true;
+  } else if (kernel != "spherical") {
+    throw std::invalid_argument(
+        "Only kernels 'spherical' and 'cartesian' are allowed!");
+  }
+
+  if (integrator == "rk45") {
+    adaptive_ = true;
+  } else if (integrator != "rk4") {
+    throw std::invalid_argument("Only integrators 'rk4' and 'rk45' are allowed!");
+  }
+
+  // the field model is fixed by the template parameter
+  if (bfield_type != FieldModel<Field>::type()) {
+    throw std::invalid_argument(
+        "The field model does not match the type of the tracer!");
   }
 }
 
@@ -238,7 +278,8 @@ TrajectoryTracer::TrajectoryTracer( double charge,  double mass,
        the ordinary differential equation for the six vector based on the
   Lorentz force equation
 */
-std::array<double, 6> TrajectoryTracer::ode_lrz(const double t,
+template <class Field>
+std::array<double, 6> TrajectoryTracer<Field>::ode_lrz(const double t,
                                                 const std::array<double, 6>& vec) {
 
   // unpack array
@@ -298,6 +339,58 @@ std::array<double, 6> TrajectoryTracer::ode_lrz(const double t,
 
   return (1. / rel_mass) * ode_lrz;
 }
+
+/* The ordinary differential equations that describes the motion
+  of charge particles in Earth's magnetic field via the Lorentz force
+  in Earth-centered, Earth-fixed (ECEF) Cartesian coordinates.
+
+  Parameters
+  -----------
+  - t (double) :
+      the time
+  - vec (std::array<double, 6>) :
+       the six-vector (x, y, z, px, py, pz) at time t
+
+  Returns
+  --------
+  - ode_lrz (std::array<double, 6>) :
+       the ordinary differential equation for the six vector based on the
+  Lorentz force equation
+*/
+template <class Field>
+std::array<double, 6> TrajectoryTracer<Field>::ode_lrz_cartesian(
+    const double t, const std::array<double, 6>& vec) {
+  // unpack array
+  double x = vec[0];
+  double y = vec[1];
+  double z = vec[2];
+  double px = vec[3];
+  double py = vec[4];
+  double pz = vec[5];
+
+  // get the lorentz factor
+  double gmma = lorentz_factor(px, py, pz);
+  double rel_mass = mass_ * gmma;
+
+  // evaluate B-field
+  std::array<double, 3> bf_values = bfield_.ecef_values(x, y, z);
+  double bf_x = bf_values[0];
+  double bf_y = bf_values[1];
+  double bf_z = bf_values[2];
+
+  // get the momentum ODE, dp/dt = -q * (p x B)
+  // Note:
+  // - charge is inverted to allow backtracking
+  // - there are no auxiliary terms in Cartesian coordinates
+  double dpxdt = -1. * charge_ * ((py * bf_z) - (pz * bf_y));
+  double dpydt = -1. * charge_ * ((pz * bf_x) - (px * bf_z));
+  double dpzdt = -1. * charge_ * ((px * bf_y) - (py * bf_x));
+
+  std::array<double, 6> ode_lrz =
+      std::array<double, 6>{{px, py, pz, dpxdt, dpydt, dpzdt}};
+
+  return (1. / rel_mass) * ode_lrz;
+}
 /* Evaluates the trajectory of the particle using a 4th-order Runge Kutta
 algorithm.
 
@@ -313,27 +406,38 @@ Returns
 None
 
 */
-void TrajectoryTracer::evaluate(const double &t0, std::array<double, 6> &vec0) {
+template <class Field>
+void TrajectoryTracer<Field>::evaluate(const double &t0,
+                                       std::array<double, 6> &vec0) {
+  if (adaptive_) {
+    evaluate_rk45(t0, vec0);
+    return;
+  }
+
   double h = stepsize_;  // step size in shorter notation
 
   // set the initial conditions
   double t = t0;
-  std::array<double, 6> vec = vec0;
+  std::array<double, 6> vec =
+      cartesian_ ? coordinates::spherical_to_cartesian(vec0) : vec0;
   // TODO: make arrays into references for no copying
 
+  // reset the escape flag in case the tracer is reused
+  particle_escaped_ = false;
+
   // start the loop
   for (int i = 0; i < max_iter_; ++i) {
-    std::array<double, 6> k1_vec =  h * ode_lrz(t, vec);
-    std::array<double, 6> k2_vec = h * ode_lrz(t + (0.5 * h), vec + (0.5 * k1_vec ));
-    std::array<double, 6> k3_vec = h * ode_lrz(t + (0.5 * h), vec + (0.5 * k2_vec ));
-    std::array<double, 6> k4_vec = h * ode_lrz(t + h, vec + h * k3_vec);
+    std::array<double, 6> k1_vec =  h * ode(t, vec);
+    std::array<double, 6> k2_vec = h * ode(t + (0.5 * h), vec + (0.5 * k1_vec ));
+    std::array<double, 6> k3_vec = h * ode(t + (0.5 * h), vec + (0.5 * k2_vec ));
+    std::array<double, 6> k4_vec = h * ode(t + h, vec + h * k3_vec);
     std::array<double, 6> k_vec = (1. / 6.) * (k1_vec + (2. * k2_vec ) + (2. * k3_vec ) + k4_vec);
 
     // increment by weighted sum
     vec = vec + k_vec;
     t += h;  // increase time
 
-    const double &r = vec[0];
+    const double r = radius(vec);
 
     if (r > escape_radius_) {
       particle_escaped_ = true;
@@ -350,11 +454,12 @@ void TrajectoryTracer::evaluate(const double &t0, std::array<double, 6> &vec0) {
   // store the final time and six-vector for checking purposes
   // the last recorded time and six-vector is the final six-vector / time
   final_time_ = t;
-  final_sixvector_ = vec;
+  final_sixvector_ =
+      cartesian_ ? coordinates::cartesian_to_spherical(vec) : vec;
 }  // evaluate
 
 /* Evaluates the trajectory of the particle using a 4th-order Runge Kutta
-algorithm and return a map that contains the information of the particle
+algorithm and return an array that contains the information of the particle
 trajectory. This will most often be used for debugging purposes to see the
 actual trajectory.
 
@@ -367,54 +472,55 @@ Parameters
 
 Returns
 --------
-- trajectory_data (std::map<std::string, std::vector<double> >) :
-    the trajectory information, that is, the time array of the trajectory
-    and the six-vector of the trajectory in std::vectors.
+- trajectory_data (std::vector<double>) :
+    the trajectory information, that is, the time and the six-vector of the
+    trajectory in spherical coordinates, as a row-major (n_steps, 7) array
+    (see trajectory_data.hpp).
     Notes:
-    - keys are ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
-    - the final point of the trajectory is also contained in the map
-    - std::vectors (dynamic arrays) are used since the length of each
-      trajectory is not known at compile time.
+    - the columns are ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
+    - the storage is reserved in advance for up to max_iter steps, since
+      the length of each trajectory is not known beforehand.
 
 */
-std::map<std::string, std::vector<double>>
-TrajectoryTracer::evaluate_and_get_trajectory(double &t0,
-                                              std::array<double, 6> &vec0) {
+template <class Field>
+std::vector<double> TrajectoryTracer<Field>::evaluate_and_get_trajectory(
+    double &t0, std::array<double, 6> &vec0) {
+  // the data of each step, (t, r, theta, phi, pr, ptheta, pphi) per step
+  std::vector<double> trajectory;
+  trajectory_data::reserve(trajectory, max_iter_ + 1);
+
+  if (adaptive_) {
+    evaluate_rk45(t0, vec0, &trajectory);
+    return trajectory;
+  }
+
   double h = stepsize_;  // step size in shorter notation
 
   // set the initial conditions
   double t = t0;
-  std::array<double, 6> vec = vec0;
-
-  // initialize array to contain data
-  std::vector<double> t_arr, r_arr, theta_arr, phi_arr, pr_arr, ptheta_arr,
-      pphi_arr;
+  std::array<double, 6> vec =
+      cartesian_ ? coordinates::spherical_to_cartesian(vec0) : vec0;
 
   // start the loop
   for (int i = 0; i < max_iter_; ++i) {
     // append the values first
     // how vec looks like:
     // (r, theta, phi, pr, ptheta, pphi) = vec
-
-    t_arr.push_back(t);
-    r_arr.push_back(vec[0]);
-    theta_arr.push_back(vec[1]);
-    phi_arr.push_back(vec[2]);
-    pr_arr.push_back(vec[3]);
-    ptheta_arr.push_back(vec[4]);
-    pphi_arr.push_back(vec[5]);
+    trajectory_data::append(
+        trajectory, t,
+        cartesian_ ? coordinates::cartesian_to_spherical(vec) : vec);
 
   // start the loop
-    std::array<double, 6> k1_vec =  ode_lrz(t, vec);
-    std::array<double, 6> k2_vec = ode_lrz(t + (0.5 * h), vec + (0.5 * h * k1_vec ));
-    std::array<double, 6> k3_vec = ode_lrz(t + (0.5 * h), vec + (0.5 * h * k2_vec ));
-    std::array<double, 6> k4_vec = ode_lrz(t + h, vec + h * k3_vec);
+    std::array<double, 6> k1_vec =  ode(t, vec);
+    std::array<double, 6> k2_vec = ode(t + (0.5 * h), vec + (0.5 * h * k1_vec ));
+    std::array<double, 6> k3_vec = ode(t + (0.5 * h), vec + (0.5 * h * k2_vec ));
+    std::array<double, 6> k4_vec = ode(t + h, vec + h * k3_vec);
     std::array<double, 6>k_vec = (h / 6.) * (k1_vec + (2. * k2_vec ) + (2. * k3_vec ) + k4_vec);
     // increment by weighted sum
     vec = vec + k_vec;
     t += h;  // increase time
 
-    const double& r = vec[0];
+    const double r = radius(vec);
 
     if (r > escape_radius_) {
       particle_escaped_ = true;
@@ -431,17 +537,293 @@ TrajectoryTracer::evaluate_and_get_trajectory(double &t0,
   // store the final time and six-vector for checking purposes
   // the last recorded time and six-vector is the final six-vector / time
   final_time_ = t;
-  final_sixvector_ = vec;
-
-  // create map that contains trajectory data
-  std::map<std::string, std::vector<double>> trajectory_data = {
-      {"t", t_arr},      {"r", r_arr},   {"theta", theta_arr},
-      {"phi", phi_arr},  {"pr", pr_arr}, {"ptheta", ptheta_arr},
-      {"pphi", pphi_arr}};
+  final_sixvector_ =
+      cartesian_ ? coordinates::cartesian_to_spherical(vec) : vec;
 
-  return trajectory_data;
+  return trajectory;
 }  // evaluate_and_get_trajectory
 
+/* Evaluates the trajectory of the particle using an adaptive 5th-order
+Dormand-Prince Runge Kutta algorithm with an embedded 4th-order error
+estimate (RK45).
+
+The step size is adjusted after each step such that the estimated local
+error stays within the tolerances rtol_ and atol_, so that large steps are
+taken far away from Earth where the field is weak. The integration is
+stopped once the time stepsize_ * max_iter_ has passed, or after max_iter_
+attempted steps.
+
+Parameters
+-----------
+- t0 (double) :
+    the initial time in seconds
+- vec0 (std::array<double, 6>) :
+     the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0) at time t0
+- trajectory (std::vector<double> *) :
+     if not a null pointer, the time and six-vector of each step
+     (t, r, theta, phi, pr, ptheta, pphi) are appended to this vector
+
+Returns
+--------
+None
+*/
+template <class Field>
+void TrajectoryTracer<Field>::evaluate_rk45(const double &t0,
+                                            const std::array<double, 6> &vec0,
+                                            std::vector<double> *trajectory) {
+  // Dormand-Prince coefficients
+  constexpr double a21 = 1. / 5.;
+  constexpr double a31 = 3. / 40., a32 = 9. / 40.;
+  constexpr double a41 = 44. / 45., a42 = -56. / 15., a43 = 32. / 9.;
+  constexpr double a51 = 19372. / 6561., a52 = -25360. / 2187.,
+                   a53 = 64448. / 6561., a54 = -212. / 729.;
+  constexpr double a61 = 9017. / 3168., a62 = -355. / 33.,
+                   a63 = 46732. / 5247., a64 = 49. / 176.,
+                   a65 = -5103. / 18656.;
+  // 5th-order weights (also the last row of the Butcher tableau)
+  constexpr double b1 = 35. / 384., b3 = 500. / 1113., b4 = 125. / 192.,
+                   b5 = -2187. / 6784., b6 = 11. / 84.;
+  // difference between the 5th- and 4th-order weights
+  constexpr double e1 = 71. / 57600., e3 = -71. / 16695., e4 = 71. / 1920.,
+                   e5 = -17253. / 339200., e6 = 22. / 525., e7 = -1. / 40.;
+  // step size controller settings
+  constexpr double safety = 0.9;
+  constexpr double min_factor = 0.2;
+  constexpr double max_factor = 5.;
+
+  // set the initial conditions
+  double t = t0;
+  std::array<double, 6> vec =
+      cartesian_ ? coordinates::spherical_to_cartesian(vec0) : vec0;
+  double h = stepsize_;
+  const double t_end = t0 + stepsize_ * max_iter_;
+
+  // reset the escape flag in case the tracer is reused
+  particle_escaped_ = false;
+
+  // the absolute tolerance of each component, scaled to the typical
+  // magnitude of each component
+  const double pmag0 =
+      sqrt(vec0[3] * vec0[3] + vec0[4] * vec0[4] + vec0[5] * vec0[5]);
+  const double atol_angle = cartesian_ ? atol_ * constants::RE : atol_;
+  const std::array<double, 6> atol_vec{{atol_ * constants::RE, atol_angle,
+                                        atol_angle, atol_ * pmag0,
+                                        atol_ * pmag0, atol_ * pmag0}};
+
+  // first-same-as-last: the last stage of a step is the first of the next
+  std::array<double, 6> k1_vec = ode(t, vec);
+
+  if (trajectory != nullptr) {
+    trajectory_data::append(*trajectory, t, vec0);
+  }
+
+  for (int i = 0; i < max_iter_ && t < t_end; ++i) {
+    // do not step over the maximal time
+    h = std::min(h, t_end - t);
+
+    std::array<double, 6> k2_vec = ode(t + 0.2 * h, vec + (h * a21) * k1_vec);
+    std::array<double, 6> k3_vec = ode(
+        t + 0.3 * h, vec + h * ((a31 * k1_vec) + (a32 * k2_vec)));
+    std::array<double, 6> k4_vec = ode(
+        t + 0.8 * h,
+        vec + h * ((a41 * k1_vec) + (a42 * k2_vec) + (a43 * k3_vec)));
+    std::array<double, 6> k5_vec = ode(
+        t + (8. / 9.) * h,
+        vec + h * ((a51 * k1_vec) + (a52 * k2_vec) + (a53 * k3_vec) +
+                   (a54 * k4_vec)));
+    std::array<double, 6> k6_vec = ode(
+        t + h, vec + h * ((a61 * k1_vec) + (a62 * k2_vec) + (a63 * k3_vec) +
+                          (a64 * k4_vec) + (a65 * k5_vec)));
+    std::array<double, 6> vec_new =
+        vec + h * ((b1 * k1_vec) + (b3 * k3_vec) + (b4 * k4_vec) +
+                   (b5 * k5_vec) + (b6 * k6_vec));
+    std::array<double, 6> k7_vec = ode(t + h, vec_new);
+
+    // the error estimate, normalized by the tolerance of each component
+    std::array<double, 6> err_vec =
+        h * ((e1 * k1_vec) + (e3 * k3_vec) + (e4 * k4_vec) + (e5 * k5_vec) +
+             (e6 * k6_vec) + (e7 * k7_vec));
+    double err = 0.;
+    for (int j = 0; j < 6; ++j) {
+      double scale =
+          atol_vec[j] + rtol_ * std::max(std::abs(vec[j]), std::abs(vec_new[j]));
+      err += (err_vec[j] / scale) * (err_vec[j] / scale);
+    }
+    err = sqrt(err / 6.);
+
+    if (err > 1.) {
+      // reject the step and retry with a smaller step size
+      h *= std::max(min_factor, safety * pow(err, -0.2));
+      continue;
+    }
+
+    // accept the step
+    t += h;
+    vec = vec_new;
+    k1_vec = k7_vec;
+    h *= (err > 0.) ? std::min(max_factor, safety * pow(err, -0.2))
+                    : max_factor;
+
+    if (trajectory != nullptr) {
+      trajectory_data::append(
+          *trajectory, t,
+          cartesian_ ? coordinates::cartesian_to_spherical(vec) : vec);
+    }
+
+    const double r = radius(vec);
+
+    if (r > escape_radius_) {
+      particle_escaped_ = true;
+      break;
+    }  // if (r > escape_radius_)
+
+    // breaking condition
+    // if particle reaches back onto Earth's surface again
+    if (r < start_altitude_ + constants::RE) {
+      break;
+    }  // if (r < start_altitude_ + constants::RE)
+  }
+
+  // store the final time and six-vector for checking purposes
+  final_time_ = t;
+  final_sixvector_ =
+      cartesian_ ? coordinates::cartesian_to_spherical(vec) : vec;
+}  // evaluate_rk45
+
+/* Evaluates the trajectories of a batch of particles using a 4th-order
+Runge Kutta algorithm. Each particle is evaluated with the same settings
+(field model, step size, altitudes) as this tracer, but with its own
+initial six-vector, charge and mass.
+
+The batch is distributed over a pool of worker threads, each of which
+evaluates its share of the batch on its own copy of this tracer.
+
+Parameters
+-----------
+- t0 (double) :
+    the initial time in seconds, common to all particles
+- n (int) :
+    the number of particles in the batch
+- vec0s (const double *) :
+    the initial six-vectors of each particle (size n * 6, row-major)
+- charges (const double *) :
+    the charge of each particle in Coulombs (size n)
+- masses (const double *) :
+    the mass of each particle in kilograms (size n)
+- escaped (bool *) :
+    output array, set to true if the particle has escaped (size n)
+- final_times (double *) :
+    output array, the final time of each trajectory (size n)
+- final_sixvectors (double *) :
+    output array, the final six-vector of each trajectory (size n * 6,
+    row-major)
+- num_threads (int) :
+    the number of threads used to evaluate the batch. If num_threads <= 0,
+    the number of threads is set from GTRACR_NUM_THREADS, or the number of
+    available cores if it is not set.
+
+Returns
+--------
+None
+*/
+template <class Field>
+void TrajectoryTracer<Field>::evaluate_batch(const double &t0, const int n,
+                                             const double *vec0s,
+                                             const double *charges,
+                                             const double *masses,
+                                             bool *escaped,
+                                             double *final_times,
+                                             double *final_sixvectors,
+                                             const int num_threads) {
+  const int nthreads = std::min(
+      (num_threads > 0) ? num_threads : parallel::default_num_threads(),
+      std::max(n, 1));
+
+  // one copy of the tracer per worker, so that the field model is only
+  // set up once per worker and the state of this tracer is not modified
+  std::vector<TrajectoryTracer> tracers(nthreads, *this);
+
+  parallel::parallel_for(
+      n, nthreads, [&](const int begin, const int end, const int worker) {
+        TrajectoryTracer &tracer = tracers[worker];
+
+        for (int i = begin; i < end; ++i) {
+          tracer.charge_ = charges[i];
+          tracer.mass_ = masses[i];
+
+          std::array<double, 6> vec0;
+          std::copy(vec0s + 6 * i, vec0s + 6 * (i + 1), vec0.begin());
+
+          tracer.evaluate(t0, vec0);
+
+          escaped[i] = tracer.particle_escaped_;
+          final_times[i] = tracer.final_time_;
+          std::copy(tracer.final_sixvector_.cbegin(),
+                    tracer.final_sixvector_.cend(), final_sixvectors + 6 * i);
+        }
+      });
+}  // evaluate_batch
+
+/* Finds the cutoff rigidity of the particle in the direction of the
+initial six-vector, i.e. the lowest rigidity in which the particle
+escapes, by evaluating the trajectory for each rigidity in ascending order
+with this tracer and its field model. For each rigidity, only the
+magnitude of the initial momentum is rescaled.
+
+Parameters
+-----------
+- t0 (double) :
+    the initial time in seconds
+- vec0 (std::array<double, 6>) :
+    the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0),
+    whose momentum sets the direction of the particle
+- n (int) :
+    the number of rigidities
+- rigidities (const double *) :
+    the rigidities in GV in ascending order (size n)
+- allowed (bool *) :
+    output array, set to true if the particle escapes with each rigidity
+    (size n)
+- stop_at_first (bool) :
+    whether to stop at the first rigidity in which the particle escapes
+
+Returns
+--------
+- index (int) :
+    the index of the first rigidity in which the particle escapes,
+    or -1 if the particle does not escape for any rigidity
+*/
+template <class Field>
+int TrajectoryTracer<Field>::find_cutoff(
+    const double &t0, const std::array<double, 6> &vec0, const int n,
+    const double *rigidities, bool *allowed, const bool stop_at_first) {
+  // the magnitude of the initial momentum
+  const double pmag0 = sqrt((vec0[3] * vec0[3]) + (vec0[4] * vec0[4]) +
+                            (vec0[5] * vec0[5]));
+  // the momentum per unit rigidity, p = R |Z| in GeV / c with R in GV
+  const double p_per_rigidity =
+      std::abs(charge_ / constants::ELEMENTARY_CHARGE) *
+      constants::KG_M_S_PER_GEVC;
+
+  int index = -1;
+  for (int i = 0; i < n; ++i) {
+    const double pscale = p_per_rigidity * rigidities[i] / pmag0;
+    std::array<double, 6> vec{{vec0[0], vec0[1], vec0[2], pscale * vec0[3],
+                               pscale * vec0[4], pscale * vec0[5]}};
+
+    evaluate(t0, vec);
+    allowed[i] = particle_escaped_;
+
+    if (particle_escaped_ && index < 0) {
+      index = i;
+      if (stop_at_first) {
+        break;
+      }
+    }
+  }
+  return index;
+}  // find_cutoff
+
 /*
 Returns the lorentz factor, evaluated from the momentum
 
@@ -459,9 +841,10 @@ Returns
 - gamma (const double) :
       The lorentz factor for the particular momentum
 */
-inline double TrajectoryTracer::lorentz_factor(const double &pr,
-                                               const double &ptheta,
-                                               const double &pphi) {
+template <class Field>
+inline double TrajectoryTracer<Field>::lorentz_factor(const double &pr,
+                                                      const double &ptheta,
+                                                      const double &pphi) {
   // momentum magnitude
   double pmag = sqrt((pr * pr) + (ptheta * ptheta) + (pphi * pphi));
   // ||p|| / (m*c)
@@ -470,3 +853,8 @@ inline double TrajectoryTracer::lorentz_factor(const double &pr,
   double gamma = sqrt(1. + (pm_ratio * pm_ratio));
   return gamma;
 };  // lorentz_factor
+
+// the field models for which the tracer is compiled
+template class TrajectoryTracer<MagneticField>;
+template class TrajectoryTracer<IGRF>;
+template class TrajectoryTracer<GriddedField>;
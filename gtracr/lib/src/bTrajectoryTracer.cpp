@@ -0,0 +1,352 @@
+/*
+Trajectory Tracer class that traces the trajectory of the particle
+by performing the Boris algorithm for the magnetostatic Lorentz force.
+*/
+
+#include "bTrajectoryTracer.hpp"
+
+/* Default Constructor for bTrajectoryTracer class
+
+  Creates an instance of the bTrajectoryTracer, that is, the object that
+  keeps track of a single particle trajectory in Earth's magnetic field.
+
+  The default constructor initializes the object with the default values
+  provided for the members.
+
+  Parameters
+  ------------
+  None
+*/
+template <class Field>
+bTrajectoryTracer<Field>::bTrajectoryTracer()
+    : bfield_{FieldModel<Field>::create(
+          {"/home/keito/devel/gtracr/data", 2020.})},
+      charge_{constants::ELEMENTARY_CHARGE},
+      mass_{0.938 * constants::KG_PER_GEVC2},
+      start_altitude_{100. * (1e3)},
+      escape_radius_{10. * constants::RE},
+      stepsize_{1e-5},
+      max_iter_{10000},
+      particle_escaped_{false} {}
+
+/* Constructor for bTrajectoryTracer class
+
+Creates an instance of the bTrajectoryTracer, that is, the object that
+keeps track of a single particle trajectory in Earth's magnetic field.
+
+This constructor requires 2 parameters, and the rest may be optional.
+
+Required Parameters
+-------------------
+- charge (int) :
+      The charge of the particle in units of electrons.
+- mass (double) :
+      The mass of the particle in units of GeV.
+
+Optional Parameters
+-------------------
+- escape_radius (double) :
+      The radius in which the particle has "escaped" relative to
+      Earth's center in units of km (default 10*RE)
+- stepsize (double) :
+      The step size of the integration (default 1e-5)
+- max_iter (int) :
+      The maximum number of iterations performed in the integration process
+      (default 10000)
+- bfield_type (char) :
+      The type of Magnetic Field to evaluate the trajectory with, which must
+      match the field model of the tracer (default is the type of the field
+      model).
+- igrf_params (std::pair<std::string, double>) :
+      Parameters required for instantiating the IGRF model. The first entry
+      contains the path of the directory in which the .COF data file is
+      stored (default to the author's path to the directory). The second entry
+      contains the date in which the evaluation of the trajectory is requested
+      in decimal date (default 2020.).
+*/
+template <class Field>
+bTrajectoryTracer<Field>::bTrajectoryTracer(
+    double charge, double mass, double start_altitude,
+    double escape_radius /*= 10. * constants::RE*/,
+    double stepsize /*= 1e-5*/, int max_iter /*= 10000*/,
+    const char bfield_type /*= 'i'*/,
+    const std::pair<std::string, double> &igrf_params /*=
+{"/home/keito/devel/gtracr/data",
+2020.}*/)
+    : bfield_{FieldModel<Field>::create(igrf_params)},
+      charge_{charge},
+      mass_{mass},
+      start_altitude_{start_altitude},
+      escape_radius_{escape_radius},
+      stepsize_{stepsize},
+      max_iter_{max_iter},
+      particle_escaped_{false} {
+  // the field model is fixed by the template parameter
+  if (bfield_type != FieldModel<Field>::type()) {
+    throw std::invalid_argument(
+        "The field model does not match the type of the tracer!");
+  }
+}
+
+/* Performs one step of the Boris algorithm (drift - rotate - drift).
+
+Parameters
+-----------
+- vec (std::array<double, 6> &) :
+     the six-vector (x, y, z, px, py, pz), which is advanced in place
+- h (const double &) :
+     the step size
+- inv_rel_mass (const double &) :
+     the inverse of the relativistic mass of the particle
+
+Returns
+--------
+None
+*/
+template <class Field>
+inline void bTrajectoryTracer<Field>::push(std::array<double, 6> &vec,
+                                           const double &h,
+                                           const double &inv_rel_mass) {
+  // drift by half a step
+  const double half_drift = 0.5 * h * inv_rel_mass;
+  vec[0] += half_drift * vec[3];
+  vec[1] += half_drift * vec[4];
+  vec[2] += half_drift * vec[5];
+
+  // evaluate B-field at the midpoint
+  std::array<double, 3> bf_values = bfield_.ecef_values(vec[0], vec[1], vec[2]);
+
+  // rotate the momentum about B
+  // Note:
+  // - charge is inverted to allow backtracking
+  // - tvec = -q * B * h / (2 * gamma * m) is the half rotation vector
+  // - svec = 2 * tvec / (1 + |tvec|^2) gives an exact rotation
+  const double tscale = -1. * charge_ * half_drift;
+  const double tx = tscale * bf_values[0];
+  const double ty = tscale * bf_values[1];
+  const double tz = tscale * bf_values[2];
+  const double sscale = 2. / (1. + (tx * tx) + (ty * ty) + (tz * tz));
+  const double sx = sscale * tx;
+  const double sy = sscale * ty;
+  const double sz = sscale * tz;
+
+  const double px = vec[3], py = vec[4], pz = vec[5];
+  // p' = p + p x t
+  const double pxp = px + (py * tz - pz * ty);
+  const double pyp = py + (pz * tx - px * tz);
+  const double pzp = pz + (px * ty - py * tx);
+  // p+ = p + p' x s
+  vec[3] = px + (pyp * sz - pzp * sy);
+  vec[4] = py + (pzp * sx - pxp * sz);
+  vec[5] = pz + (pxp * sy - pyp * sx);
+
+  // drift by the other half step with the rotated momentum
+  vec[0] += half_drift * vec[3];
+  vec[1] += half_drift * vec[4];
+  vec[2] += half_drift * vec[5];
+}
+
+/* Evaluates the trajectory of the particle using the Boris algorithm.
+
+Parameters
+-----------
+- t0 (double) :
+    the initial time in seconds
+- vec0 (std::array<double, 6>) :
+      the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0) at time t0
+
+Returns
+--------
+None
+
+*/
+template <class Field>
+void bTrajectoryTracer<Field>::evaluate(const double &t0,
+                                        std::array<double, 6> &vec0) {
+  double h = stepsize_;  // step size in shorter notation
+
+  // set the initial conditions
+  double t = t0;
+  std::array<double, 6> vec = coordinates::spherical_to_cartesian(vec0);
+
+  // reset the escape flag in case the tracer is reused
+  particle_escaped_ = false;
+
+  // the lorentz factor is constant in a pure magnetic field
+  const double pmag = sqrt((vec[3] * vec[3]) + (vec[4] * vec[4]) +
+                           (vec[5] * vec[5]));
+  const double pm_ratio = pmag / (mass_ * constants::SPEED_OF_LIGHT);
+  const double inv_rel_mass = 1. / (mass_ * sqrt(1. + (pm_ratio * pm_ratio)));
+
+  // the squared radii for the breaking conditions
+  const double escape_radius2 = escape_radius_ * escape_radius_;
+  const double start_radius2 =
+      (start_altitude_ + constants::RE) * (start_altitude_ + constants::RE);
+
+  // start the loop
+  for (int i = 0; i < max_iter_; ++i) {
+    push(vec, h, inv_rel_mass);
+    t += h;  // increase time
+
+    const double r2 = (vec[0] * vec[0]) + (vec[1] * vec[1]) + (vec[2] * vec[2]);
+
+    if (r2 > escape_radius2) {
+      particle_escaped_ = true;
+      break;
+    }  // if (r > escape_radius_)
+
+    // breaking condition
+    // if particle reaches back onto Earth's surface again
+    if (r2 < start_radius2) {
+      break;
+    }  // if (r < start_altitude_ + constants::RE)
+
+  }  // for (int i = 0; i < max_iter_; ++i)
+  // store the final time and six-vector for checking purposes
+  // the last recorded time and six-vector is the final six-vector / time
+  final_time_ = t;
+  final_sixvector_ = coordinates::cartesian_to_spherical(vec);
+}  // evaluate
+
+/* Evaluates the trajectory of the particle using the Boris algorithm
+and return an array that contains the information of the particle
+trajectory. This will most often be used for debugging purposes to see the
+actual trajectory.
+
+Parameters
+-----------
+- t0 (double) :
+    the initial time in seconds
+- vec0 (std::array<double, 6>) :
+     the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0) at time t0
+
+Returns
+--------
+- trajectory_data (std::vector<double>) :
+    the trajectory information, that is, the time and the six-vector of the
+    trajectory in spherical coordinates, as a row-major (n_steps, 7) array
+    (see trajectory_data.hpp).
+    Notes:
+    - the columns are ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
+    - the storage is reserved in advance for up to max_iter steps, since
+      the length of each trajectory is not known beforehand.
+
+*/
+template <class Field>
+std::vector<double> bTrajectoryTracer<Field>::evaluate_and_get_trajectory(
+    double &t0, std::array<double, 6> &vec0) {
+  double h = stepsize_;  // step size in shorter notation
+
+  // set the initial conditions
+  double t = t0;
+  std::array<double, 6> vec = coordinates::spherical_to_cartesian(vec0);
+
+  // reset the escape flag in case the tracer is reused
+  particle_escaped_ = false;
+
+  // the lorentz factor is constant in a pure magnetic field
+  const double pmag = sqrt((vec[3] * vec[3]) + (vec[4] * vec[4]) +
+                           (vec[5] * vec[5]));
+  const double pm_ratio = pmag / (mass_ * constants::SPEED_OF_LIGHT);
+  const double inv_rel_mass = 1. / (mass_ * sqrt(1. + (pm_ratio * pm_ratio)));
+
+  // the data of each step, (t, r, theta, phi, pr, ptheta, pphi) per step
+  std::vector<double> trajectory;
+  trajectory_data::reserve(trajectory, max_iter_);
+
+  // start the loop
+  for (int i = 0; i < max_iter_; ++i) {
+    // append the values first
+    trajectory_data::append(trajectory, t,
+                            coordinates::cartesian_to_spherical(vec));
+
+    push(vec, h, inv_rel_mass);
+    t += h;  // increase time
+
+    const double r =
+        sqrt((vec[0] * vec[0]) + (vec[1] * vec[1]) + (vec[2] * vec[2]));
+
+    if (r > escape_radius_) {
+      particle_escaped_ = true;
+      break;
+    }  // if (r > escape_radius_)
+
+    // breaking condition
+    // if particle reaches back onto Earth's surface again
+    if (r < start_altitude_ + constants::RE) {
+      break;
+    }  // if (r < start_altitude_ + constants::RE)
+
+  }  // for (int i = 0; i < max_iter_; ++i)
+  // store the final time and six-vector for checking purposes
+  // the last recorded time and six-vector is the final six-vector / time
+  final_time_ = t;
+  final_sixvector_ = coordinates::cartesian_to_spherical(vec);
+
+  return trajectory;
+}  // evaluate_and_get_trajectory
+
+/* Finds the cutoff rigidity of the particle in the direction of the
+initial six-vector, i.e. the lowest rigidity in which the particle
+escapes, by evaluating the trajectory for each rigidity in ascending order
+with this tracer and its field model. For each rigidity, only the
+magnitude of the initial momentum is rescaled.
+
+Parameters
+-----------
+- t0 (double) :
+    the initial time in seconds
+- vec0 (std::array<double, 6>) :
+    the initial six-vector (r0, theta0, phi0, pr0, ptheta0, pphi0),
+    whose momentum sets the direction of the particle
+- n (int) :
+    the number of rigidities
+- rigidities (const double *) :
+    the rigidities in GV in ascending order (size n)
+- allowed (bool *) :
+    output array, set to true if the particle escapes with each rigidity
+    (size n)
+- stop_at_first (bool) :
+    whether to stop at the first rigidity in which the particle escapes
+
+Returns
+--------
+- index (int) :
+    the index of the first rigidity in which the particle escapes,
+    or -1 if the particle does not escape for any rigidity
+*/
+template <class Field>
+int bTrajectoryTracer<Field>::find_cutoff(
+    const double &t0, const std::array<double, 6> &vec0, const int n,
+    const double *rigidities, bool *allowed, const bool stop_at_first) {
+  // the magnitude of the initial momentum
+  const double pmag0 = sqrt((vec0[3] * vec0[3]) + (vec0[4] * vec0[4]) +
+                            (vec0[5] * vec0[5]));
+  // the momentum per unit rigidity, p = R |Z| in GeV / c with R in GV
+  const double p_per_rigidity =
+      std::abs(charge_ / constants::ELEMENTARY_CHARGE) *
+      constants::KG_M_S_PER_GEVC;
+
+  int index = -1;
+  for (int i = 0; i < n; ++i) {
+    const double pscale = p_per_rigidity * rigidities[i] / pmag0;
+    std::array<double, 6> vec{{vec0[0], vec0[1], vec0[2], pscale * vec0[3],
+                               pscale * vec0[4], pscale * vec0[5]}};
+
+    evaluate(t0, vec);
+    allowed[i] = particle_escaped_;
+
+    if (particle_escaped_ && index < 0) {
+      index = i;
+      if (stop_at_first) {
+        break;
+      }
+    }
+  }
+  return index;
+}  // find_cutoff
+
+// the field models for which the tracer is compiled
+template class bTrajectoryTracer<MagneticField>;
+template class bTrajectoryTracer<IGRF>;
+template class bTrajectoryTracer<GriddedField>;
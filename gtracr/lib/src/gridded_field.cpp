@@ -0,0 +1,115 @@
+#include "gridded_field.hpp"
+
+#include <cstring>
+#include <cstdio>
+#include <fstream>
+#include <random>
+#include <sstream>
+
+#ifdef _WIN32
+#include <process.h>
+#else
+#include <unistd.h>
+#endif
+
+namespace {
+// a temporary file name in the directory of fname that is unique to the
+// calling process (process id and a random suffix), such that processes
+// that write the same file at the same time do not share a temporary file
+std::string unique_tmp_name(const std::string &fname) {
+#ifdef _WIN32
+  const long pid = static_cast<long>(_getpid());
+#else
+  const long pid = static_cast<long>(getpid());
+#endif
+  std::ostringstream tmp_fname;
+  tmp_fname << fname << "." << pid << "." << std::hex << std::random_device{}()
+            << ".tmp";
+  return tmp_fname.str();
+}
+
+bool file_exists(const std::string &fname) {
+  return static_cast<bool>(std::ifstream(fname, std::ios::binary));
+}
+}  // namespace
+
+/*
+ Map the lattice stored in a file. The lattice values are used in place
+ from the mapped file, such that the lattice is only read from disk once
+ and shared between all tracers.
+
+ Parameters
+ -----------
+ - fname (const std::string &) :
+     the path to the lattice file
+ */
+GriddedField::GriddedField(const std::string &fname)
+    : mapping_{std::make_shared<const MappedFile>(fname)} {
+  const char *data = mapping_->data();
+  const std::size_t size = mapping_->size();
+
+  // read the header
+  if (size < header_size || std::memcmp(data, "GTRGRID", 8) != 0) {
+    throw std::runtime_error("Not a field lattice file!");
+  }
+  std::uint32_t header[4];
+  std::memcpy(header, data + 8, sizeof(header));
+  if (header[0] != 1) {
+    throw std::runtime_error(
+        "Unsupported version or byte order of the field lattice file!");
+  }
+  nr_ = static_cast<int>(header[1]);
+  ntheta_ = static_cast<int>(header[2]);
+  nphi_ = static_cast<int>(header[3]);
+  std::memcpy(&r_min_, data + 24, sizeof(double));
+  std::memcpy(&r_max_, data + 32, sizeof(double));
+
+  if (nr_ < 2 || ntheta_ < 2 || nphi_ < 1 || !(r_max_ > r_min_) ||
+      size < header_size + 8 * 3 * std::size_t(nr_) * ntheta_ * nphi_) {
+    throw std::runtime_error("Corrupted field lattice file!");
+  }
+  // the data block is aligned, so it is used in place
+  data_ = reinterpret_cast<const double *>(data + header_size);
+
+  du_ = log(r_max_ / r_min_) / (nr_ - 1);
+  dtheta_ = constants::pi / (ntheta_ - 1);
+  dphi_ = 2. * constants::pi / nphi_;
+  inv_du_ = 1. / du_;
+  inv_dtheta_ = 1. / dtheta_;
+  inv_dphi_ = 1. / dphi_;
+}
+
+// write the lattice to a file
+void GriddedField::write(const std::string &fname, const int nr,
+                         const int ntheta, const int nphi, const double r_min,
+                         const double r_max, const std::vector<double> &data) {
+  // write to a temporary file first, such that processes that map the
+  // lattice never see a partially written file
+  const std::string tmp_fname = unique_tmp_name(fname);
+  std::ofstream file(tmp_fname, std::ios::binary | std::ios::trunc);
+  if (!file) {
+    throw std::runtime_error("Cannot open file!");
+  }
+  const std::uint32_t header[4] = {1, static_cast<std::uint32_t>(nr),
+                                   static_cast<std::uint32_t>(ntheta),
+                                   static_cast<std::uint32_t>(nphi)};
+  file.write("GTRGRID", 8);
+  file.write(reinterpret_cast<const char *>(header), sizeof(header));
+  file.write(reinterpret_cast<const char *>(&r_min), sizeof(double));
+  file.write(reinterpret_cast<const char *>(&r_max), sizeof(double));
+  file.write(reinterpret_cast<const char *>(data.data()),
+             data.size() * sizeof(double));
+  file.close();
+  if (!file) {
+    std::remove(tmp_fname.c_str());
+    throw std::runtime_error("Cannot write file!");
+  }
+  if (std::rename(tmp_fname.c_str(), fname.c_str()) != 0) {
+    std::remove(tmp_fname.c_str());
+    // the same lattice may have been written by another process in the
+    // meantime (rename does not replace existing files on Windows)
+    if (!file_exists(fname)) {
+      throw std::runtime_error("Cannot write file!");
+    }
+  }
+}
@@ -1,11 +1,89 @@
 #include "igrf.hpp"
 
+#include <algorithm>
+#include <cmath>
+
+#include "igrf_store.hpp"
+
 using json = nlohmann::json;
 
+namespace {
+/*
+  The coefficients of the recurrence relations of the Schmidt quasi-normalized
+  associated Legendre functions p (and their derivatives q) used in shval3,
+  indexed by k as in shval3, i.e. (n, m) = (1, 0), (1, 1), (2, 0), ...
+
+  For m == n:
+    p[k] = pa[k] * clat * p[k - n - 1]
+    q[k] = qa[k] * (clat * q[k - n - 1] + qb[k] * slat * p[k - n - 1])
+  For m < n:
+    p[k] = pa[k] * slat * p[k - n] - pb[k] * p[k - 2n + 1]
+    q[k] = qa[k] * (slat * q[k - n] - qb[k] * clat * p[k - n])
+           - qc[k] * q[k - 2n + 1]
+
+  The coefficients only depend on n and m, and are the same for all models.
+*/
+struct SchmidtRecurrence {
+  std::array<double, igrf_const::MAXNPQ + 1> pa, pb, qa, qb, qc;
+  // m / (n + 1), the factor of the eastward component
+  std::array<double, igrf_const::MAXNPQ + 1> ym;
+
+  SchmidtRecurrence() {
+    pa.fill(0.);
+    pb.fill(0.);
+    qa.fill(0.);
+    qb.fill(0.);
+    qc.fill(0.);
+    ym.fill(0.);
+
+    int k = 0;
+    for (int n = 1; n <= igrf_const::MAXDEG; ++n) {
+      const double fn = n;
+      for (int m = 0; m <= n; ++m) {
+        ++k;
+        const double fm = m;
+        ym[k] = fm / (fn + 1.0);
+        // the first four functions are evaluated directly
+        if (k < 5) {
+          continue;
+        }
+        if (m == n) {
+          const double aa = sqrt(1.0 - 0.5 / fm);
+          pa[k] = (1.0 + 1.0 / fm) * aa;
+          qa[k] = aa;
+          qb[k] = 1.0 / fm;
+        } else {
+          const double aa = sqrt(fn * fn - fm * fm);
+          const double bb = sqrt(((fn - 1.0) * (fn - 1.0)) - (fm * fm)) / aa;
+          const double cc = (2.0 * fn - 1.0) / aa;
+          pa[k] = (fn + 1.0) * cc / fn;
+          pb[k] = (fn + 1.0) * bb / (fn - 1.0);
+          qa[k] = cc;
+          qb[k] = 1.0 / fn;
+          qc[k] = bb;
+        }
+      }
+    }
+  }
+};
+
+/*
+  The recurrence coefficients, computed once per process.
+*/
+const SchmidtRecurrence &schmidt_recurrence() {
+  static const SchmidtRecurrence recurrence;
+  return recurrence;
+}
+}  // namespace
+
 /*
  Initialize the IGRF model. The coefficients are imported and are stored
  in the corresponding arrays.
 
+ The coefficients for each date are obtained from the process-wide
+ IGRFCoefficientStore, such that the coefficient file is only parsed
+ once, and the interpolation is only performed once per date.
+
  Parameters
  -----------
  - fname (std::string) :
@@ -18,20 +96,28 @@ IGRF::IGRF(const std::string& fname, const double sdate)
     epoch1_{0.}, epoch2_{0.}, nmain1_{0}, nmain2_{0}, 
     nsv1_{0}, nsv2_{0} {
 
-  if (sdate_ > igrf_const::MAXEPOCH) {
-      epoch1_ = igrf_const::MAXEPOCH;
-      epoch2_ = igrf_const::MAXEPOCH + 5.;
+  IGRFCoefficientStore &store = IGRFCoefficientStore::instance();
+
+  // use the coefficients of the date from the store if available
+  std::shared_ptr<const IGRFCoefficients> coeffs = store.find(fname, sdate_);
+  if (coeffs) {
+    nmax_ = coeffs->nmax;
+    gh_arr = coeffs->gh;
+    ghsv_arr = coeffs->ghsv;
+    return;
   }
-  else {
+
   // get epochs in which we want to interpolate / extrapolate
-  for (double epoch=1900; epoch<=igrf_const::MAXEPOCH; epoch+=5) {
-    // set date to maximum epoch if given date is extrapolated
-        if ((sdate_ - epoch) < 2.5) {  // not abs value to get the epoch before the date
-        epoch1_ = epoch;
-        epoch2_ = epoch + 5.;
-        break;
-      }
-    }
+  if (sdate_ >= igrf_const::MAXEPOCH) {
+    // extrapolate from the latest epoch
+    epoch1_ = igrf_const::MAXEPOCH;
+    epoch2_ = igrf_const::MAXEPOCH + 5.;
+  } else {
+    // the epoch before the date (or the first epoch for earlier dates)
+    epoch1_ = std::max(igrf_const::MINEPOCH,
+                       igrf_const::MINEPOCH +
+                           5. * floor((sdate_ - igrf_const::MINEPOCH) / 5.));
+    epoch2_ = epoch1_ + 5.;
   }
 
   // get the spherical harmonic coefficients
@@ -39,7 +125,7 @@ IGRF::IGRF(const std::string& fname, const double sdate)
 
   // get the spherical harmonic coeffiecients for the specific date
   // and either interpolate or extrapolate if we have to
-  if (epoch2_ + 5 > igrf_const::MAXEPOCH)  // if model isnt the last model in the file
+  if (epoch1_ >= igrf_const::MAXEPOCH)  // if model is the last model in the file
   {
     extrapsh(sdate_, 3);
     extrapsh(sdate_ + 1, 4);
@@ -47,6 +133,9 @@ IGRF::IGRF(const std::string& fname, const double sdate)
     interpsh(sdate_, 3);
     interpsh(sdate_ + 1, 4);
   }
+
+  // share the coefficients of this date with all other instances
+  store.insert(fname, sdate_, IGRFCoefficients{nmax_, gh_arr, ghsv_arr});
 }
 
 /****************************************************************************/
@@ -80,45 +169,43 @@ IGRF::IGRF(const std::string& fname, const double sdate)
 /*                                                                          */
 /****************************************************************************/
 void IGRF::getshc(const std::string& fname) {
-  std::ifstream ifs{fname};
-  if (!ifs) {
-    throw std::runtime_error("Cannot open file!");
-  }
-
-  json igrf_map;
-
-  ifs >> igrf_map;  // read contents of json file to json object
+  // the coefficient table of the file, read only once per process
+  std::shared_ptr<const IGRFTable> table =
+      IGRFCoefficientStore::instance().file(fname);
 
-  // convert epoch to strings since thats the form for json keys
-  std::string epoch1 = std::to_string(epoch1_);
-  std::string epoch2 = std::to_string(epoch2_);
-
-  // std::cout << epoch1 << ' ' << epoch2 << std::endl;
+  const int index1 = table->index(epoch1_);
+  if (index1 < 0) {
+    throw std::out_of_range("Epoch not contained in the coefficient file!");
+  }
 
-  // std::cout << igrf_map << std::endl;
-  
   // set variables (nmain, nsv, gh, gh_sv)
-  nmain1_ = igrf_map[epoch1]["nmain"];
-  nsv1_ = igrf_map[epoch1]["nsv"];
+  nmain1_ = table->nmain(index1);
+  nsv1_ = table->nsv(index1);
 
   // write the coefficient array for the specified epochs
   // into the member array
-  for (int i=0; i<nmain1_; ++i) {
-    gh1_arr[i] = igrf_map[epoch1]["gh"][i];
-    ghsv1_arr[i] = igrf_map[epoch1]["gh_sv"][i];
+  // Note: the coefficients are indexed from 1 (as in geomag70.c), and
+  //       the rows of the table are zero-padded up to maxcoeff
+  gh1_arr.fill(0.);
+  ghsv1_arr.fill(0.);
+  gh2_arr.fill(0.);
+  ghsv2_arr.fill(0.);
+  for (int i=0; i<table->maxcoeff(); ++i) {
+    gh1_arr[i + 1] = table->gh(index1)[i];
+    ghsv1_arr[i + 1] = table->gh_sv(index1)[i];
   }
-  
-  // std::cout << igrf_map[epoch1]["gh"] << std::endl;
-
-  // std::cout << "Read the 1st coefficients" << std::endl;
-
-  // only set epoch2 if epoch2 is smaller than the latest epoch 
-  if (epoch2_ < igrf_const::MAXEPOCH) {
-    nmain2_ = igrf_map[epoch2]["nmain"];
-    nsv2_ = igrf_map[epoch2]["nsv"];
-    for (int i=0; i<nmain2_; ++i) {
-      gh2_arr[i] = igrf_map[epoch2]["gh"][i];
-      ghsv2_arr[i] = igrf_map[epoch2]["gh_sv"][i];
+
+  // only set epoch2 if epoch2 is not after the latest epoch
+  if (epoch2_ <= igrf_const::MAXEPOCH) {
+    const int index2 = table->index(epoch2_);
+    if (index2 < 0) {
+      throw std::out_of_range("Epoch not contained in the coefficient file!");
+    }
+    nmain2_ = table->nmain(index2);
+    nsv2_ = table->nsv(index2);
+    for (int i=0; i<table->maxcoeff(); ++i) {
+      gh2_arr[i + 1] = table->gh(index2)[i];
+      ghsv2_arr[i + 1] = table->gh_sv(index2)[i];
     }
   }
 
@@ -393,7 +480,7 @@ void IGRF::extrapsh(double date, int gh) {
 void IGRF::shval3(int igdgc, double flat, double flon, double elev, int gh,
                   int iext, int ext1, int ext2, int ext3) {
   double earths_radius = 6371.2;
-  double dtr = 0.01745329;
+  double dtr = constants::DEG_TO_RAD;
   double slat;
   double clat;
   double ratio;
@@ -609,6 +696,112 @@ void IGRF::shval3(int igdgc, double flat, double flon, double elev, int gh,
 
 std::array<double, 3> IGRF::values(const double& r, const double& theta,
                                    const double& phi) {
+  const SchmidtRecurrence& rec = schmidt_recurrence();
+  const double dtr = constants::DEG_TO_RAD;
+
+  // geocentric latitude and longitude in degrees, as in shval3
+  const double flat = 90. - (theta * constants::RAD_TO_DEG);
+  const double flon = phi * constants::RAD_TO_DEG;
+
+  const double slat = sin(flat * dtr);
+  double aa = flat;
+  if ((90.0 - flat) < 0.001) {
+    aa = 89.999; /*  300 ft. from North pole  */
+  } else if ((90.0 + flat) < 0.001) {
+    aa = -89.999; /*  300 ft. from South pole  */
+  }
+  const double clat = cos(aa * dtr);
+
+  // sin(m * lon) and cos(m * lon)
+  double sl[igrf_const::MAXDEG + 1];
+  double cl[igrf_const::MAXDEG + 1];
+  sl[1] = sin(flon * dtr);
+  cl[1] = cos(flon * dtr);
+
+  double p[igrf_const::MAXNPQ + 1];
+  double q[igrf_const::MAXNPQ + 1];
+  const double sqrt3 = sqrt(3.0);
+  p[1] = 2.0 * slat;
+  p[2] = 2.0 * clat;
+  p[3] = 4.5 * slat * slat - 1.5;
+  p[4] = 3.0 * sqrt3 * clat * slat;
+  q[1] = -clat;
+  q[2] = slat;
+  q[3] = -3.0 * clat * slat;
+  q[4] = sqrt3 * (slat * slat - clat * clat);
+
+  // the eastward component is evaluated from the derivative
+  // if clat is not positive, as in shval3
+  const bool use_p = clat > 0;
+  const double inv_clat = use_p ? 1.0 / clat : 0.;
+
+  const double ratio = 6371.2 / (r * (1e-3));
+  // ratio^(n + 2), multiplied by ratio for each degree
+  double rr = ratio * ratio;
+
+  double bx = 0.;  // northward
+  double by = 0.;  // eastward
+  double bz = 0.;  // vertically down
+
+  int k = 0;
+  int l = 1;
+  for (int n = 1; n <= nmax_; ++n) {
+    rr *= ratio;
+
+    for (int m = 0; m <= n; ++m) {
+      ++k;
+      if (k >= 5) {
+        if (m == n) {
+          const int j = k - n - 1;
+          p[k] = rec.pa[k] * clat * p[j];
+          q[k] = rec.qa[k] * (clat * q[j] + rec.qb[k] * slat * p[j]);
+          sl[m] = sl[m - 1] * cl[1] + cl[m - 1] * sl[1];
+          cl[m] = cl[m - 1] * cl[1] - sl[m - 1] * sl[1];
+        } else {
+          const int ii = k - n;
+          const int j = k - 2 * n + 1;
+          p[k] = rec.pa[k] * slat * p[ii] - rec.pb[k] * p[j];
+          q[k] = rec.qa[k] * (slat * q[ii] - rec.qb[k] * clat * p[ii]) -
+                 rec.qc[k] * q[j];
+        }
+      }
+
+      const double ga = rr * gh_arr[l];
+      if (m == 0) {
+        bx += ga * q[k];
+        bz -= ga * p[k];
+        l += 1;
+      } else {
+        const double hb = rr * gh_arr[l + 1];
+        const double cc = ga * cl[m] + hb * sl[m];
+        const double dd = ga * sl[m] - hb * cl[m];
+        bx += cc * q[k];
+        bz -= cc * p[k];
+        by += use_p ? dd * rec.ym[k] * p[k] * inv_clat : dd * q[k] * slat;
+        l += 2;
+      }
+    }
+  }
+
+  // the components are geocentric, so they do not need to be rotated
+  bfield_.x = bx;
+  bfield_.y = by;
+  bfield_.z = bz;
+
+  // transform the northward, eastward and downward components (in nT)
+  // to the spherical components (in T)
+  std::array<double, 3> values;
+
+  values[0] = -1. * bz * (1e-9);  // radially outwards
+  values[1] = -1. * bx * (1e-9);  // southwards
+  values[2] = by * (1e-9);        // eastwards
+
+  return values;
+}
+
+std::array<double, 3> IGRF::shval3_values(const double& r,
+                                          const double& theta,
+                                          const double& phi) {
   // convert to lat, long, since shval3 is in this format as well
   // latitude is the north latitude in degrees (+ is north)
   // longitude is east latitude in degrees (+ is east)
@@ -625,19 +818,40 @@ std::array<double, 3> IGRF::values(const double& r, const double& theta,
   // igdgc = 2 for geocentric, which is what we want
   shval3(2, lat, lng, elev, gh);
 
-  // transform bfield results to spherical coordinates
+  // transform the northward, eastward and downward components (in nT)
+  // to the spherical components (in T)
   std::array<double, 3> values;
 
-  values[0] = sqrt((bfield_.x * bfield_.x) + (bfield_.y * bfield_.y) +
-                   (bfield_.z * bfield_.z));
-  values[1] = acos(bfield_.z / values[0]);
-  values[2] = atan2(bfield_.y, bfield_.x);
+  values[0] = -1. * bfield_.z * (1e-9);  // radially outwards
+  values[1] = -1. * bfield_.x * (1e-9);  // southwards
+  values[2] = bfield_.y * (1e-9);        // eastwards
 
-  // std::cout << "Finished evaluating bfield values." << std::endl;
+  return values;
+}
 
-  // for (auto val : values) {
-  //   std::cout << val << std::endl;
-  // }
+std::array<double, 3> IGRF::ecef_values(const double& x, const double& y,
+                                        const double& z) {
+  double rho = sqrt((x * x) + (y * y));
+  double r = sqrt((rho * rho) + (z * z));
+  double theta = acos(z / r);
+  double phi = atan2(y, x);
+
+  // sin / cos of the angles, obtained from the Cartesian components
+  double sin_theta = rho / r;
+  double cos_theta = z / r;
+  double cos_phi = (rho > 0.) ? x / rho : 1.;
+  double sin_phi = (rho > 0.) ? y / rho : 0.;
+
+  std::array<double, 3> sph_values = values(r, theta, phi);
+  const double &br = sph_values[0];
+  const double &btheta = sph_values[1];
+  const double &bphi = sph_values[2];
+
+  // B = Br * rhat + Btheta * thetahat + Bphi * phihat
+  std::array<double, 3> values;
+  values[0] = (br * sin_theta + btheta * cos_theta) * cos_phi - bphi * sin_phi;
+  values[1] = (br * sin_theta + btheta * cos_theta) * sin_phi + bphi * cos_phi;
+  values[2] = br * cos_theta - btheta * sin_theta;
 
   return values;
 }
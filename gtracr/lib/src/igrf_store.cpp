@@ -0,0 +1,249 @@
+#include "igrf_store.hpp"
+
+#include <cmath>
+#include <cstring>
+#include <fstream>
+#include <stdexcept>
+
+/*
+ The store shared by the whole process. The instance is created on first
+ use, which is thread-safe since C++11.
+ */
+IGRFCoefficientStore &IGRFCoefficientStore::instance() {
+  static IGRFCoefficientStore store;
+  return store;
+}
+
+/*
+ Read the coefficient table from a file, either in JSON (.json) or in
+ binary (.bin) format.
+
+ Parameters
+ -----------
+ - fname (const std::string &) :
+     the path to the coefficient file
+ */
+std::shared_ptr<const IGRFTable> IGRFTable::load(const std::string &fname) {
+  std::shared_ptr<IGRFTable> table = std::make_shared<IGRFTable>();
+
+  const std::string ext = ".bin";
+  if (fname.size() >= ext.size() &&
+      fname.compare(fname.size() - ext.size(), ext.size(), ext) == 0) {
+    table->read_binary(fname);
+  } else {
+    table->read_json(fname);
+  }
+  return table;
+}
+
+// read the table from a JSON file
+void IGRFTable::read_json(const std::string &fname) {
+  std::ifstream ifs{fname};
+  if (!ifs) {
+    throw std::runtime_error("Cannot open file!");
+  }
+
+  nlohmann::json igrf_map;
+  ifs >> igrf_map;  // read contents of json file to json object
+
+  nepochs_ = static_cast<int>(igrf_map.size());
+  maxcoeff_ = igrf_const::MAXCOEFF - 1;
+
+  epochs_vec_.reserve(nepochs_);
+  nmain_vec_.reserve(nepochs_);
+  nsv_vec_.reserve(nepochs_);
+  gh_vec_.assign(nepochs_ * maxcoeff_, 0.);
+  ghsv_vec_.assign(nepochs_ * maxcoeff_, 0.);
+
+  // the keys are the epochs, which are sorted in the json object
+  int i = 0;
+  for (auto it = igrf_map.cbegin(); it != igrf_map.cend(); ++it, ++i) {
+    const nlohmann::json &model = it.value();
+    epochs_vec_.push_back(std::stod(it.key()));
+    nmain_vec_.push_back(model.at("nmain"));
+    nsv_vec_.push_back(model.at("nsv"));
+
+    const nlohmann::json &gh = model.at("gh");
+    const nlohmann::json &gh_sv = model.at("gh_sv");
+    for (std::size_t j = 0; j < gh.size() && j < std::size_t(maxcoeff_); ++j) {
+      gh_vec_[i * maxcoeff_ + j] = gh[j];
+    }
+    for (std::size_t j = 0; j < gh_sv.size() && j < std::size_t(maxcoeff_);
+         ++j) {
+      ghsv_vec_[i * maxcoeff_ + j] = gh_sv[j];
+    }
+  }
+
+  epochs_ = epochs_vec_.data();
+  nmain_ = nmain_vec_.data();
+  nsv_ = nsv_vec_.data();
+  gh_ = gh_vec_.data();
+  ghsv_ = ghsv_vec_.data();
+}
+
+// read the table from a memory-mapped binary file
+void IGRFTable::read_binary(const std::string &fname) {
+  mapping_ = std::make_shared<const MappedFile>(fname);
+  const char *data = mapping_->data();
+  const std::size_t size = mapping_->size();
+
+  // read the header
+  const std::size_t header_size = 24;
+  if (size < header_size || std::memcmp(data, "GTRIGRF", 8) != 0) {
+    throw std::runtime_error("Not a binary IGRF coefficient file!");
+  }
+  std::uint32_t header[4];
+  std::memcpy(header, data + 8, sizeof(header));
+  if (header[0] != 1) {
+    throw std::runtime_error(
+        "Unsupported version or byte order of the IGRF coefficient file!");
+  }
+  nepochs_ = static_cast<int>(header[1]);
+  maxcoeff_ = static_cast<int>(header[2]);
+
+  // offsets of each block
+  const std::size_t epochs_offset = header_size;
+  const std::size_t nmain_offset = epochs_offset + 8 * nepochs_;
+  const std::size_t nsv_offset = nmain_offset + 4 * nepochs_;
+  const std::size_t gh_offset = nsv_offset + 4 * nepochs_;
+  const std::size_t ghsv_offset = gh_offset + 8 * nepochs_ * maxcoeff_;
+  if (size < ghsv_offset + 8 * nepochs_ * maxcoeff_ ||
+      maxcoeff_ > igrf_const::MAXCOEFF - 1) {
+    throw std::runtime_error("Corrupted binary IGRF coefficient file!");
+  }
+
+  // the blocks are aligned, so they are used in place
+  epochs_ = reinterpret_cast<const double *>(data + epochs_offset);
+  nmain_ = reinterpret_cast<const std::int32_t *>(data + nmain_offset);
+  nsv_ = reinterpret_cast<const std::int32_t *>(data + nsv_offset);
+  gh_ = reinterpret_cast<const double *>(data + gh_offset);
+  ghsv_ = reinterpret_cast<const double *>(data + ghsv_offset);
+}
+
+// the index of the epoch, or -1 if the epoch is not in the table
+int IGRFTable::index(const double epoch) const {
+  for (int i = 0; i < nepochs_; ++i) {
+    if (std::abs(epochs_[i] - epoch) < 1e-6) {
+      return i;
+    }
+  }
+  return -1;
+}
+
+/*
+ Get the coefficient table of a coefficient file, reading the file only if
+ it has not been read before. The lock is held while reading, so that each
+ file is read exactly once even if many IGRF instances are created
+ concurrently.
+
+ Parameters
+ -----------
+ - fname (const std::string &) :
+     the path to the coefficient file (JSON or binary format)
+ */
+std::shared_ptr<const IGRFTable> IGRFCoefficientStore::file(
+    const std::string &fname) {
+  std::lock_guard<std::mutex> lock(mutex_);
+
+  auto it = files_.find(fname);
+  if (it != files_.end()) {
+    return it->second;
+  }
+
+  std::shared_ptr<const IGRFTable> table = IGRFTable::load(fname);
+  files_[fname] = table;
+  return table;
+}
+
+/*
+ Look up the coefficients of a given file and date, and mark them as the
+ most recently used.
+
+ Parameters
+ -----------
+ - fname (const std::string &) :
+     the path to the coefficient file
+ - sdate (double) :
+     the date of the coefficients in decimal years
+ */
+std::shared_ptr<const IGRFCoefficientStore::coeffs_t>
+IGRFCoefficientStore::find(const std::string &fname, double sdate) {
+  std::lock_guard<std::mutex> lock(mutex_);
+
+  auto it = entries_.find(key_t{fname, sdate});
+  if (it == entries_.end()) {
+    return nullptr;
+  }
+  // move to the front of the usage list
+  usage_.splice(usage_.begin(), usage_, it->second.second);
+  return it->second.first;
+}
+
+/*
+ Insert the coefficients of a given file and date into the store.
+
+ Parameters
+ -----------
+ - fname (const std::string &) :
+     the path to the coefficient file
+ - sdate (double) :
+     the date of the coefficients in decimal years
+ - coeffs (const coeffs_t &) :
+     the coefficients
+ */
+void IGRFCoefficientStore::insert(const std::string &fname, double sdate,
+                                  const coeffs_t &coeffs) {
+  std::lock_guard<std::mutex> lock(mutex_);
+
+  const key_t key{fname, sdate};
+  std::shared_ptr<const coeffs_t> entry = std::make_shared<coeffs_t>(coeffs);
+
+  auto it = entries_.find(key);
+  if (it != entries_.end()) {
+    // another instance has inserted the same date in the mean time
+    it->second.first = entry;
+    usage_.splice(usage_.begin(), usage_, it->second.second);
+    return;
+  }
+
+  usage_.push_front(key);
+  entries_[key] = std::make_pair(entry, usage_.begin());
+  evict();
+}
+
+// evict the least recently used entries until size <= capacity
+void IGRFCoefficientStore::evict() {
+  while (entries_.size() > capacity_) {
+    entries_.erase(usage_.back());
+    usage_.pop_back();
+  }
+}
+
+// remove all parsed files and coefficients from the store
+void IGRFCoefficientStore::clear() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  files_.clear();
+  entries_.clear();
+  usage_.clear();
+}
+
+std::size_t IGRFCoefficientStore::size() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return entries_.size();
+}
+
+std::size_t IGRFCoefficientStore::nfiles() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return files_.size();
+}
+
+std::size_t IGRFCoefficientStore::capacity() {
+  std::lock_guard<std::mutex> lock(mutex_);
+  return capacity_;
+}
+
+void IGRFCoefficientStore::set_capacity(const std::size_t capacity) {
+  std::lock_guard<std::mutex> lock(mutex_);
+  capacity_ = capacity;
+  evict();
+}
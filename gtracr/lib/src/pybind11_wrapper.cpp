@@ -1,41 +1,284 @@
 
 #include "MagneticField.hpp"
 #include "TrajectoryTracer.hpp"  // TrajectoryTracer header file
+#include "bTrajectoryTracer.hpp"  // bTrajectoryTracer header file
+#include "gridded_field.hpp"      // interpolated field lattice
 #include "igrf.hpp"              // IGRF model
+#include "igrf_store.hpp"        // IGRF coefficient store
+#include "pybind11/numpy.h"       // for NumPy array conversions
 #include "pybind11/pybind11.h"
 #include "pybind11/stl.h"         // for STL container type conversions
 #include "uTrajectoryTracer.hpp"  // uTrajectoryTracer header file
 
 namespace py = pybind11;
 
+// C-contiguous array of doubles, converted from any array-like object
+using carray_t = py::array_t<double, py::array::c_style | py::array::forcecast>;
+
+/*
+Hand the trajectory data of evaluate_and_get_trajectory over to NumPy
+without copying. The data is moved into a (n_steps, 7) array owned by a
+capsule, and returned as a dictionary of views into its columns, with keys
+["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]. The base of each view
+is the full (n_steps, 7) array.
+*/
+py::dict trajectory_to_dict(std::vector<double> &&trajectory) {
+  auto *data = new std::vector<double>(std::move(trajectory));
+  py::capsule owner(data, [](void *ptr) {
+    delete static_cast<std::vector<double> *>(ptr);
+  });
+
+  const py::ssize_t ncols = trajectory_data::ncols;
+  const py::ssize_t nsteps = data->size() / ncols;
+  const py::ssize_t row_stride = ncols * sizeof(double);
+  py::array_t<double> table({nsteps, ncols},
+                            {row_stride, py::ssize_t(sizeof(double))},
+                            data->data(), owner);
+
+  py::dict trajectory_dict;
+  for (py::ssize_t j = 0; j < ncols; ++j) {
+    trajectory_dict[trajectory_data::keys()[j]] = py::array_t<double>(
+        {nsteps}, {row_stride}, table.data() + j, table);
+  }
+  return trajectory_dict;
+}
+
+/*
+Bind evaluate_and_get_trajectory of a tracer, releasing the GIL while the
+trajectory is evaluated.
+*/
+template <class Tracer>
+py::dict evaluate_and_get_trajectory(Tracer &self, double t0,
+                                     std::array<double, 6> vec0) {
+  std::vector<double> trajectory;
+  {
+    py::gil_scoped_release release;
+    trajectory = self.evaluate_and_get_trajectory(t0, vec0);
+  }
+  return trajectory_to_dict(std::move(trajectory));
+}
+
+/*
+Bind find_cutoff of a tracer, releasing the GIL while the trajectories
+are evaluated.
+
+Returns a tuple (index, allowed) of the index of the first rigidity in
+which the particle escapes (-1 if it does not escape for any rigidity), and
+whether the particle escapes with each evaluated rigidity. If stop_at_first
+is true, only the rigidities up to the first allowed one are evaluated, and
+allowed is shortened accordingly.
+*/
+template <class Tracer>
+py::tuple find_cutoff(Tracer &self, std::array<double, 6> vec0,
+                      carray_t rigidities, double t0, bool stop_at_first) {
+  const py::ssize_t n = rigidities.size();
+  py::array_t<bool> allowed(n);
+
+  // obtain the pointers while we still hold the GIL
+  const double *rigidities_ptr = rigidities.data();
+  bool *allowed_ptr = allowed.mutable_data();
+
+  int index;
+  {
+    py::gil_scoped_release release;
+    index = self.find_cutoff(t0, vec0, static_cast<int>(n), rigidities_ptr,
+                             allowed_ptr, stop_at_first);
+  }
+
+  // the number of evaluated rigidities
+  const py::ssize_t nevaluated = (stop_at_first && index >= 0) ? index + 1 : n;
+  return py::make_tuple(index, allowed[py::slice(0, nevaluated, 1)]);
+}
+
+/*
+Bind the TrajectoryTracer compiled for the field model Field as the
+class `name`.
+*/
+template <class Field>
+void bind_trajectory_tracer(py::module &M, const char *name) {
+  using Tracer = TrajectoryTracer<Field>;
+  py::class_<Tracer>(M, name, py::module_local())
+      .def(py::init<double, double, double, double, double, int, const char,
+                    const std::pair<std::string, double> &,
+                    const std::string &, double, double,
+                    const std::string &>())
+      .def_property_readonly("charge", &Tracer::charge)
+      .def_property_readonly("mass", &Tracer::mass)
+      .def_property_readonly("start_altitude", &Tracer::start_altitude)
+      .def_property_readonly("escape_radius", &Tracer::escape_radius)
+      .def_property_readonly("step_size", &Tracer::stepsize)
+      .def_property_readonly("max_iter", &Tracer::max_iter)
+      .def_property_readonly("particle_escaped", &Tracer::particle_escaped)
+      .def_property_readonly("final_time", &Tracer::final_time)
+      .def_property_readonly("final_sixvector", &Tracer::final_sixvector)
+      .def_property_readonly("integrator", &Tracer::integrator)
+      .def_property_readonly("kernel", &Tracer::kernel)
+      .def_property_readonly("bfield_type", &Tracer::bfield_type)
+      .def("evaluate", &Tracer::evaluate)
+      .def("evaluate_and_get_trajectory", &evaluate_and_get_trajectory<Tracer>)
+      .def("find_cutoff", &find_cutoff<Tracer>, py::arg("vec0"),
+           py::arg("rigidities"), py::arg("t0") = 0.,
+           py::arg("stop_at_first") = true)
+      .def(
+          "evaluate_batch",
+          [](Tracer &self, carray_t vec0s, carray_t charges, carray_t masses,
+             double t0, int num_threads) {
+            /*
+            Evaluate a batch of N trajectories in a single call on
+            num_threads threads (<= 0 uses GTRACR_NUM_THREADS, or all
+            available cores). The GIL is released while the trajectories
+            are evaluated.
+
+            Returns a tuple (escaped, final_times, final_sixvectors) of
+            arrays with shapes (N,), (N,), (N, 6).
+            */
+            if (vec0s.ndim() != 2 || vec0s.shape(1) != 6) {
+              throw std::invalid_argument("vec0s must have shape (N, 6)!");
+            }
+            const py::ssize_t n = vec0s.shape(0);
+            if (charges.size() != n || masses.size() != n) {
+              throw std::invalid_argument(
+                  "charges and masses must have the same length as vec0s!");
+            }
+
+            py::array_t<bool> escaped(n);
+            py::array_t<double> final_times(n);
+            py::array_t<double> final_sixvectors({n, py::ssize_t(6)});
+
+            // obtain the pointers while we still hold the GIL
+            const double *vec0s_ptr = vec0s.data();
+            const double *charges_ptr = charges.data();
+            const double *masses_ptr = masses.data();
+            bool *escaped_ptr = escaped.mutable_data();
+            double *final_times_ptr = final_times.mutable_data();
+            double *final_sixvectors_ptr = final_sixvectors.mutable_data();
+
+            {
+              py::gil_scoped_release release;
+              self.evaluate_batch(t0, static_cast<int>(n), vec0s_ptr,
+                                  charges_ptr, masses_ptr, escaped_ptr,
+                                  final_times_ptr, final_sixvectors_ptr,
+                                  num_threads);
+            }
+
+            return py::make_tuple(escaped, final_times, final_sixvectors);
+          },
+          py::arg("vec0s"), py::arg("charges"), py::arg("masses"),
+          py::arg("t0") = 0., py::arg("num_threads") = 0);
+}
+
+/*
+Bind the bTrajectoryTracer compiled for the field model Field as the
+class `name`.
+*/
+template <class Field>
+void bind_btrajectory_tracer(py::module &M, const char *name) {
+  using Tracer = bTrajectoryTracer<Field>;
+  py::class_<Tracer>(M, name, py::module_local())
+      .def(py::init<double, double, double, double, double, int, const char,
+                    const std::pair<std::string, double> &>())
+      .def_property_readonly("charge", &Tracer::charge)
+      .def_property_readonly("mass", &Tracer::mass)
+      .def_property_readonly("start_altitude", &Tracer::start_altitude)
+      .def_property_readonly("escape_radius", &Tracer::escape_radius)
+      .def_property_readonly("step_size", &Tracer::stepsize)
+      .def_property_readonly("max_iter", &Tracer::max_iter)
+      .def_property_readonly("particle_escaped", &Tracer::particle_escaped)
+      .def_property_readonly("final_time", &Tracer::final_time)
+      .def_property_readonly("final_sixvector", &Tracer::final_sixvector)
+      .def_property_readonly("bfield_type", &Tracer::bfield_type)
+      .def("evaluate", &Tracer::evaluate)
+      .def("evaluate_and_get_trajectory",
+           &evaluate_and_get_trajectory<Tracer>)
+      .def("find_cutoff", &find_cutoff<Tracer>, py::arg("vec0"),
+           py::arg("rigidities"), py::arg("t0") = 0.,
+           py::arg("stop_at_first") = true);
+}
+
 PYBIND11_MODULE(_libgtracr, M) {
   /*
   Extension module for gtracr to C++.
   */
   // M.def("Extension module for gtracr to C++.");
-  py::class_<TrajectoryTracer>(M, "TrajectoryTracer",
-                               py::module_local())  // TrajectoryTracer class
-      .def(py::init<>())
-      .def(py::init<double, double, double, double, double,
-                     int, const char,
-                    const std::pair<std::string, double> &>())
-      .def_property_readonly("charge", &TrajectoryTracer::charge)
-      .def_property_readonly("mass", &TrajectoryTracer::mass)
-      .def_property_readonly("start_altitude", &TrajectoryTracer::start_altitude)
-      .def_property_readonly("escape_radius", &TrajectoryTracer::escape_radius)
-      .def_property_readonly("step_size", &TrajectoryTracer::stepsize)
-      .def_property_readonly("max_iter", &TrajectoryTracer::max_iter)
-      .def_property_readonly("particle_escaped",
-                             &TrajectoryTracer::particle_escaped)
-     .def_property_readonly("final_time",
-                             &TrajectoryTracer::final_time)
-     .def_property_readonly("final_sixvector",
-                             &TrajectoryTracer::final_sixvector)
-      .def("evaluate", &TrajectoryTracer::evaluate)
-      .def("evaluate_and_get_trajectory",
-           &TrajectoryTracer::evaluate_and_get_trajectory),
 
-      py::class_<uTrajectoryTracer>(
+  // the tracers for each field model
+  bind_trajectory_tracer<MagneticField>(M, "TrajectoryTracerDipole");
+  bind_trajectory_tracer<IGRF>(M, "TrajectoryTracerIGRF");
+  bind_btrajectory_tracer<MagneticField>(M, "bTrajectoryTracerDipole");
+  bind_btrajectory_tracer<IGRF>(M, "bTrajectoryTracerIGRF");
+  bind_trajectory_tracer<GriddedField>(M, "TrajectoryTracerGridded");
+  bind_btrajectory_tracer<GriddedField>(M, "bTrajectoryTracerGridded");
+
+  // construct the tracer for the field model given by bfield_type
+  M.def(
+      "TrajectoryTracer",
+      [](double charge, double mass, double start_altitude,
+         double escape_radius, double stepsize, int max_iter,
+         const char bfield_type,
+         const std::pair<std::string, double> &igrf_params,
+         const std::string &integrator, double rtol, double atol,
+         const std::string &kernel) -> py::object {
+        switch (bfield_type) {
+          case 'd':
+            return py::cast(TrajectoryTracer<MagneticField>(
+                charge, mass, start_altitude, escape_radius, stepsize,
+                max_iter, bfield_type, igrf_params, integrator, rtol, atol,
+                kernel));
+          case 'i':
+            return py::cast(TrajectoryTracer<IGRF>(
+                charge, mass, start_altitude, escape_radius, stepsize,
+                max_iter, bfield_type, igrf_params, integrator, rtol, atol,
+                kernel));
+          case 'g':
+            return py::cast(TrajectoryTracer<GriddedField>(
+                charge, mass, start_altitude, escape_radius, stepsize,
+                max_iter, bfield_type, igrf_params, integrator, rtol, atol,
+                kernel));
+          default:
+            throw std::invalid_argument(
+                "Only field types 'd', 'i' and 'g' are allowed!");
+        }
+      },
+      py::arg("charge"), py::arg("mass"), py::arg("start_altitude"),
+      py::arg("escape_radius"), py::arg("stepsize"), py::arg("max_iter"),
+      py::arg("bfield_type"), py::arg("igrf_params"),
+      py::arg("integrator") = "rk4",
+      py::arg("rtol") = 1e-6, py::arg("atol") = 1e-9,
+      py::arg("kernel") = "spherical");
+  M.def("TrajectoryTracer",
+        []() { return TrajectoryTracer<MagneticField>(); });
+
+  M.def(
+      "bTrajectoryTracer",
+      [](double charge, double mass, double start_altitude,
+         double escape_radius, double stepsize, int max_iter,
+         const char bfield_type,
+         const std::pair<std::string, double> &igrf_params) -> py::object {
+        switch (bfield_type) {
+          case 'd':
+            return py::cast(bTrajectoryTracer<MagneticField>(
+                charge, mass, start_altitude, escape_radius, stepsize,
+                max_iter, bfield_type, igrf_params));
+          case 'i':
+            return py::cast(bTrajectoryTracer<IGRF>(
+                charge, mass, start_altitude, escape_radius, stepsize,
+                max_iter, bfield_type, igrf_params));
+          case 'g':
+            return py::cast(bTrajectoryTracer<GriddedField>(
+                charge, mass, start_altitude, escape_radius, stepsize,
+                max_iter, bfield_type, igrf_params));
+          default:
+            throw std::invalid_argument(
+                "Only field types 'd', 'i' and 'g' are allowed!");
+        }
+      },
+      py::arg("charge"), py::arg("mass"), py::arg("start_altitude"),
+      py::arg("escape_radius"), py::arg("stepsize"), py::arg("max_iter"),
+      py::arg("bfield_type"), py::arg("igrf_params"));
+  M.def("bTrajectoryTracer",
+        []() { return bTrajectoryTracer<MagneticField>(); });
+
+  py::class_<uTrajectoryTracer>(
           M, "uTrajectoryTracer",
           py::module_local())  // TrajectoryTracer class unvectorized
           .def(py::init<>())
@@ -68,7 +311,52 @@ PYBIND11_MODULE(_libgtracr, M) {
           .def_property_readonly("sdate", &IGRF::sdate)
           .def_property_readonly("nmax", &IGRF::nmax)
           .def_property_readonly("cartesian_values", &IGRF::cartesian_values)
-          .def("values", &IGRF::values);
+          .def("values", &IGRF::values)
+          .def("shval3_values", &IGRF::shval3_values),
+
+      py::class_<GriddedField>(M, "GriddedField",
+                               py::module_local())  // field lattice class
+          .def(py::init<const std::string &>())
+          .def_property_readonly("shape", &GriddedField::shape)
+          .def_property_readonly("r_min", &GriddedField::r_min)
+          .def_property_readonly("r_max", &GriddedField::r_max)
+          .def("values", &GriddedField::values)
+          .def("ecef_values", &GriddedField::ecef_values)
+          .def_static("build_igrf", &GriddedField::build<IGRF>,
+                      py::arg("igrf"), py::arg("fname"), py::arg("nr"),
+                      py::arg("ntheta"), py::arg("nphi"),
+                      py::arg("r_min") = constants::RE,
+                      py::arg("r_max") = 10. * constants::RE,
+                      py::arg("num_threads") = 0,
+                      py::call_guard<py::gil_scoped_release>())
+          .def_static("build_dipole", &GriddedField::build<MagneticField>,
+                      py::arg("dipole"), py::arg("fname"), py::arg("nr"),
+                      py::arg("ntheta"), py::arg("nphi"),
+                      py::arg("r_min") = constants::RE,
+                      py::arg("r_max") = 10. * constants::RE,
+                      py::arg("num_threads") = 0,
+                      py::call_guard<py::gil_scoped_release>())
+          .def("igrf_error", &GriddedField::error<IGRF>, py::arg("igrf"),
+               py::arg("n_samples") = 10000, py::arg("seed") = 0)
+          .def("dipole_error", &GriddedField::error<MagneticField>,
+               py::arg("dipole"), py::arg("n_samples") = 10000,
+               py::arg("seed") = 0),
+
+      py::class_<IGRFCoefficientStore, std::unique_ptr<IGRFCoefficientStore, py::nodelete>>(
+          M, "IGRFCoefficientStore",
+          py::module_local())  // process-wide IGRF coefficient store
+          .def_static("clear",
+                      []() { IGRFCoefficientStore::instance().clear(); })
+          .def_static("size",
+                      []() { return IGRFCoefficientStore::instance().size(); })
+          .def_static("nfiles",
+                      []() { return IGRFCoefficientStore::instance().nfiles(); })
+          .def_static(
+              "capacity",
+              []() { return IGRFCoefficientStore::instance().capacity(); })
+          .def_static("set_capacity", [](const std::size_t capacity) {
+            IGRFCoefficientStore::instance().set_capacity(capacity);
+          });
 
   // py::class_<Particle>(M, "Particle")
   //     .def(py::init<>())
@@ -108,7 +108,7 @@ uTrajectoryTracer::uTrajectoryTracer(double charge, double mass,
       break;
     case 'i':
       // add file name to DATA_DIR (first component in igrf_params)
-      std::string DATA_PATH = igrf_params.first + "/igrf13.json";
+      std::string DATA_PATH = igrf_data_path(igrf_params.first);
       double sdate = igrf_params.second;
       bfield_ = IGRF(DATA_PATH, sdate);
       break;
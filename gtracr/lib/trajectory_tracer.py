@@ -86,7 +86,8 @@ class pTrajectoryTracer:
                 raise Exception(
                     "The dates used for the IGRF model is not provided!")
             else:
-                year = igrf_params[1]  # the current date
+                # the current date, which may be given as a 1-element array
+                year = float(np.squeeze(igrf_params[1]))
                 nmax = 13  # should be able to vary in future versions
                 self.bfield = IGRF13(year, nmax=nmax)
         else:
@@ -96,7 +97,7 @@ class pTrajectoryTracer:
         self.final_time = 0.
         self.final_sixvector = np.zeros(6)
 
-    def ode_lrz(self, t, vec):
+    def ode_lrz(self, t, vec, charge=None, mass=None):
         '''
         The system of ordinary differential equations that describe the motion of charged
         particles in Earth's magnetic field via the Lorentz force in spherical coordinates.
@@ -107,22 +108,31 @@ class pTrajectoryTracer:
 
         - t : float
             the time
-        - vec : np.array(float), size 6
-            the six-vector (r, theta, phi, pr, ptheta, pphi) at time t
+        - vec : np.array(float), size 6 or shape (6, N)
+            the six-vector (r, theta, phi, pr, ptheta, pphi) at time t, or the
+            six-vectors of N particles as columns
+        - charge, mass : float or np.array(float), size N
+            the charge in coulombs and the mass in kg of the particles
+            (default: the charge and mass of the tracer)
 
         Returns
         --------
-        - ode_lrz : np.array(float), size 6
+        - ode_lrz : np.array(float), size 6 or shape (6, N)
             the ordinary differential equation for the six vector based on the Lorentz force equation
         '''
+        if charge is None:
+            charge = self.charge
+        if mass is None:
+            mass = self.mass
+
         # unpack vector for readability
         (r, theta, phi, pr, ptheta, pphi) = vec
 
         # get lorentz factor
         # pmag = np.linalg.norm(vec[3:])  # momentum magnitude
         pmag = np.sqrt(pr**2. + ptheta**2. + pphi**2.)
-        gamma = np.sqrt(1. + (pmag / (self.mass * SPEED_OF_LIGHT))**2.)
-        rel_mass = self.mass * gamma
+        gamma = np.sqrt(1. + (pmag / (mass * SPEED_OF_LIGHT))**2.)
+        rel_mass = mass * gamma
 
         # evaluate B-field
         # bf_r = self.bfield.Br(r, theta, phi)
@@ -138,18 +148,18 @@ class pTrajectoryTracer:
         # _sphcmp indicates the auxiliary terms that
         # come from using spherical coordinates
         # dprdt
-        dprdt_lrz = -1. * self.charge * (ptheta * bf_phi - bf_theta * pphi)
+        dprdt_lrz = -1. * charge * (ptheta * bf_phi - bf_theta * pphi)
         dprdt_sphcmp = ((ptheta**2. + pphi**2.) / r)
         dprdt = dprdt_lrz + dprdt_sphcmp
 
         # dpthetadt
-        dpthetadt_lrz = self.charge * (pr * bf_phi - bf_r * pphi)
+        dpthetadt_lrz = charge * (pr * bf_phi - bf_r * pphi)
         dpthetadt_sphcmp = ((pphi**2. * np.cos(theta)) /
                             (r * np.sin(theta))) - ((pr * ptheta) / r)
         dpthetadt = dpthetadt_lrz + dpthetadt_sphcmp
 
         # dpphidt
-        dpphidt_lrz = -1. * self.charge * (pr * bf_theta - bf_r * ptheta)
+        dpphidt_lrz = -1. * charge * (pr * bf_theta - bf_r * ptheta)
         dpphidt_sphcmp = ((pr * pphi) / r) + ((ptheta * pphi * np.cos(theta)) /
                                               (r * np.sin(theta)))
         dpphidt = dpphidt_lrz - dpphidt_sphcmp
@@ -183,8 +193,9 @@ class pTrajectoryTracer:
         - None
         '''
         # set initial conditions
+        # (copy the six-vector, such that vec0 is not modified)
         t = t0
-        vec = vec0
+        vec = np.array(vec0, dtype=float)
         h = self.stepsize  # for more compact writing
         # start the loop
         for i in range(self.max_step):
@@ -219,6 +230,92 @@ class pTrajectoryTracer:
 
         # return None
 
+    def evaluate_batch(self, vec0s, charges=None, masses=None, t0=0.):
+        '''
+        Evaluate a batch of N trajectories together by performing a 4th order
+        Runge Kutta integration on the (N, 6) array of six-vectors. Each step
+        only advances the particles that have not terminated yet, and the
+        magnetic field is evaluated for all of them with a single call.
+
+        This mirrors `TrajectoryTracer.evaluate_batch` of the C++ version.
+
+        Parameters
+        ----------
+
+        - vec0s : np.array(float), shape (N, 6)
+            the initial six-vectors (r0, theta0, phi0, pr0, ptheta0, pphi0)
+        - charges : np.array(float), size N
+            the charges of the particles in coulombs
+            (default = None, i.e. the charge of the tracer)
+        - masses : np.array(float), size N
+            the masses of the particles in kg
+            (default = None, i.e. the mass of the tracer)
+        - t0 : float
+            the initial time (default = 0.)
+
+        Returns
+        --------
+
+        - escaped : np.array(bool), size N
+            whether each particle has escaped
+        - final_times : np.array(float), size N
+            the final time of each trajectory
+        - final_sixvectors : np.array(float), shape (N, 6)
+            the final six-vector of each trajectory
+        '''
+        vecs = np.array(vec0s, dtype=float)
+        if vecs.ndim != 2 or vecs.shape[1] != 6:
+            raise Exception("Only six-vectors with shape (N, 6) are allowed!")
+        n = vecs.shape[0]
+
+        charges = np.broadcast_to(
+            self.charge if charges is None else np.asarray(charges, float),
+            (n, ))
+        masses = np.broadcast_to(
+            self.mass if masses is None else np.asarray(masses, float), (n, ))
+
+        escaped = np.zeros(n, dtype=bool)
+        final_times = np.full(n, float(t0))
+        # the indices of the particles that have not terminated yet
+        active = np.arange(n)
+
+        t = t0
+        h = self.stepsize  # for more compact writing
+        for i in range(self.max_step):
+            # the six-vectors of the active particles as columns
+            vec = vecs[active].T
+            charge = charges[active]
+            mass = masses[active]
+
+            # evaluate k-coefficients
+            k1_vec = h * self.ode_lrz(t, vec, charge, mass)
+            k2_vec = h * self.ode_lrz(t + (0.5 * h), vec + (0.5 * k1_vec),
+                                      charge, mass)
+            k3_vec = h * self.ode_lrz(t + (0.5 * h), vec + (0.5 * k2_vec),
+                                      charge, mass)
+            k4_vec = h * self.ode_lrz(t + h, vec + k3_vec, charge, mass)
+
+            # increment by weighted sum of k-coeffs
+            vec = vec + (1. / 6.) * (k1_vec + (2. * k2_vec) +
+                                     (2. * k3_vec) + k4_vec)
+            t += h  # increment time
+
+            vecs[active] = vec.T
+            final_times[active] = t
+
+            # breaking conditions based on value of r, as in evaluate
+            r = vec[0]
+            particle_escaped = r > EARTH_RADIUS + self.escape_radius
+            returned = r < self.start_altitude + EARTH_RADIUS
+            escaped[active[particle_escaped]] = True
+
+            # mask out the particles that have terminated
+            active = active[~(particle_escaped | returned)]
+            if len(active) == 0:
+                break
+
+        return escaped, final_times, vecs
+
     def evaluate_and_get_trajectory(self, t0, vec0):
         '''
         Evaluate the trajectory by performing a 4th order Runge Kutta integration and get the corresponding trajectory data, that is, the duration of the trajectory and the six-vector of the trajectory as a numpy array. 
@@ -239,8 +336,9 @@ class pTrajectoryTracer:
             - keys are ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
         '''
         # set initial conditions
+        # (copy the six-vector, such that vec0 is not modified)
         t = t0
-        vec = vec0
+        vec = np.array(vec0, dtype=float)
         h = self.stepsize  # for more compact writing
         # initialize arrays
         # ugly, but appending is better than trimming zeros later
@@ -262,8 +360,9 @@ class pTrajectoryTracer:
             k4_vec = h * self.ode_lrz(t + h, vec + k3_vec)
 
             # increment by weighted sum of k-coeffs
-            vec += (1. / 6.) * (k1_vec + (2. * k2_vec) +
-                                (2. * k3_vec) + k4_vec)
+            # (a new array, since the previous one is stored in vec_arr)
+            vec = vec + (1. / 6.) * (k1_vec + (2. * k2_vec) +
+                                     (2. * k3_vec) + k4_vec)
             t += h  # increment time
 
             # breaking conditions based on value of r
@@ -4,12 +4,21 @@ Converts the .COF file, which contains the spherical harmonic coefficients of th
 - it is human readable
 - lots of support exists with this file format
 
+The coefficients are also exported into a compact binary format, which can be memory-mapped
+by both the C++ and Python versions of the IGRF model without any parsing. The binary file
+consists of the following blocks (little-endian):
+- header (24 bytes) : magic b"GTRIGRF\\0", then version, nepochs, maxcoeff and a reserved field as uint32
+- epochs : float64[nepochs]
+- nmain, nsv : int32[nepochs] each
+- gh, gh_sv : float64[nepochs][maxcoeff] each, zero-padded for epochs with fewer coefficients
+
 This should be run every time there is an update with the .COF files obtained from the IGRF website.
 '''
 
 import os
 import sys
 import json
+import struct
 import numpy as np
 
 IGRF_VERSION = 13  # should be updated with each IGRF version
@@ -19,6 +28,12 @@ PARENT_DIR = os.path.dirname(CURRENT_DIR)
 DATA_DIR = os.path.join(PARENT_DIR, "data")
 COF_PATH = os.path.join(DATA_DIR, "IGRF{0}.COF".format(IGRF_VERSION))
 JSON_PATH = os.path.join(DATA_DIR, "igrf{0}.json".format(IGRF_VERSION))
+BIN_PATH = os.path.join(DATA_DIR, "igrf{0}.bin".format(IGRF_VERSION))
+
+# header of the binary file
+BIN_MAGIC = b"GTRIGRF\0"
+BIN_VERSION = 1
+BIN_HEADER_FORMAT = "<8sIIII"
 
 
 def export_json(igrf_dict):
@@ -28,6 +43,31 @@ def export_json(igrf_dict):
     with open(JSON_PATH, "w") as f:
         json.dump(igrf_dict, f, indent=2, separators=(',', ':'))
 
+def export_binary(igrf_dict):
+    '''
+    Export the file in the compact binary format
+    '''
+    epochs = sorted(igrf_dict.keys(), key=float)
+    nepochs = len(epochs)
+    maxcoeff = max(len(igrf_dict[epoch]["gh"]) for epoch in epochs)
+
+    # zero-padded coefficient blocks
+    gh = np.zeros((nepochs, maxcoeff), dtype="<f8")
+    gh_sv = np.zeros((nepochs, maxcoeff), dtype="<f8")
+    for i, epoch in enumerate(epochs):
+        gh[i, :len(igrf_dict[epoch]["gh"])] = igrf_dict[epoch]["gh"]
+        gh_sv[i, :len(igrf_dict[epoch]["gh_sv"])] = igrf_dict[epoch]["gh_sv"]
+
+    with open(BIN_PATH, "wb") as f:
+        f.write(
+            struct.pack(BIN_HEADER_FORMAT, BIN_MAGIC, BIN_VERSION, nepochs,
+                        maxcoeff, 0))
+        f.write(np.array([float(epoch) for epoch in epochs], dtype="<f8").tobytes())
+        f.write(np.array([igrf_dict[epoch]["nmain"] for epoch in epochs], dtype="<i4").tobytes())
+        f.write(np.array([igrf_dict[epoch]["nsv"] for epoch in epochs], dtype="<i4").tobytes())
+        f.write(gh.tobytes())
+        f.write(gh_sv.tobytes())
+
 def add_coefficients(igrf_dict, model_dict):
     '''
     Add the coefficients to the dictionary igrf_dict.
@@ -150,5 +190,8 @@ def cof_to_json():
     # export resulting dictionary as .json file
     export_json(igrf_dict)
 
+    # export the coefficients in the binary format as well
+    export_binary(igrf_dict)
+
 if __name__ == "__main__":
     cof_to_json()
\ No newline at end of file
@@ -0,0 +1,182 @@
+'''
+Output sinks of the geomagnetic cutoff rigidity evaluator (GMRC), to which the
+results are written chunk by chunk while the evaluation is running.
+
+With a sink, the results do not need to be kept in memory, and the results of
+the completed chunks can be read (e.g. with `NpzSink.read` or `HDF5Sink.read`)
+while the evaluation is still running.
+'''
+
+import os
+import glob
+import numpy as np
+
+
+class ResultSink():
+    '''
+    Base class of the output sinks. Each completed chunk of directions is
+    passed to `append`, in the order of the directions.
+
+    The sinks are context managers, such that the output is closed at the
+    end of the `with` block.
+    '''
+    def append(self, start, azimuths, zeniths, cutoffs):
+        '''
+        Appends the results of a chunk of directions.
+
+        Parameters
+        ----------
+
+        - start : int
+            The index of the first direction of the chunk
+        - azimuths, zeniths : np.array(float)
+            The azimuth and zenith angles of the directions in degrees
+        - cutoffs : dict(str, np.array(float))
+            The cutoff rigidities of the directions ("rcutoff", and "rlower" / "rupper"
+            for the penumbra), which are NaN if the particle did not escape within the
+            range of rigidities
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        '''
+        Closes the output.
+        '''
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @staticmethod
+    def _columns(start, azimuths, zeniths, cutoffs):
+        '''
+        The columns of a chunk, including the index of each direction.
+        '''
+        columns = {
+            "index": start + np.arange(len(azimuths)),
+            "azimuth": np.asarray(azimuths),
+            "zenith": np.asarray(zeniths)
+        }
+        columns.update(cutoffs)
+        return columns
+
+
+class NpzSink(ResultSink):
+    '''
+    Writes each chunk as a compressed .npz file (chunk_<start index>.npz) into
+    a directory. Each file is written atomically, such that readers only see
+    complete chunks.
+
+    Parameters
+    ----------
+
+    - directory : str
+        The directory of the chunk files, which is created if it does not exist.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, start, azimuths, zeniths, cutoffs):
+        path = os.path.join(self.directory, "chunk_{0:012d}.npz".format(start))
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(
+                f, **self._columns(start, azimuths, zeniths, cutoffs))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def read(directory):
+        '''
+        Reads the results of all chunks written so far into the directory.
+
+        Returns
+        --------
+
+        - results : dict(str, np.array)
+            The index, azimuth, zenith and cutoff rigidities of each direction,
+            ordered by the index of the directions.
+        '''
+        chunks = []
+        for path in sorted(
+                glob.glob(os.path.join(directory, "chunk_*.npz"))):
+            with np.load(path) as chunk:
+                chunks.append({key: chunk[key] for key in chunk.files})
+        if not chunks:
+            return {}
+        return {
+            key: np.concatenate([chunk[key] for chunk in chunks])
+            for key in chunks[0]
+        }
+
+
+class HDF5Sink(ResultSink):
+    '''
+    Writes the chunks into resizable, chunked and compressed datasets of an
+    HDF5 file (requires h5py). The chunks of the datasets have the size of the
+    first appended chunk. The file is written in single-writer multiple-reader
+    (SWMR) mode, such that it can be read while the evaluation is running.
+
+    Parameters
+    ----------
+
+    - path : str
+        The path of the HDF5 file, which is overwritten if it exists.
+    - compression : str
+        The compression filter of the datasets (default = "gzip").
+    '''
+    def __init__(self, path, compression="gzip"):
+        import h5py
+
+        self.path = path
+        self.compression = compression
+        self._file = h5py.File(path, "w", libver="latest")
+
+    def append(self, start, azimuths, zeniths, cutoffs):
+        columns = self._columns(start, azimuths, zeniths, cutoffs)
+
+        # create the datasets with the first chunk, after which
+        # the file is opened for readers
+        if len(self._file) == 0:
+            for key, values in columns.items():
+                self._file.create_dataset(key,
+                                          shape=(0, ),
+                                          maxshape=(None, ),
+                                          dtype=values.dtype,
+                                          chunks=(max(len(values), 1), ),
+                                          compression=self.compression)
+            self._file.swmr_mode = True
+
+        for key, values in columns.items():
+            dataset = self._file[key]
+            size = dataset.shape[0]
+            dataset.resize((size + len(values), ))
+            dataset[size:] = values
+            dataset.flush()
+
+    def close(self):
+        self._file.close()
+
+    @staticmethod
+    def read(path):
+        '''
+        Reads the results of all chunks written so far into the HDF5 file.
+
+        Returns
+        --------
+
+        - results : dict(str, np.array)
+            The index, azimuth, zenith and cutoff rigidities of each direction,
+            ordered by the index of the directions.
+        '''
+        import h5py
+
+        with h5py.File(path, "r", libver="latest", swmr=True) as f:
+            if len(f) == 0:
+                return {}
+            # the datasets are resized one after the other by the writer
+            size = min(f[key].shape[0] for key in f)
+            return {key: f[key][:size] for key in f}
@@ -79,6 +79,29 @@ def test_pyigrf():
         assert np.allclose(bmag, expected_bmag[iexp])
 
 
+def test_igrf():
+    '''
+    Test the IGRF model in the C++ version against the Python version.
+    '''
+    from gtracr.lib._libgtracr import IGRF
+    from gtracr.lib.magnetic_field import IGRF13
+
+    DATA_PATH = os.path.join(DATA_DIR, "igrf13.bin")
+
+    for date in [CURRENT_YEAR, 2020.5, 1987.25, 1900.]:
+        cigrf = IGRF(DATA_PATH, date)
+        pyigrf = IGRF13(date)
+
+        for coord in coord_list:
+            # the tolerance is limited by the value of pi used in the C++
+            # version, and the C++ version is evaluated slightly off the poles
+            bf_values = pyigrf.values(*coord)
+            assert np.allclose(cigrf.values(*coord),
+                               bf_values,
+                               rtol=0.,
+                               atol=1e-5 * np.linalg.norm(bf_values))
+
+
 def test_dipole():
     '''
     Test the Python model in the C++ version.
@@ -100,6 +123,75 @@ def test_dipole():
         assert np.allclose(bmag, expected_bmag[iexp])
 
 
+def test_igrf_store():
+    '''
+    Test that the IGRF coefficients shared through the coefficient store
+    give the same magnetic field as freshly evaluated coefficients.
+    '''
+    from gtracr.lib._libgtracr import IGRF, IGRFCoefficientStore
+
+    DATA_PATH = os.path.join(DATA_DIR, "igrf13.json")
+    dates = [CURRENT_YEAR, 2020.5, 1987.25]
+
+    IGRFCoefficientStore.clear()
+
+    # evaluate with coefficients that are not in the store yet
+    expected_values = []
+    for date in dates:
+        igrf = IGRF(DATA_PATH, date)
+        expected_values.append([igrf.values(*coord) for coord in coord_list])
+
+    assert IGRFCoefficientStore.size() == len(dates)
+    assert IGRFCoefficientStore.nfiles() == 1
+
+    # evaluate with the coefficients from the store
+    for date, values in zip(dates, expected_values):
+        igrf = IGRF(DATA_PATH, date)
+        for coord, value in zip(coord_list, values):
+            assert np.allclose(igrf.values(*coord), value)
+
+    assert IGRFCoefficientStore.size() == len(dates)
+
+    # least recently used dates are evicted
+    capacity = IGRFCoefficientStore.capacity()
+    IGRFCoefficientStore.set_capacity(1)
+    assert IGRFCoefficientStore.size() == 1
+    IGRFCoefficientStore.set_capacity(capacity)
+
+    IGRFCoefficientStore.clear()
+    assert IGRFCoefficientStore.size() == 0
+    assert IGRFCoefficientStore.nfiles() == 0
+
+
+def test_igrf_shval3():
+    '''
+    Test that the IGRF model with the precomputed recurrence coefficients
+    gives the same magnetic field as the original shval3 routine.
+    '''
+    from gtracr.lib._libgtracr import IGRF
+
+    BIN_PATH = os.path.join(DATA_DIR, "igrf13.bin")
+
+    rng = np.random.default_rng(0)
+    random_coords = np.column_stack(
+        (EARTH_RADIUS * rng.uniform(1., 10., 1000), rng.uniform(0., np.pi, 1000),
+         rng.uniform(0., 2. * np.pi, 1000))).tolist()
+    # include the poles and polar angles beyond the poles
+    pole_coords = [(EARTH_RADIUS, 0., 1.), (EARTH_RADIUS, np.pi, 1.),
+                   (2. * EARTH_RADIUS, -0.1, 3.), (EARTH_RADIUS, 3.3, 5.)]
+
+    # the older epochs have a lower truncation (nmax = 10)
+    for date in [CURRENT_YEAR, 2023.5, 1950.25]:
+        igrf = IGRF(BIN_PATH, date)
+        for coord in coord_list + pole_coords + random_coords:
+            values = igrf.values(*coord)
+            shval3_values = igrf.shval3_values(*coord)
+            assert np.allclose(values,
+                               shval3_values,
+                               rtol=1e-12,
+                               atol=1e-12 * np.max(np.abs(shval3_values)))
+
+
 # def test_igrf():
 #     '''
 #     Test the IGRF model in the C++ version.
@@ -144,3 +236,161 @@ def test_dipole():
 #         bmag = np.linalg.norm(np.array(bf_values))
 
 #         assert np.allclose(bmag, expected_bmag[iexp])
+
+def test_igrf_binary():
+    '''
+    Test that the coefficients read from the memory-mapped binary file
+    are the same as those read from the .shc / JSON files.
+    '''
+    from gtracr.lib._libgtracr import IGRF
+    import gtracr.lib.igrf_utils as iuf
+
+    BIN_PATH = os.path.join(DATA_DIR, "igrf13.bin")
+    JSON_PATH = os.path.join(DATA_DIR, "igrf13.json")
+
+    # Python version
+    shc_igrf = iuf.load_shcfile(os.path.join(DATA_DIR, "IGRF13.shc"),
+                                leap_year=LEAP_YEAR)
+    bin_igrf = iuf.load_binfile(BIN_PATH)
+
+    assert np.array_equal(bin_igrf.time, shc_igrf.time)
+    assert np.allclose(bin_igrf.coeffs, shc_igrf.coeffs, rtol=0., atol=1e-9)
+    assert bin_igrf.parameters["nmax"] == shc_igrf.parameters["nmax"]
+
+    # C++ version
+    for date in [CURRENT_YEAR, 2020.5, 1987.25]:
+        bin_cigrf = IGRF(BIN_PATH, date)
+        json_cigrf = IGRF(JSON_PATH, date)
+        for coord in coord_list:
+            assert np.allclose(bin_cigrf.values(*coord),
+                               json_cigrf.values(*coord))
+
+
+def test_igrf_file_cache(tmp_path):
+    '''
+    Test that the coefficient files are only loaded again after they are
+    modified, and that IGRF13 instances of the same year share their
+    coefficients.
+    '''
+    import shutil
+    import gtracr.lib.igrf_utils as iuf
+    from gtracr.lib.magnetic_field import IGRF13
+
+    shc_path = str(tmp_path / "IGRF13.shc")
+    shutil.copy(os.path.join(DATA_DIR, "IGRF13.shc"), shc_path)
+
+    shc_igrf = iuf.load_shcfile(shc_path)
+    assert iuf.load_shcfile(shc_path) is shc_igrf
+    assert not shc_igrf.coeffs.flags.writeable
+
+    # change the first coefficient (g10 of 1900) of the file
+    with open(shc_path) as f:
+        lines = f.readlines()
+    iline = next(i for i, line in enumerate(lines)
+                 if line.split()[:2] == ["1", "0"])
+    values = lines[iline].split()
+    values[2] = "0.0"
+    lines[iline] = " ".join(values) + "\n"
+    with open(shc_path, "w") as f:
+        f.writelines(lines)
+    mtime = os.path.getmtime(shc_path)
+    os.utime(shc_path, (mtime + 1., mtime + 1.))
+
+    modified_igrf = iuf.load_shcfile(shc_path)
+    assert modified_igrf is not shc_igrf
+    assert modified_igrf.coeffs[0, 0] == 0.
+    assert np.array_equal(modified_igrf.coeffs[1:], shc_igrf.coeffs[1:])
+
+    assert IGRF13(2020.5).igrf_coeffs is IGRF13(2020.5).igrf_coeffs
+    assert np.array_equal(
+        IGRF13(2020.5, nmax=8).igrf_coeffs,
+        IGRF13(np.array([2020.5])).igrf_coeffs)
+
+
+def test_gridded_field(tmp_path):
+    '''
+    Test the interpolated lattice of the IGRF model against the direct
+    evaluation of the IGRF model.
+    '''
+    from gtracr.lib._libgtracr import IGRF, GriddedField
+
+    GRID_PATH = str(tmp_path / "igrf13.grid")
+
+    igrf = IGRF(os.path.join(DATA_DIR, "igrf13.bin"), CURRENT_YEAR)
+    GriddedField.build_igrf(igrf, GRID_PATH, 32, 91, 180)
+    grid = GriddedField(GRID_PATH)
+
+    assert grid.shape == [32, 91, 180]
+    assert np.isclose(grid.r_min, EARTH_RADIUS)
+    assert np.isclose(grid.r_max, 10. * EARTH_RADIUS)
+
+    # the interpolation error in nT
+    max_error, rms_error = np.array(grid.igrf_error(igrf)) * 1e9
+    assert rms_error < 10.
+    assert max_error < 100.
+
+    for coord in coord_list:
+        bf_values = igrf.values(*coord)
+        assert np.allclose(grid.values(*coord),
+                           bf_values,
+                           rtol=0.,
+                           atol=5e-3 * np.linalg.norm(bf_values))
+
+
+def test_igrf_grid_path(tmp_path, monkeypatch):
+    '''
+    Test that the lattices are stored in the grid cache directory, and that
+    lattices that cannot be written to the given directory are stored in the
+    cache directory instead.
+    '''
+    from gtracr.lib.gridded_field import grid_cache_dir, igrf_grid_path
+
+    monkeypatch.setenv("GTRACR_CACHE_DIR", str(tmp_path / "cache"))
+    cache_dir = str(tmp_path / "cache" / "grids")
+    assert grid_cache_dir() == cache_dir
+
+    shape = (4, 8, 8)
+    grid_path = igrf_grid_path(CURRENT_YEAR, shape)
+    assert os.path.dirname(grid_path) == cache_dir
+    assert os.path.exists(grid_path)
+
+    grid_dir = str(tmp_path / "grids")
+    assert os.path.dirname(igrf_grid_path(CURRENT_YEAR, shape,
+                                          grid_dir=grid_dir)) == grid_dir
+
+    # a directory below a file cannot be created
+    (tmp_path / "file").write_text("")
+    assert igrf_grid_path(CURRENT_YEAR + 1,
+                          shape,
+                          grid_dir=str(tmp_path / "file" /
+                                       "grids")).startswith(cache_dir)
+
+
+def _build_grid(args):
+    from gtracr.lib.gridded_field import igrf_grid_path
+    dec_date, shape, grid_dir = args
+    return igrf_grid_path(dec_date, shape, grid_dir=grid_dir)
+
+
+def test_igrf_grid_concurrent(tmp_path):
+    '''
+    Test that processes that build the same lattice at the same time
+    obtain a complete lattice file.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    from gtracr.lib._libgtracr import IGRF, GriddedField
+
+    shape = (16, 46, 90)
+    grid_dir = str(tmp_path / "grids")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        grid_paths = list(
+            executor.map(_build_grid, [(CURRENT_YEAR, shape, grid_dir)] * 4))
+    assert len(set(grid_paths)) == 1
+    # the temporary files are removed
+    assert os.listdir(grid_dir) == [os.path.basename(grid_paths[0])]
+
+    ref_path = str(tmp_path / "igrf13.grid")
+    igrf = IGRF(os.path.join(DATA_DIR, "igrf13.bin"), CURRENT_YEAR)
+    GriddedField.build_igrf(igrf, ref_path, *shape)
+    with open(grid_paths[0], "rb") as f, open(ref_path, "rb") as ref_f:
+        assert f.read() == ref_f.read()
@@ -0,0 +1,63 @@
+'''
+Tests for the evaluation of the geomagnetic cutoff rigidities over a grid
+of locations.
+'''
+
+import os
+import sys
+import numpy as np
+import pytest
+
+from gtracr.cutoff_map import CutoffMap
+from gtracr.geomagnetic_cutoffs import GMRC
+from gtracr.lib.location import Location
+
+
+def test_cutoff_map_vertical():
+    '''
+    Test the vertical cutoff rigidities of the dipole field, which are
+    symmetric between both hemispheres and largest at the equator.
+    '''
+    cutoff_map = CutoffMap(latitudes=[-60., -30., 0., 30., 60.],
+                           longitudes=[0., 180.],
+                           bfield_type="dipole",
+                           min_rigidity=1.,
+                           max_rigidity=30.,
+                           delta_rigidity=0.5)
+    cutoff_map.evaluate()
+
+    rcutoff = cutoff_map.data_dict["rcutoff"]
+    assert rcutoff.shape == (5, 2, 1, 1)
+    assert np.array_equal(rcutoff, rcutoff[::-1])
+    assert np.all(np.diff(rcutoff[:3, 0, 0, 0]) > 0.)
+
+
+def test_cutoff_map_directions():
+    '''
+    Test that the cutoff rigidities of a set of directions agree with those
+    of GMRC at the same location, for any number of worker processes.
+    '''
+    directions = [[0., 0.], [45., 90.], [60., 270.]]
+    rcutoffs = {}
+    for n_workers in [1, 2]:
+        cutoff_map = CutoffMap(latitudes=[36.4348],
+                               longitudes=[137.276599, -81.186701],
+                               altitudes=[0., 1.],
+                               directions=directions,
+                               bfield_type="dipole")
+        cutoff_map.evaluate(search="bisect",
+                            rigidity_tol=0.1,
+                            n_workers=n_workers,
+                            chunk_size=3)
+        rcutoffs[n_workers] = cutoff_map.data_dict["rcutoff"]
+
+    assert rcutoffs[1].shape == (1, 2, 2, 3)
+    assert np.array_equal(rcutoffs[1], rcutoffs[2], equal_nan=True)
+
+    gmrc = GMRC(location=Location("Kamioka", 36.4348, 137.276599, 0.),
+                iter_num=3,
+                bfield_type="dipole")
+    zeniths, azimuths = np.transpose(directions)
+    _, _, _, cutoffs = gmrc._evaluate_chunk(0, azimuths, zeniths, 1e-5, 1,
+                                            "bisect", 0.1)
+    assert np.array_equal(rcutoffs[1][0, 0, 0], cutoffs["rcutoff"])
@@ -0,0 +1,126 @@
+'''
+Tests for the precomputed tables of the geomagnetic cutoff rigidities.
+'''
+
+import os
+import sys
+import numpy as np
+import pytest
+
+from gtracr.cutoff_table import CutoffTable
+from gtracr.geomagnetic_cutoffs import GMRC
+from gtracr.utils import ymd_to_dec
+
+
+def test_cutoff_table_query(tmp_path):
+    '''
+    Test the interpolation of a table with cutoffs that depend linearly on the
+    date, zenith and azimuth, which is exact within the table.
+    '''
+    dates = [2000., 2010., 2030.]
+    zeniths, azimuths = np.meshgrid(np.linspace(0., 180., 19),
+                                    np.linspace(0., 360., 37),
+                                    indexing="ij")
+    cutoffs = [[0.1 * (date - 2000.) + 0.05 * zeniths + 0.01 * azimuths
+                for date in dates],
+               [np.full(zeniths.shape, date - 2000.) for date in dates]]
+
+    path = str(tmp_path / "table.ctb")
+    CutoffTable.write(path, cutoffs, ["linear", "constant"], dates,
+                      (0., 180.), (0., 360.))
+    table = CutoffTable(path)
+    assert isinstance(table.cutoffs, np.memmap)
+    assert table.cutoffs.shape == (2, 3, 19, 37)
+
+    rng = np.random.default_rng(0)
+    zenith = rng.uniform(0., 180., 1000)
+    azimuth = rng.uniform(0., 350., 1000)
+    date = rng.uniform(2000., 2030., 1000)
+    assert np.allclose(table.query(zenith, azimuth, site="linear", date=date),
+                       0.1 * (date - 2000.) + 0.05 * zenith + 0.01 * azimuth)
+
+    # the arguments are broadcast, and the dates are clamped to the table
+    rcutoff = table.query(zenith, azimuth, site="constant", date=2040.)
+    assert rcutoff.shape == (1000, )
+    assert np.allclose(rcutoff, 30.)
+    assert np.allclose(table.query(0., 0.), 0.)
+
+    # the azimuth is periodic
+    assert np.allclose(table.query(90., -10., site="constant", date=2005.),
+                       table.query(90., 350., site="constant", date=2005.))
+
+
+def test_cutoff_table_version(tmp_path):
+    '''
+    Test that table files with another version of the format are rejected.
+    '''
+    from gtracr.cutoff_table import MAGIC, VERSION
+
+    path = str(tmp_path / "table.ctb")
+    CutoffTable.write(path, [[np.zeros((2, 2))]], ["site"], [2000.],
+                      (0., 180.), (0., 360.))
+    with open(path, "r+b") as f:
+        f.seek(len(MAGIC))
+        f.write(np.array([VERSION + 1], dtype="<u4").tobytes())
+
+    with pytest.raises(ValueError, match="version of the cutoff table file is 2"):
+        CutoffTable(path)
+
+
+def test_cutoff_table_build(tmp_path):
+    '''
+    Test the table built from the results of GMRC.
+    '''
+    gmrc = GMRC(location="Kamioka", iter_num=32, bfield_type="dipole")
+    gmrc.evaluate(seed=1, sampling="sobol")
+
+    table = CutoffTable.build(str(tmp_path / "table.ctb"), [gmrc],
+                              ngrid_zenith=19,
+                              ngrid_azimuth=37)
+    assert table.sites == ["Kamioka"]
+    assert table.cutoffs.shape == (1, 1, 19, 37)
+    assert not np.any(np.isnan(table.cutoffs))
+
+    # the cutoffs of the table lie within the range of the samples
+    escaped = gmrc.data_dict["rcutoff"] > 0.
+    rcutoff = table.query(gmrc.data_dict["zenith"][escaped],
+                          gmrc.data_dict["azimuth"][escaped],
+                          site="Kamioka",
+                          date=gmrc.date)
+    assert np.all(rcutoff >= np.min(gmrc.data_dict["rcutoff"][escaped]))
+    assert np.all(rcutoff <= np.max(gmrc.data_dict["rcutoff"][escaped]))
+
+    # a table with several dates
+    gmrc.evaluate_dates(["2000-01-01", "2020-01-01"], seed=1, sampling="sobol")
+    table = CutoffTable.build(str(tmp_path / "dates.ctb"), [gmrc],
+                              ngrid_zenith=19,
+                              ngrid_azimuth=37)
+    assert table.cutoffs.shape == (1, 2, 19, 37)
+    assert np.all(np.diff(table.dates) > 0.)
+
+    # the table is built from the results of the last evaluation
+    gmrc.date = "2010-01-01"
+    gmrc.evaluate(seed=1, sampling="sobol")
+    table = CutoffTable.build(str(tmp_path / "date.ctb"), [gmrc],
+                              ngrid_zenith=19,
+                              ngrid_azimuth=37)
+    assert np.allclose(table.dates, [ymd_to_dec("2010-01-01")])
+
+    gmrc.evaluate_dates(["2000-01-01", "2020-01-01"], seed=1, sampling="sobol")
+    table = CutoffTable.build(str(tmp_path / "dates.ctb"), [gmrc],
+                              ngrid_zenith=19,
+                              ngrid_azimuth=37)
+    assert table.cutoffs.shape == (1, 2, 19, 37)
+
+
+def test_cutoff_table_single_point(tmp_path):
+    '''
+    Test the query of a table with a single grid point in the zenith and
+    azimuth angles, which is constant in these angles.
+    '''
+    path = str(tmp_path / "table.ctb")
+    CutoffTable.write(path, [[[[5.]], [[7.]]]], ["site"], [2000., 2010.],
+                      (90., 90.), (0., 0.))
+    table = CutoffTable(path)
+    assert np.allclose(table.query([0., 90., 180.], [0., 45., 350.],
+                                   date=2005.), 6.)
@@ -0,0 +1,351 @@
+'''
+Tests for the evaluation of the geomagnetic cutoff rigidities.
+'''
+
+import os
+import sys
+import numpy as np
+import pytest
+
+from gtracr.geomagnetic_cutoffs import GMRC
+
+
+def test_gmrc_bisect():
+    '''
+    Test that the cutoff rigidities obtained by bisection agree with those
+    obtained by the linear scan of the rigidities.
+    '''
+
+    rigidity_tol = 0.01
+    rcutoffs = {}
+    for search in ["linear", "bisect"]:
+        # sample the same directions for both methods
+        gmrc = GMRC(location="Kamioka", iter_num=10, bfield_type="dipole")
+        gmrc.evaluate(search=search, rigidity_tol=rigidity_tol, seed=1)
+        rcutoffs[search] = gmrc.data_dict["rcutoff"]
+
+    # the linear scan resolves the cutoff to delta_rigidity, and the
+    # bisection to rigidity_tol within the same range of rigidities, such
+    # that the bisected cutoff lies within the step of the linear scan
+    # below its cutoff (and both methods agree on the escaped directions)
+    assert np.all(rcutoffs["bisect"] <= rcutoffs["linear"] + rigidity_tol)
+    assert np.all(rcutoffs["bisect"] > rcutoffs["linear"] - gmrc.rdelta -
+                  rigidity_tol)
+
+
+def test_gmrc_search():
+    '''
+    Test that only the available search methods are accepted.
+    '''
+    gmrc = GMRC(location="Kamioka", iter_num=1, bfield_type="dipole")
+    with pytest.raises(Exception):
+        gmrc.evaluate(search="newton")
+
+
+def test_gmrc_workers():
+    '''
+    Test that the results do not depend on the number of worker processes.
+    '''
+
+    data_dicts = {}
+    for n_workers in [1, 2]:
+        gmrc = GMRC(location="Kamioka", iter_num=12, bfield_type="dipole")
+        gmrc.evaluate(search="bisect",
+                      rigidity_tol=0.1,
+                      n_workers=n_workers,
+                      chunk_size=5,
+                      seed=42)
+        data_dicts[n_workers] = gmrc.data_dict
+
+    for key in ["azimuth", "zenith", "rcutoff"]:
+        assert np.array_equal(data_dicts[1][key], data_dicts[2][key])
+    assert np.any(data_dicts[1]["rcutoff"] > 0.)
+
+
+def test_gmrc_worker_evaluator():
+    '''
+    Test that the worker processes receive the configuration of the evaluator
+    without its results.
+    '''
+    import pickle
+    from gtracr.geomagnetic_cutoffs import _worker_evaluator
+
+    gmrc = GMRC(location="Kamioka", iter_num=10**6, bfield_type="dipole")
+    gmrc.date_data_dict = {"rcutoff": np.zeros((2, gmrc.iter_num))}
+    worker_gmrc = _worker_evaluator(gmrc)
+
+    assert not hasattr(worker_gmrc, "data_dict")
+    assert not hasattr(worker_gmrc, "date_data_dict")
+    assert worker_gmrc.iter_num == gmrc.iter_num
+    assert np.array_equal(worker_gmrc.rigidity_list, gmrc.rigidity_list)
+    assert len(pickle.dumps(worker_gmrc)) < 10**4
+    # the results of the evaluator are kept
+    assert gmrc.data_dict["rcutoff"].shape == (gmrc.iter_num, )
+    assert gmrc.date_data_dict["rcutoff"].shape == (2, gmrc.iter_num)
+
+
+def test_gmrc_sampling():
+    '''
+    Test the sampling schemes of the directions.
+    '''
+    from scipy.stats import qmc
+
+    gmrc = GMRC(location="Kamioka", iter_num=64, bfield_type="dipole")
+    seed = 7
+
+    discrepancies = {}
+    for sampling in ["random", "sobol", "halton"]:
+        azimuths, zeniths = gmrc.sample_directions(0, 64, seed, sampling)
+        assert np.all((azimuths >= 0.) & (azimuths < 360.))
+        assert np.all((zeniths >= 0.) & (zeniths <= 180.))
+
+        # the directions do not depend on the chunks
+        chunked_directions = [
+            gmrc.sample_directions(start, stop, seed, sampling)
+            for start, stop in [(0, 20), (20, 64)]
+        ]
+        assert np.array_equal(
+            np.concatenate([chunk[0] for chunk in chunked_directions]),
+            azimuths)
+        assert np.array_equal(
+            np.concatenate([chunk[1] for chunk in chunked_directions]),
+            zeniths)
+
+        # the discrepancy of the points in the unit square that the
+        # directions are obtained from
+        if sampling == "random":
+            points = np.column_stack((azimuths / 360., zeniths / 180.))
+        else:
+            points = np.column_stack(
+                (azimuths / 360., 0.5 * (1. - np.cos(np.radians(zeniths)))))
+        discrepancies[sampling] = qmc.discrepancy(points)
+
+    assert discrepancies["sobol"] < discrepancies["random"]
+    assert discrepancies["halton"] < discrepancies["random"]
+
+
+def test_gmrc_sampling_offset():
+    '''
+    Test that the directions of a chunk far into the evaluation are the rows
+    of a single draw of all directions, and that sampling the chunk does not
+    generate the directions before it.
+    '''
+    import tracemalloc
+    from gtracr.geomagnetic_cutoffs import _DirectionSampler
+
+    gmrc = GMRC(location="Kamioka", iter_num=1, bfield_type="dipole")
+    seed = 3
+
+    # the matching slice of a full draw
+    points = np.random.default_rng(seed).random((5000, 2))
+    azimuths, zeniths = gmrc.sample_directions(4900, 5000, seed)
+    assert np.array_equal(azimuths, 360. * points[4900:, 0])
+    assert np.array_equal(zeniths, 180. * points[4900:, 1])
+
+    # the low-discrepancy sequences are advanced chunk by chunk
+    for sampling in ["sobol", "halton"]:
+        sampler = _DirectionSampler(seed, sampling)
+        chunks = [sampler.sample(start, start + 100) for start in [0, 300]]
+        full_points = _DirectionSampler(seed, sampling).sample(0, 400)
+        assert np.array_equal(chunks[0], full_points[:100])
+        assert np.array_equal(chunks[1], full_points[300:])
+
+    # a chunk starting at 10^9 only allocates the directions of the chunk
+    tracemalloc.start()
+    gmrc.sample_directions(10**9, 10**9 + 100, seed)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 10**5
+
+
+def test_gmrc_adaptive():
+    '''
+    Test the adaptive refinement of the directions.
+    '''
+
+    # without refinement, only the initial grid is evaluated, whose
+    # directions at the zenith angles of 0 and 180 degrees are evaluated once
+    gmrc = GMRC(location="Kamioka", iter_num=30, bfield_type="dipole")
+    gmrc.evaluate_adaptive(initial_grid=(4, 2), threshold=np.inf)
+    assert gmrc.iter_num == 4 * 1 + 2
+    assert np.allclose(np.unique(gmrc.data_dict["azimuth"]),
+                       [0., 90., 180., 270.])
+    assert np.allclose(np.unique(gmrc.data_dict["zenith"]), [0., 90., 180.])
+
+    # the refinement stops at the budget of iter_num directions
+    gmrc = GMRC(location="Kamioka", iter_num=30, bfield_type="dipole")
+    gmrc.evaluate_adaptive(initial_grid=(4, 2), threshold=0., max_depth=3)
+    assert 4 * 1 + 2 < gmrc.iter_num <= 30
+    assert len(gmrc.data_dict["rcutoff"]) == gmrc.iter_num
+    directions = np.column_stack(
+        (gmrc.data_dict["azimuth"], gmrc.data_dict["zenith"]))
+    assert len(np.unique(directions, axis=0)) == gmrc.iter_num
+
+    # the results can be interpolated
+    _, _, rcutoff_grid = gmrc.interpolate_results(ngrid_azimuth=10,
+                                                  ngrid_zenith=10)
+    assert np.nanmax(rcutoff_grid) > 0.
+
+    with pytest.raises(Exception):
+        GMRC(location="Kamioka", iter_num=5,
+             bfield_type="dipole").evaluate_adaptive(initial_grid=(4, 2))
+
+
+def test_gmrc_penumbra():
+    '''
+    Test that the lower, upper and effective cutoff rigidities of the penumbra
+    are consistent with each other and with the linear scan of the rigidities.
+    '''
+
+    data_dicts = {}
+    for search in ["linear", "penumbra"]:
+        gmrc = GMRC(location="Kamioka", iter_num=8, bfield_type="dipole")
+        gmrc.evaluate(search=search, seed=3, sampling="sobol")
+        data_dicts[search] = gmrc.data_dict
+
+    rcutoff = data_dicts["linear"]["rcutoff"]
+    rlower, rupper, reff = (data_dicts["penumbra"][key]
+                            for key in ["rlower", "rupper", "rcutoff"])
+    assert np.all(rlower <= reff) and np.all(reff <= rupper)
+
+    # the lowest allowed rigidity lies between the first allowed rigidity
+    # of the linear scan and the forbidden rigidity below it
+    assert np.all(rlower <= rcutoff + 1e-9)
+    assert np.all((rlower > rcutoff - gmrc.rdelta) | (rcutoff == gmrc.rmin))
+
+
+def test_gmrc_resume(tmp_path, monkeypatch):
+    '''
+    Test that an interrupted evaluation resumed from its checkpoint gives
+    the same results as an uninterrupted evaluation.
+    '''
+    settings = dict(search="penumbra", chunk_size=2, seed=5)
+
+    gmrc = GMRC(location="Kamioka", iter_num=6, bfield_type="dipole")
+    gmrc.evaluate(**settings)
+
+    # interrupt the evaluation after the second chunk
+    store_chunk = GMRC._store_chunk
+    n_chunks = [0]
+
+    def interrupted_store_chunk(self, *chunk_result):
+        if n_chunks[0] == 2:
+            raise KeyboardInterrupt
+        n_chunks[0] += 1
+        store_chunk(self, *chunk_result)
+
+    checkpoint = str(tmp_path / "gmrc.npz")
+    monkeypatch.setattr(GMRC, "_store_chunk", interrupted_store_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        GMRC(location="Kamioka", iter_num=6,
+             bfield_type="dipole").evaluate(checkpoint=checkpoint,
+                                            checkpoint_interval=0.,
+                                            **settings)
+    monkeypatch.undo()
+
+    with np.load(checkpoint) as checkpoint_data:
+        assert np.sum(checkpoint_data["completed"]) == 4
+
+    resumed_gmrc = GMRC.resume(checkpoint)
+    assert resumed_gmrc.location == gmrc.location
+    for key in ["azimuth", "zenith", "rcutoff", "rlower", "rupper"]:
+        assert np.array_equal(resumed_gmrc.data_dict[key], gmrc.data_dict[key])
+    with np.load(checkpoint) as checkpoint_data:
+        assert np.all(checkpoint_data["completed"])
+
+
+@pytest.mark.parametrize("sink_type", ["npz", "hdf5"])
+def test_gmrc_sink(tmp_path, sink_type):
+    '''
+    Test that the results written to the output sinks agree with the results
+    stored in `data_dict`.
+    '''
+    from gtracr.sinks import NpzSink, HDF5Sink
+
+    if sink_type == "hdf5":
+        pytest.importorskip("h5py")
+        sink_class, sink_path = HDF5Sink, str(tmp_path / "gmrc.h5")
+    else:
+        sink_class, sink_path = NpzSink, str(tmp_path / "gmrc")
+
+    settings = dict(search="bisect", rigidity_tol=0.1, chunk_size=3, seed=11)
+
+    gmrc = GMRC(location="Kamioka", iter_num=8, bfield_type="dipole")
+    gmrc.evaluate(**settings)
+
+    sink_gmrc = GMRC(location="Kamioka", iter_num=8, bfield_type="dipole")
+    with sink_class(sink_path) as sink:
+        sink_gmrc.evaluate(sink=sink, n_workers=2, **settings)
+    results = sink_class.read(sink_path)
+
+    # the results are not stored in data_dict
+    assert not np.any(sink_gmrc.data_dict["rcutoff"])
+
+    assert np.array_equal(results["index"], np.arange(8))
+    escaped = ~np.isnan(results["rcutoff"])
+    for key in ["azimuth", "zenith", "rcutoff"]:
+        assert np.array_equal(results[key][escaped],
+                              gmrc.data_dict[key][escaped])
+
+
+def test_gmrc_sink_memory(tmp_path):
+    '''
+    Test that the memory allocated to stream a chunk far into a large
+    evaluation to an output sink does not grow with the number of directions.
+    '''
+    import tracemalloc
+    from gtracr.sinks import NpzSink
+
+    iter_num, chunk_size = 10**6, 4
+    gmrc = GMRC(location="Kamioka", iter_num=iter_num, bfield_type="dipole")
+    settings = dict(dt=1e-5,
+                    max_time=1,
+                    search="bisect",
+                    rigidity_tol=0.1,
+                    chunk_size=chunk_size,
+                    seed=5,
+                    sampling="random")
+    # only the last chunk is pending
+    completed = np.ones(iter_num, dtype=bool)
+    completed[-chunk_size:] = False
+
+    with NpzSink(str(tmp_path / "gmrc")) as sink:
+        tracemalloc.start()
+        for chunk_args in gmrc._chunk_args(settings, completed):
+            sink.append(*gmrc._evaluate_chunk(*chunk_args))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    assert peak < 10**6
+
+    results = NpzSink.read(str(tmp_path / "gmrc"))
+    assert np.array_equal(results["index"],
+                          np.arange(iter_num - chunk_size, iter_num))
+
+
+def test_gmrc_dates():
+    '''
+    Test that the evaluation of several dates agrees with the evaluation
+    of each date.
+    '''
+    dates = ["1950-01-01", "2020-01-01"]
+
+    # the dipole field does not depend on the date
+    gmrc = GMRC(location="Kamioka", iter_num=6, bfield_type="dipole")
+    gmrc.evaluate_dates(dates, n_workers=2, chunk_size=4, seed=4)
+    rcutoff = gmrc.date_data_dict["rcutoff"]
+    assert rcutoff.shape == (2, 6)
+    assert np.array_equal(rcutoff[0], rcutoff[1], equal_nan=True)
+
+    gmrc = GMRC(location="Kamioka", iter_num=3, bfield_type="igrf")
+    gmrc.evaluate_dates(dates, seed=4)
+    for i, date in enumerate(dates):
+        date_gmrc = GMRC(location="Kamioka",
+                         iter_num=3,
+                         bfield_type="igrf",
+                         date=date)
+        date_gmrc.evaluate(seed=4)
+        escaped = date_gmrc.data_dict["rcutoff"] > 0.
+        assert np.array_equal(gmrc.date_data_dict["rcutoff"][i][escaped],
+                              date_gmrc.data_dict["rcutoff"][escaped])
+    # the date of the evaluator is restored
+    assert gmrc.date not in dates
@@ -28,6 +28,10 @@ initial_variable_list = [
     ("p+", 9., 80., 0., 50., 260., 100., None, 50.),
 ]
 
+# the IGRF model depends on the date, so the trajectories in the IGRF
+# field are evaluated at a fixed date
+IGRF_DATE = "2020-01-01"
+
 
 def test_trajectories_dipole():
     '''
@@ -71,10 +75,10 @@ def test_trajectories_igrf():
     '''
 
     expected_times = [
-        1e-05, 0.29990000000015915, 0.19221000000005145, 0.20288000000006212,
-        0.21143000000007067, 0.2024600000000617, 0.19868000000005792,
-        0.2169700000000762, 0.19499000000005423, 0.23231000000009155,
-        0.007349999999999869, 0.01941999999999938, 0.19331000000005255
+        1e-05, 0.023459999999999214, 0.1925700000000518, 0.2032700000000625,
+        0.21143000000007067, 0.20076000000006, 0.19814000000005738,
+        0.21604000000007528, 0.194760000000054, 0.2632800000001225,
+        0.005189999999999957, 0.012569999999999656, 0.19270000000005194
     ]
 
     dt = 1e-5
@@ -94,13 +98,57 @@ def test_trajectories_igrf():
                           detector_altitude=dalt,
                           rigidity=rig,
                           energy=en,
-                          bfield_type="igrf")
+                          bfield_type="igrf",
+                          date=IGRF_DATE)
 
         traj.get_trajectory(dt=dt, max_time=max_time)
 
         assert np.allclose(traj.final_time, expected_times[iexp])
 
 
+def test_trajectories_gridded():
+    '''
+    Test the final times of the trajectory evaluation in the interpolated
+    lattice of the IGRF field against those in the IGRF field.
+    '''
+
+    # the expected times in the IGRF field (test_trajectories_igrf)
+    expected_times = [
+        1e-05, 0.023459999999999214, 0.1925700000000518, 0.2032700000000625,
+        0.21143000000007067, 0.20076000000006, 0.19814000000005738,
+        0.21604000000007528, 0.194760000000054, 0.2632800000001225,
+        0.005189999999999957, 0.012569999999999656, 0.19270000000005194
+    ]
+
+    dt = 1e-5
+    max_time = 1.
+
+    for iexp, initial_variables in enumerate(initial_variable_list):
+
+        (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) = initial_variables
+
+        traj = Trajectory(plabel=plabel,
+                          zenith_angle=zenith,
+                          azimuth_angle=azimuth,
+                          particle_altitude=palt,
+                          latitude=lat,
+                          longitude=lng,
+                          detector_altitude=dalt,
+                          rigidity=rig,
+                          energy=en,
+                          bfield_type="gridded",
+                          date=IGRF_DATE)
+
+        traj.get_trajectory(dt=dt, max_time=max_time)
+
+        # the interpolation error changes the final times by a few steps
+        assert np.allclose(traj.final_time,
+                           expected_times[iexp],
+                           rtol=5e-3,
+                           atol=3. * dt)
+
+
 def test_trajectories_stepsize():
     '''
     Test the final times of the trajectory evaluation in the igrf field for 
@@ -108,9 +156,9 @@ def test_trajectories_stepsize():
     '''
 
     expected_times = [
-        0.22073792992447885, 0.22073800000531751, 0.22073800000020008,
-        0.22074000000007998, 0.220799999999992, 0.22100000000000017,
-        0.23000000000000007, 0.30000000000000004
+        0.21586443992704404, 0.21586450000517737, 0.2158650000001952,
+        0.2158700000000751, 0.21589999999999254, 0.21600000000000016,
+        0.22000000000000006, 0.4
     ]
 
     dt_arr = [1e-8, 1e-7, 1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1]
@@ -130,7 +178,8 @@ def test_trajectories_stepsize():
                           detector_altitude=dalt,
                           rigidity=rig,
                           energy=en,
-                          bfield_type="igrf")
+                          bfield_type="igrf",
+                          date=IGRF_DATE)
 
         traj.get_trajectory(dt=dt, max_time=max_time)
 
@@ -145,9 +194,9 @@ def test_trajectories_maxtimes():
 
     expected_times = [
         0.00999999999999976, 0.027829999999999036, 0.07743000000000268,
-        0.2154500000000747, 0.22074000000007998, 0.22074000000007998,
-        0.22074000000007998, 0.22074000000007998, 0.22074000000007998,
-        0.22074000000007998
+        0.2154500000000747, 0.2158700000000751, 0.2158700000000751,
+        0.2158700000000751, 0.2158700000000751, 0.2158700000000751,
+        0.2158700000000751
     ]
 
     dt = 1e-5
@@ -167,7 +216,8 @@ def test_trajectories_maxtimes():
                           detector_altitude=dalt,
                           rigidity=rig,
                           energy=en,
-                          bfield_type="igrf")
+                          bfield_type="igrf",
+                          date=IGRF_DATE)
 
         traj.get_trajectory(dt=dt, max_time=max_time)
 
@@ -218,10 +268,10 @@ def test_trajectories_dates():
     '''
 
     expected_times = [
-        0.22074000000007998, 0.22074000000007998, 0.22074000000007998,
-        0.22074000000007998, 0.22074000000007998, 0.22074000000007998,
-        0.22074000000007998, 0.22074000000007998, 0.22074000000007998,
-        0.22074000000007998
+        0.21334000000007258, 0.21362000000007286, 0.2133600000000726,
+        0.21589000000007513, 0.21544000000007468, 0.21538000000007462,
+        0.21482000000007406, 0.21461000000007385, 0.2153600000000746,
+        0.2159700000000752
     ]
 
     dt = 1e-5
@@ -253,6 +303,441 @@ def test_trajectories_dates():
         assert np.allclose(traj.final_time, expected_times[iexp])
 
 
+def test_trajectories_rk45():
+    '''
+    Test that the adaptive integrator gives the same allowed / forbidden
+    trajectories as the fixed-step integrator with far fewer steps.
+    '''
+
+    dt = 1e-5
+    max_time = 1.
+
+    for initial_variables in initial_variable_list:
+
+        (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) = initial_variables
+
+        trajs = {}
+        nsteps = {}
+        for integrator in ["rk4", "rk45"]:
+            trajs[integrator] = Trajectory(plabel=plabel,
+                                           zenith_angle=zenith,
+                                           azimuth_angle=azimuth,
+                                           particle_altitude=palt,
+                                           latitude=lat,
+                                           longitude=lng,
+                                           detector_altitude=dalt,
+                                           rigidity=rig,
+                                           energy=en,
+                                           bfield_type="dipole")
+
+            trajectory_data = trajs[integrator].get_trajectory(
+                dt=dt, max_time=max_time, get_data=True,
+                integrator=integrator)
+            nsteps[integrator] = len(trajectory_data["t"])
+
+        assert trajs["rk45"].particle_escaped == trajs["rk4"].particle_escaped
+        assert nsteps["rk45"] <= nsteps["rk4"] + 1
+        if trajs["rk4"].particle_escaped:
+            assert 10 * nsteps["rk45"] < nsteps["rk4"]
+
+
+def test_trajectories_cartesian():
+    '''
+    Test that the Cartesian kernel gives the same trajectories as the
+    spherical kernel away from the poles, where the spherical form is
+    singular.
+    '''
+
+    dt = 1e-5
+    max_time = 1.
+
+    for initial_variables in initial_variable_list:
+
+        (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) = initial_variables
+
+        trajs = {}
+        for kernel in ["spherical", "cartesian"]:
+            trajs[kernel] = Trajectory(plabel=plabel,
+                                       zenith_angle=zenith,
+                                       azimuth_angle=azimuth,
+                                       particle_altitude=palt,
+                                       latitude=lat,
+                                       longitude=lng,
+                                       detector_altitude=dalt,
+                                       rigidity=rig,
+                                       energy=en,
+                                       bfield_type="dipole")
+
+            trajs[kernel].get_trajectory(dt=dt,
+                                         max_time=max_time,
+                                         kernel=kernel)
+
+        assert (trajs["cartesian"].particle_escaped ==
+                trajs["spherical"].particle_escaped)
+        if np.abs(lat) < 89.5:
+            assert np.allclose(trajs["cartesian"].final_time,
+                               trajs["spherical"].final_time,
+                               rtol=1e-3)
+
+
+def test_trajectories_boris():
+    '''
+    Test that the Boris algorithm gives the same trajectories as the
+    4th-order Runge Kutta algorithm while conserving the momentum magnitude.
+    '''
+
+    dt = 1e-5
+    max_time = 1.
+
+    for initial_variables in initial_variable_list:
+
+        (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) = initial_variables
+
+        trajs = {}
+        for integrator in ["rk4", "boris"]:
+            trajs[integrator] = Trajectory(plabel=plabel,
+                                           zenith_angle=zenith,
+                                           azimuth_angle=azimuth,
+                                           particle_altitude=palt,
+                                           latitude=lat,
+                                           longitude=lng,
+                                           detector_altitude=dalt,
+                                           rigidity=rig,
+                                           energy=en,
+                                           bfield_type="dipole")
+
+            trajs[integrator].get_trajectory(dt=dt,
+                                             max_time=max_time,
+                                             integrator=integrator)
+
+        assert (trajs["boris"].particle_escaped ==
+                trajs["rk4"].particle_escaped)
+        if np.abs(lat) < 89.5:
+            assert np.allclose(trajs["boris"].final_time,
+                               trajs["rk4"].final_time,
+                               rtol=1e-3,
+                               atol=2 * dt)
+
+        pmag0 = np.linalg.norm(trajs["boris"].particle_sixvector[3:])
+        pmag = np.linalg.norm(trajs["boris"].final_sixvector[3:])
+        assert np.allclose(pmag, pmag0, rtol=1e-12)
+
+
+def test_trajectories_batch():
+    '''
+    Test that evaluating a batch of trajectories in a single call gives the
+    same final times and six-vectors as evaluating them one by one.
+    '''
+    from gtracr.lib._libgtracr import TrajectoryTracer
+    from gtracr.lib.constants import ELEMENTARY_CHARGE, KG_PER_GEVC2
+
+    dt = 1e-5
+    max_time = 1.
+    max_step = int(np.ceil(max_time / dt))
+
+    # only use the cases that share the same starting altitude,
+    # since the batch is evaluated with a single tracer
+    batch_variable_list = [initial_variable_list[i] for i in [0, 2, 3, 4, 5]]
+
+    trajectories = []
+    for (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) in batch_variable_list:
+        trajectories.append(
+            Trajectory(plabel=plabel,
+                       zenith_angle=zenith,
+                       azimuth_angle=azimuth,
+                       particle_altitude=palt,
+                       latitude=lat,
+                       longitude=lng,
+                       detector_altitude=dalt,
+                       rigidity=rig,
+                       energy=en,
+                       bfield_type="dipole"))
+
+    vec0s = np.array([traj.particle_sixvector for traj in trajectories])
+    charges = np.array([traj.charge for traj in trajectories
+                        ]) * ELEMENTARY_CHARGE
+    masses = np.array([traj.mass for traj in trajectories]) * KG_PER_GEVC2
+
+    traj0 = trajectories[0]
+    tracer = TrajectoryTracer(charges[0], masses[0], traj0.start_alt,
+                              traj0.esc_alt, dt, max_step, "d",
+                              traj0.igrf_params)
+
+    for traj in trajectories:
+        traj.get_trajectory(dt=dt, max_time=max_time)
+
+    # results should not depend on the number of threads
+    for num_threads in [1, 3]:
+        escaped, final_times, final_sixvectors = tracer.evaluate_batch(
+            vec0s, charges, masses, num_threads=num_threads)
+
+        for i, traj in enumerate(trajectories):
+            assert escaped[i] == traj.particle_escaped
+            assert np.allclose(final_times[i], traj.final_time)
+            assert np.allclose(final_sixvectors[i], traj.final_sixvector)
+
+
+def test_trajectories_batch_python():
+    '''
+    Test that the batched NumPy engine of the Python version gives the same
+    results as the batched C++ version.
+    '''
+    from gtracr.lib._libgtracr import TrajectoryTracer
+    from gtracr.lib.trajectory_tracer import pTrajectoryTracer
+    from gtracr.lib.constants import ELEMENTARY_CHARGE, KG_PER_GEVC2
+
+    # a short time such that only some trajectories terminate
+    dt = 1e-5
+    max_step = 2000
+
+    # the trajectory that starts at the pole is too sensitive
+    # to the difference in the constants of both versions
+    batch_variable_list = [initial_variable_list[i] for i in [0, 2, 3, 5]]
+
+    trajectories = []
+    for (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) in batch_variable_list:
+        trajectories.append(
+            Trajectory(plabel=plabel,
+                       zenith_angle=zenith,
+                       azimuth_angle=azimuth,
+                       particle_altitude=palt,
+                       latitude=lat,
+                       longitude=lng,
+                       detector_altitude=dalt,
+                       rigidity=rig,
+                       energy=en,
+                       bfield_type="dipole"))
+
+    vec0s = np.array([traj.particle_sixvector for traj in trajectories])
+    charges = np.array([traj.charge for traj in trajectories
+                        ]) * ELEMENTARY_CHARGE
+    masses = np.array([traj.mass for traj in trajectories]) * KG_PER_GEVC2
+
+    traj0 = trajectories[0]
+    tracer = TrajectoryTracer(charges[0], masses[0], traj0.start_alt,
+                              traj0.esc_alt, dt, max_step, "d",
+                              traj0.igrf_params)
+    ptracer = pTrajectoryTracer(traj0.charge, traj0.mass, traj0.start_alt,
+                                traj0.esc_alt, dt, max_step, "d",
+                                traj0.igrf_params)
+
+    escaped, final_times, final_sixvectors = tracer.evaluate_batch(
+        vec0s, charges, masses)
+    pescaped, pfinal_times, pfinal_sixvectors = ptracer.evaluate_batch(
+        vec0s, charges, masses)
+
+    assert np.all(pescaped == escaped)
+    assert np.allclose(pfinal_times, final_times)
+    assert np.allclose(pfinal_sixvectors, final_sixvectors, rtol=1e-3)
+    # the first trajectory terminates after a single step
+    assert final_times[0] < final_times[1]
+
+
+@pytest.mark.parametrize("bfield_type", ["dipole", "igrf"])
+def test_trajectories_numba(bfield_type):
+    '''
+    Test that the numba version of the Python trajectory tracer gives the
+    same results as the NumPy version.
+    '''
+    pytest.importorskip("numba")
+    from gtracr.lib.trajectory_tracer import pTrajectoryTracer
+    from gtracr.lib.numba_tracer import nTrajectoryTracer
+    from gtracr.lib.constants import ELEMENTARY_CHARGE, KG_PER_GEVC2
+
+    # the NumPy version is slow in the IGRF field
+    dt = 1e-5
+    max_step = 2000 if bfield_type == "dipole" else 100
+
+    batch_variable_list = [initial_variable_list[i] for i in [0, 2, 3, 5]]
+
+    trajectories = []
+    for (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) in batch_variable_list:
+        trajectories.append(
+            Trajectory(plabel=plabel,
+                       zenith_angle=zenith,
+                       azimuth_angle=azimuth,
+                       particle_altitude=palt,
+                       latitude=lat,
+                       longitude=lng,
+                       detector_altitude=dalt,
+                       rigidity=rig,
+                       energy=en,
+                       bfield_type=bfield_type,
+                       date=IGRF_DATE))
+
+    vec0s = np.array([traj.particle_sixvector for traj in trajectories])
+    charges = np.array([traj.charge for traj in trajectories
+                        ]) * ELEMENTARY_CHARGE
+    masses = np.array([traj.mass for traj in trajectories]) * KG_PER_GEVC2
+
+    traj0 = trajectories[0]
+    tracer_args = (traj0.charge, traj0.mass, traj0.start_alt, traj0.esc_alt,
+                   dt, max_step, traj0.bfield_type, traj0.igrf_params)
+    ptracer = pTrajectoryTracer(*tracer_args)
+    ntracer = nTrajectoryTracer(*tracer_args)
+
+    pescaped, pfinal_times, pfinal_sixvectors = ptracer.evaluate_batch(
+        vec0s, charges, masses)
+    nescaped, nfinal_times, nfinal_sixvectors = ntracer.evaluate_batch(
+        vec0s, charges, masses)
+
+    assert np.all(nescaped == pescaped)
+    assert np.allclose(nfinal_times, pfinal_times)
+    assert np.allclose(nfinal_sixvectors, pfinal_sixvectors, rtol=1e-10)
+
+    # the trajectory data of a single trajectory, evaluated with
+    # separate objects since get_trajectory modifies the trajectory
+    (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+     en) = batch_variable_list[1]
+    trajs, datas = [], []
+    for use_python in [True, "numba"]:
+        traj = Trajectory(plabel=plabel,
+                          zenith_angle=zenith,
+                          azimuth_angle=azimuth,
+                          particle_altitude=palt,
+                          latitude=lat,
+                          longitude=lng,
+                          detector_altitude=dalt,
+                          rigidity=rig,
+                          energy=en,
+                          bfield_type=bfield_type,
+                          date=IGRF_DATE)
+        datas.append(
+            traj.get_trajectory(dt=dt,
+                                max_step=max_step,
+                                get_data=True,
+                                use_python=use_python))
+        trajs.append(traj)
+
+    for key in ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]:
+        assert np.allclose(datas[1][key], datas[0][key], rtol=1e-10)
+    assert trajs[1].particle_escaped == trajs[0].particle_escaped
+    assert np.allclose(trajs[1].final_sixvector,
+                       trajs[0].final_sixvector,
+                       rtol=1e-10)
+
+
+def test_trajectories_numba_import():
+    '''
+    Test that numba is only imported when the numba version of the Python
+    trajectory tracer is requested.
+    '''
+    import subprocess
+
+    code = ("import os, sys, gtracr.trajectory; "
+            "assert 'numba' not in sys.modules; "
+            "assert 'NUMBA_CACHE_DIR' not in os.environ")
+    env = dict(os.environ)
+    env.pop("NUMBA_CACHE_DIR", None)
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+
+
+def test_trajectories_data():
+    '''
+    Test that the trajectory data of the C++ versions are views into a single
+    (n_steps, 7) array that contains each step of the trajectory.
+    '''
+
+    dt = 1e-5
+    max_time = 1.
+    keys = ["t", "r", "theta", "phi", "pr", "ptheta", "pphi"]
+
+    for initial_variables in initial_variable_list:
+
+        (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) = initial_variables
+
+        for integrator in ["rk4", "rk45", "boris"]:
+            traj = Trajectory(plabel=plabel,
+                              zenith_angle=zenith,
+                              azimuth_angle=azimuth,
+                              particle_altitude=palt,
+                              latitude=lat,
+                              longitude=lng,
+                              detector_altitude=dalt,
+                              rigidity=rig,
+                              energy=en,
+                              bfield_type="dipole")
+
+            trajectory_data = traj.get_trajectory(dt=dt,
+                                                  max_time=max_time,
+                                                  get_data=True,
+                                                  integrator=integrator)
+
+            table = trajectory_data["t"].base
+            nsteps = len(trajectory_data["t"])
+            assert table.shape == (nsteps, 7)
+            for j, key in enumerate(keys):
+                assert trajectory_data[key].base is table
+                assert np.array_equal(trajectory_data[key], table[:, j])
+
+            if integrator == "rk45":
+                # the adaptive integrator also records the final point
+                assert np.isclose(table[-1, 0], traj.final_time)
+                assert np.allclose(table[-1, 1:], traj.final_sixvector)
+            else:
+                # the fixed-step integrators record each point before a step
+                assert np.allclose(table[:, 0], dt * np.arange(nsteps))
+                assert np.isclose(traj.final_time, dt * nsteps)
+
+
+def test_trajectories_cutoff():
+    '''
+    Test that the cutoff rigidity found by the scan in C++ agrees with the
+    evaluation of a separate trajectory for each rigidity.
+    '''
+
+    rigidities = np.arange(5., 55., 5.)
+
+    for initial_variables in initial_variable_list:
+
+        (plabel, zenith, azimuth, palt, lat, lng, dalt, rig,
+         en) = initial_variables
+
+        def trajectory(rigidity):
+            return Trajectory(plabel=plabel,
+                              zenith_angle=zenith,
+                              azimuth_angle=azimuth,
+                              particle_altitude=palt,
+                              latitude=lat,
+                              longitude=lng,
+                              detector_altitude=dalt,
+                              rigidity=rigidity,
+                              bfield_type="dipole")
+
+        allowed = np.zeros(len(rigidities), dtype=bool)
+        for i, rigidity in enumerate(rigidities):
+            traj = trajectory(rigidity)
+            traj.get_trajectory(dt=1e-5, max_time=1.)
+            allowed[i] = traj.particle_escaped
+
+        for integrator in ["rk4", "boris"]:
+            # the rigidity of the trajectory does not affect the scan
+            traj = trajectory(rigidities[-1])
+            rcutoff, scan_allowed = traj.find_cutoff(rigidities,
+                                                     integrator=integrator,
+                                                     stop_at_first=False)
+            if integrator == "rk4":
+                assert np.array_equal(scan_allowed, allowed)
+            if np.any(scan_allowed):
+                assert rcutoff == rigidities[np.argmax(scan_allowed)]
+            else:
+                assert rcutoff is None
+
+            # only the rigidities up to the cutoff are evaluated
+            first_rcutoff, first_allowed = traj.find_cutoff(
+                rigidities, integrator=integrator)
+            assert first_rcutoff == rcutoff
+            assert np.array_equal(first_allowed,
+                                  scan_allowed[:len(first_allowed)])
+
+
 # def test_dipole_sixvec():
 
 #     expected_sixvec= [
@@ -2,9 +2,11 @@ import os
 import sys
 import numpy as np
 import pickle
+import warnings
 from datetime import date
-from gtracr.lib._libgtracr import TrajectoryTracer, uTrajectoryTracer
+from gtracr.lib._libgtracr import TrajectoryTracer, uTrajectoryTracer, bTrajectoryTracer
 from gtracr.lib.trajectory_tracer import pTrajectoryTracer
+from gtracr.lib.gridded_field import DEFAULT_GRID_SHAPE, igrf_grid_path
 from gtracr.utils import particle_dict, location_dict, ymd_to_dec
 from gtracr.lib.constants import EARTH_RADIUS, DEG_PER_RAD, ELEMENTARY_CHARGE, KG_PER_GEVC2, RAD_PER_DEG, KG_M_S_PER_GEVC, ELEMENTARY_CHARGE
 
@@ -40,13 +42,18 @@ class Trajectory:
     - location_name : str
         the location name as stored in location_dict (default = None). Available as an alternative option to initialize the location of the trajectory.
     - bfield_type : str
-        the type of bfield to evaluate the trajectory with (either 'dipole' or 'igrf', default = igrf)
+        the type of bfield to evaluate the trajectory with (either 'dipole', 'igrf', or 'gridded', default = igrf).
+        The 'gridded' model interpolates the IGRF model from a lattice, which is built once for each date and grid_shape
+        and stored in the data directory (only available in the vectorized C++ version).
     - date : str
         the date in which the field is evaluated in (defaults to the current date). Date must be formatted in "yyyy-mm-dd" format.
     - plabel : str
          the label of the particle defined in particle_dict (default = "p+"). Available options are "p+", "p-", "e+", "e-".
     - escape_altitude : float
         the altitude in which the particle has "escaped" Earth in meters (default = 10 * RE)
+    - grid_shape : tuple(int, int, int)
+        the number of lattice points in (r, theta, phi) of the 'gridded' model (default = DEFAULT_GRID_SHAPE in
+        gtracr.lib.gridded_field)
     '''
     def __init__(self,
                  zenith_angle,
@@ -61,7 +68,8 @@ class Trajectory:
                  bfield_type="igrf",
                  date=str(date.today()),
                  plabel="p+",
-                 escape_altitude=10. * EARTH_RADIUS):
+                 escape_altitude=10. * EARTH_RADIUS,
+                 grid_shape=DEFAULT_GRID_SHAPE):
         '''
         Cosmic ray direction configurations
         '''
@@ -123,6 +131,11 @@ class Trajectory:
         # print(datapath)
         dec_date = ymd_to_dec(date)
         self.igrf_params = (datapath, dec_date)
+
+        # the gridded model uses the lattice of the IGRF model instead
+        if self.bfield_type == "g":
+            self.igrf_params = (igrf_grid_path(dec_date, grid_shape,
+                                               datapath), dec_date)
         '''
         Other set-ups
         '''
@@ -142,7 +155,11 @@ class Trajectory:
                        max_step=None,
                        get_data=False,
                        use_python=False,
-                       use_unvectorized=False):
+                       use_unvectorized=False,
+                       integrator="rk4",
+                       rtol=1e-6,
+                       atol=1e-9,
+                       kernel="spherical"):
         '''
         Evaluate the trajectory of the particle within Earth's magnetic field
         and determines whether particle has escaped or not.
@@ -162,12 +179,33 @@ class Trajectory:
         get_data : bool, optional
             decides whether we want to extract the information (time and six vector)
             for the whole trajectory for e.g. debugging purposes (default: False)
-        use_python : bool, optional
+        use_python : bool or str, optional
             decides whether to use the python implementation for the TrajectoryTracer class instead of
-            that implemented in C++. This is mainly enabled for debugging purposes (default: False)
+            that implemented in C++. This is mainly enabled for debugging purposes. If "numba", the
+            integration and the magnetic field of the python implementation are compiled with numba,
+            which falls back to the NumPy version (with a warning) if numba is not installed (default: False)
         use_unvectorized : bool, optional
             decides whether to evaluate the Runge Kutta integration in the C++ version in its
             unvectorized or vectorized form. This is mainly enabled for debugging purposes (default: False)
+        integrator : str, optional
+            the integration algorithm used in the (vectorized) C++ version. Either "rk4" for the
+            fixed-step 4th-order Runge Kutta algorithm, "rk45" for the adaptive Dormand-Prince
+            algorithm, in which case `dt` is used as the initial step size, or "boris" for the
+            Boris algorithm, which conserves the energy of the particle and remains stable for
+            larger step sizes (default: "rk4")
+        rtol : float, optional
+            the relative error tolerance per step for the adaptive integrator (default: 1e-6)
+        atol : float, optional
+            the absolute error tolerance per step for the adaptive integrator, in units of Earth's radius for
+            the radial component, radians for the angular components, and the initial momentum
+            magnitude for the momentum components (default: 1e-9)
+        kernel : str, optional
+            the coordinate system in which the equations of motion are integrated in the (vectorized)
+            C++ version. Either "spherical", or "cartesian" for Earth-centered, Earth-fixed Cartesian
+            coordinates, which avoids the evaluation of trigonometric functions at each step and the
+            coordinate singularities at the poles. The trajectory data is returned in spherical
+            coordinates in both cases. The Boris algorithm is always performed in Cartesian
+            coordinates (default: "spherical")
 
         Returns
         ---------
@@ -188,6 +226,34 @@ class Trajectory:
         if use_python and use_unvectorized:
             raise Exception("Unvectorized Python version does not exist!")
 
+        # the adaptive and Boris integrators are only implemented in C++
+        if integrator not in ("rk4", "rk45", "boris"):
+            raise Exception(
+                "Only integrators 'rk4', 'rk45' and 'boris' are allowed!")
+        if integrator != "rk4" and (use_python or use_unvectorized):
+            raise Exception(
+                "The integrator '{0}' is only available in the vectorized C++ version!"
+                .format(integrator))
+        if kernel not in ("spherical", "cartesian"):
+            raise Exception("Only kernels 'spherical' and 'cartesian' are allowed!")
+        if self.bfield_type == "g" and (use_python or use_unvectorized):
+            raise Exception(
+                "The gridded field model is only available in the vectorized C++ version!")
+        if kernel != "spherical" and (use_python or use_unvectorized):
+            raise Exception(
+                "The kernel '{0}' is only available in the vectorized C++ version!"
+                .format(kernel))
+
+        # the numba version is only imported when requested, and falls
+        # back to the NumPy version without numba
+        if use_python == "numba":
+            from gtracr.lib.numba_tracer import nTrajectoryTracer, HAS_NUMBA
+            if not HAS_NUMBA:
+                warnings.warn(
+                    "numba is not installed, using the NumPy version of the Python trajectory tracer."
+                )
+                use_python = True
+
         # start iteration process
 
         self.charge *= ELEMENTARY_CHARGE
@@ -195,11 +261,12 @@ class Trajectory:
 
         # initialize trajectory tracer
         if use_python:
-            # the python trajectory tracer version
-            traj_tracer = pTrajectoryTracer(self.charge, self.mass,
-                                            self.start_alt, self.esc_alt, dt,
-                                            max_step, self.bfield_type,
-                                            self.igrf_params)
+            # the python trajectory tracer version, either compiled
+            # with numba or using NumPy
+            tracer_class = nTrajectoryTracer if use_python == "numba" else pTrajectoryTracer
+            traj_tracer = tracer_class(self.charge, self.mass, self.start_alt,
+                                       self.esc_alt, dt, max_step,
+                                       self.bfield_type, self.igrf_params)
         elif use_unvectorized:
             # the unvectorized trajectory tracer version
             # error prone, possible memory leaks so better not to use it
@@ -209,10 +276,9 @@ class Trajectory:
                                             self.igrf_params)
         else:
             # the vectorized trajectory tracer version
-            traj_tracer = TrajectoryTracer(self.charge, self.mass,
-                                           self.start_alt, self.esc_alt, dt,
-                                           max_step, self.bfield_type,
-                                           self.igrf_params)
+            traj_tracer = self.create_tracer(self.charge, self.mass, dt,
+                                             max_step, integrator, rtol,
+                                             atol, kernel)
 
         # set initial values
         particle_t0 = 0.
@@ -224,10 +290,10 @@ class Trajectory:
             trajectory_datadict = traj_tracer.evaluate_and_get_trajectory(
                 particle_t0, particle_vec0)
 
-            # convert all data to numpy arrays for computations etc
-            # this should be done within C++ in future versions
+            # the C++ versions return views into a single (n_steps, 7) array,
+            # convert the data of the other versions to numpy arrays
             for key, arr in list(trajectory_datadict.items()):
-                trajectory_datadict[key] = np.array(arr)
+                trajectory_datadict[key] = np.asarray(arr)
 
             # add the Cartesian components to the dictionary
             # for plotting purposes
@@ -260,6 +326,89 @@ class Trajectory:
 
             return None
 
+    def create_tracer(self, charge, mass, dt, max_step, integrator, rtol,
+                      atol, kernel):
+        '''
+        Create the (vectorized) C++ trajectory tracer of the integrator for this
+        trajectory, with the charge in Coulombs and the mass in kilograms.
+        '''
+        if integrator == "boris":
+            # the trajectory tracer with the Boris algorithm
+            return bTrajectoryTracer(charge, mass, self.start_alt,
+                                     self.esc_alt, dt, max_step,
+                                     self.bfield_type, self.igrf_params)
+        return TrajectoryTracer(charge, mass, self.start_alt, self.esc_alt,
+                                dt, max_step, self.bfield_type,
+                                self.igrf_params, integrator, rtol, atol,
+                                kernel)
+
+    def find_cutoff(self,
+                    rigidities,
+                    dt=1e-5,
+                    max_time=1,
+                    max_step=None,
+                    integrator="rk4",
+                    rtol=1e-6,
+                    atol=1e-9,
+                    kernel="spherical",
+                    stop_at_first=True):
+        '''
+        Find the cutoff rigidity in the direction of this trajectory, i.e. the lowest
+        rigidity in which the particle escapes, by evaluating the trajectory for each
+        rigidity in ascending order.
+
+        The whole scan is performed in C++ with a single trajectory tracer and magnetic
+        field model, in which only the magnitude of the initial momentum is rescaled for
+        each rigidity. The rigidity (or energy) of this trajectory only sets the initial
+        six-vector, and is not changed.
+
+        Parameters
+        ----------
+
+        rigidities : array_like(float)
+            the rigidities in GV, in ascending order
+        dt, max_time, max_step, integrator, rtol, atol, kernel :
+            the configuration of the integration, as in `get_trajectory`
+        stop_at_first : bool, optional
+            whether to stop at the first rigidity in which the particle escapes (default: True).
+            If False, all rigidities are evaluated, which gives the full allowed / forbidden
+            pattern, e.g. to identify the penumbra.
+
+        Returns
+        ---------
+
+        - rcutoff : float or None
+            the lowest rigidity in which the particle escapes, or None if the particle does
+            not escape with any of the rigidities
+        - allowed : np.array(bool)
+            whether the particle escapes with each evaluated rigidity. Only contains the
+            rigidities up to the cutoff rigidity if `stop_at_first` is True.
+        '''
+        max_step = int(np.ceil(max_time /
+                               dt)) if max_step is None else max_step
+
+        if integrator not in ("rk4", "rk45", "boris"):
+            raise Exception(
+                "Only integrators 'rk4', 'rk45' and 'boris' are allowed!")
+        if kernel not in ("spherical", "cartesian"):
+            raise Exception("Only kernels 'spherical' and 'cartesian' are allowed!")
+
+        rigidities = np.asarray(rigidities, dtype=np.float64)
+
+        # convert the charge and mass to SI units without modifying the
+        # members of the trajectory
+        traj_tracer = self.create_tracer(self.charge * ELEMENTARY_CHARGE,
+                                         self.mass * KG_PER_GEVC2, dt,
+                                         max_step, integrator, rtol, atol,
+                                         kernel)
+
+        index, allowed = traj_tracer.find_cutoff(self.particle_sixvector,
+                                                 rigidities,
+                                                 stop_at_first=stop_at_first)
+
+        rcutoff = rigidities[index] if index >= 0 else None
+        return rcutoff, allowed
+
     def convert_to_cartesian(self, trajectory_data):
 
         r_arr = trajectory_data["r"] / EARTH_RADIUS
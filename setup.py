@@ -18,7 +18,10 @@ libgtracr = Extension('gtracr.lib._libgtracr',
                       sources=[
                           "gtracr/lib/src/TrajectoryTracer.cpp",
                           "gtracr/lib/src/uTrajectoryTracer.cpp",
+                          "gtracr/lib/src/bTrajectoryTracer.cpp",
                           "gtracr/lib/src/igrf.cpp",
+                          "gtracr/lib/src/igrf_store.cpp",
+                          "gtracr/lib/src/gridded_field.cpp",
                           "gtracr/lib/src/pybind11_wrapper.cpp"
                       ],
                       language='c++',
@@ -49,9 +52,10 @@ compiler_opts = {
             "-Wno-sign-compare",
             "-Wno-cpp",  # suppresses #warnings from numpy
             "-Wno-deprecated-declarations",
+            "-pthread",  # for the worker threads in batched evaluations
         ]
         + extra_flags,
-        "extra_link_args": extra_flags,
+        "extra_link_args": ["-pthread"] + extra_flags,
     },
     MSVCCompiler: {"extra_compile_args": ["/EHsc"]},
 }
@@ -82,7 +86,11 @@ def get_version():
 
 __version__ = get_version()
 
-extras_require = {"examples": ["matplotlib", "plotly"]}
+extras_require = {
+    "examples": ["matplotlib", "plotly"],
+    "hdf5": ["h5py"],
+    "numba": ["numba"]
+}
 
 # exclude_dirs = ["*.tests", "*.tests.*", "tests.*", "tests",
 #                 "*.data", "*.data.*", "data.*", "data"]